@@ -0,0 +1,206 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from TableCreation import *
+from MonteCarlo import *
+from ShoeSimulator import BasicStrategy, batch_simulate_shoe, simulate_bankroll, simulate_table
+from TrueCount import count_tensor, representative_counts
+from Profiling import Profiler
+
+DEALER_UPCARDS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'A']
+
+# Fraction by which a benchmark may be slower than the baseline before the run fails
+DEFAULT_THRESHOLD = 0.25
+
+# Modules whose import time is benchmarked
+IMPORT_MODULES = ("ProbabilityFunctions", "ShoeProbabilityFunctions", "MonteCarlo", "StrategyStore", "DecisionServer",
+                  "TableCreation", "Sweep", "TrueCount", "Profiling")
+
+
+def _cold(func, *args, **kwargs):
+    """Wrap a call so that it starts from an empty strategy cache and a fixed random seed."""
+    def run():
+        clear_cache()
+        random.seed(0)
+        return func(*args, **kwargs)
+    return run
+
+
+def import_modules(module: str) -> list:
+    """
+    Import a module in a fresh interpreter, the way a short-lived CLI or worker process would.
+
+    Returns:
+        list: The names of every module the interpreter loaded.
+    """
+    code = f"import sys, {module}; print(' '.join(sys.modules))"
+    directory = os.path.dirname(os.path.abspath(__file__))
+    return subprocess.run([sys.executable, "-c", code], cwd=directory, capture_output=True, text=True, check=True).stdout.split()
+
+
+def benchmark_cases() -> dict:
+    """
+    Build every benchmark with its pinned inputs.
+
+    Returns:
+        dict: A dictionary mapping each benchmark name to (callable, number of timed repetitions).
+    """
+    # Timed in a fresh interpreter, so they include its start-up time
+    cases = {f"import[{module}]": (lambda module=module: import_modules(module), 5) for module in IMPORT_MODULES}
+    cases.update({
+        "probability_distribution": (_cold(lambda: [probability_distribution(upcard) for upcard in UPCARDS]), 20),
+        "ev_tensor": (_cold(ev_tensor), 20),
+        "ev_tensor[exact]": (_cold(ev_tensor, exact=True), 5),
+        "stand_EV": (_cold(lambda: [stand_EV(upcard) for upcard in UPCARDS]), 20),
+        "hit_EV": (_cold(lambda: [hit_EV(upcard) for upcard in UPCARDS]), 20),
+        "hit_EV[double_down]": (_cold(lambda: [hit_EV(upcard, double_down=True) for upcard in UPCARDS]), 20),
+        "soft_hit_EV": (_cold(lambda: [soft_hit_EV(upcard) for upcard in UPCARDS]), 20),
+        "total_hit_EV": (_cold(lambda: [total_hit_EV(upcard) for upcard in UPCARDS]), 20),
+        "split_EV": (_cold(lambda: [split_EV(upcard) for upcard in UPCARDS]), 20),
+        "create_dealer_prob_dist_table": (_cold(create_dealer_prob_dist_table, DEALER_UPCARDS), 20),
+        "create_optimal_table": (_cold(create_optimal_table, DEALER_UPCARDS), 20),
+        "create_soft_optimal_table": (_cold(create_soft_optimal_table, DEALER_UPCARDS), 20),
+        "create_split_optimal_table": (_cold(create_split_optimal_table, DEALER_UPCARDS), 20),
+        "create_all_tables": (_cold(lambda: [
+            create_optimal_table(DEALER_UPCARDS),
+            create_soft_optimal_table(DEALER_UPCARDS),
+            create_split_optimal_table(DEALER_UPCARDS),
+        ]), 20),
+    })
+
+    for simulations in (10_000, 100_000):
+        cases[f"monte_carlo_stand[{simulations}]"] = (_cold(monte_carlo_stand, simulations, 14, 8), 3)
+        cases[f"monte_carlo_hit[{simulations}]"] = (_cold(monte_carlo_hit, simulations, [10, 2], 4), 3)
+
+    for simulations in (100_000, 1_000_000, 10_000_000):
+        cases[f"batch_monte_carlo_stand[{simulations}]"] = (_cold(batch_monte_carlo_stand, simulations, 14, 8, seed=0), 3)
+        cases[f"batch_monte_carlo_hit[{simulations}]"] = (_cold(batch_monte_carlo_hit, simulations, [10, 2], 4, seed=0), 3)
+
+    cases["stream_monte_carlo_stand[precision=0.001]"] = (_cold(lambda: list(stream_monte_carlo_stand(14, 8, precision=0.001, seed=0))), 3)
+
+    cases["monte_carlo_stand_hit[1000000,crn+antithetic+control]"] = (
+        _cold(monte_carlo_stand_hit, 1_000_000, [10, 2], 4, VARIANCE_REDUCTION_MODES, seed=0), 3)
+
+    cases["simulate_basic_strategy[1000000]"] = (_cold(simulate_basic_strategy, 1_000_000, seed=0), 3)
+
+    cases["parallel_monte_carlo_stand[10000000]"] = (_cold(parallel_monte_carlo_stand, 10_000_000, 14, 8, seed=0), 3)
+
+    cases["count_tensor[6 decks, true count 3]"] = (_cold(count_tensor, representative_counts(3, 6)), 3)
+
+    strategy = BasicStrategy()
+    cases["batch_simulate_shoe[1000000]"] = (_cold(batch_simulate_shoe, 1_000_000, strategy, seed=0), 3)
+    cases["simulate_table[7 seats, 1000000]"] = (_cold(simulate_table, 1_000_000, [strategy] * 7, seed=0, heads_up=False), 3)
+    cases["simulate_bankroll[1000x1000]"] = (
+        _cold(simulate_bankroll, 1_000, 1_000, strategy, {1: 1, 2: 4, 3: 8}, 200, seed=0, workers=1), 3)
+
+    return cases
+
+
+def run_benchmark(func, repeat: int) -> dict:
+    """
+    Time a benchmark and measure its peak memory.
+
+    Args:
+        func: The benchmark callable.
+        repeat (int): The number of timed repetitions.
+
+    Returns:
+        dict: The median and minimum wall time in seconds, calls per second and peak traced memory in bytes.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    # Memory is traced in a separate run, since tracing slows down the timed ones
+    tracemalloc.start()
+    func()
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    wall_time = statistics.median(times)
+    return {
+        "wall_time": wall_time,
+        "min_wall_time": min(times),
+        "calls_per_second": 1 / wall_time if wall_time > 0 else float("inf"),
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Compare benchmark results with a baseline run.
+
+    Returns:
+        list: A (name, baseline wall time, new wall time) tuple for every benchmark slower than the baseline by more than the threshold.
+    """
+    regressions = []
+    for name, result in results["benchmarks"].items():
+        previous = baseline["benchmarks"].get(name)
+        if previous and result["wall_time"] > previous["wall_time"] * (1 + threshold):
+            regressions.append((name, previous["wall_time"], result["wall_time"]))
+    return regressions
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the probability, table and Monte Carlo functions.")
+    parser.add_argument("--output", default="benchmark_results.json", help="File to write the results to, as JSON.")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare against.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown against the baseline before the run fails, as a fraction.")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this text.")
+    parser.add_argument("--profile", help="Also run each benchmark once under the Profiler and write its report to this "
+                                          "JSON file, with the collapsed stacks next to it as .folded.")
+    args = parser.parse_args(argv)
+
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "benchmarks": {},
+    }
+
+    for name, (func, repeat) in benchmark_cases().items():
+        if args.filter not in name:
+            continue
+        result = run_benchmark(func, repeat)
+        results["benchmarks"][name] = result
+        print(f"{name:45} {result['wall_time'] * 1000:12.3f} ms {result['calls_per_second']:12.1f} calls/s "
+              f"{result['peak_memory_bytes'] / 1024:12.1f} KiB")
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+
+    # Profiled runs are separate from the timed ones, since the instrumentation slows them down
+    if args.profile:
+        with Profiler() as profiler:
+            for name, (func, _) in benchmark_cases().items():
+                if args.filter in name and not name.startswith("import"):
+                    func()
+        profiler.save_json(args.profile)
+        profiler.save_collapsed(f"{os.path.splitext(args.profile)[0]}.folded")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = find_regressions(results, baseline, args.threshold)
+        for name, previous, current in regressions:
+            print(f"REGRESSION {name}: {previous * 1000:.3f} ms -> {current * 1000:.3f} ms")
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
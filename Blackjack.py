@@ -4,8 +4,8 @@ from Deck import Deck
 from Player import Player
 
 class Blackjack:
-    def __init__(self):
-        self.deck = Deck()
+    def __init__(self, num_decks: int = 1):
+        self.deck = Deck(num_decks)
         self.dealer = Player("Dealer")
         self.player = Player("Player")
     
@@ -24,7 +24,7 @@ class Blackjack:
             while rank not in self.deck.ranks:
                 rank = input("Enter a valid rank (A, 2, 3, 4, 5, 6, 7, 8, 9, T, J, Q, K): ").upper()
             card = Card(rank)
-            if card not in self.deck.list:
+            if card not in self.deck:
                 print("Card already chosen. Enter a different card.")
                 continue
             self.deck.remove_card(card)
@@ -46,7 +46,7 @@ class Blackjack:
 
     def deal_card(self, player: Player):
         """Deal a card to a player from the deck."""
-        card = self.deck.draw_card()
+        card = self.deck.deal_card()
         player.hand.add_card(card)
         return card
 
@@ -64,22 +64,44 @@ class Blackjack:
                 print("Player stands.")
                 break
 
-    def dealer_turn(self):
+    def dealer_turn(self, display: bool = True):
         """Handle the dealer's turn."""
         while self.dealer.hand.value() < 17:
             self.deal_card(self.dealer)
-        self.display_hands()
+        if display:
+            self.display_hands()
 
-    def evaluate_hands(self):
-        """Evaluate and display the result of the game."""
+    @staticmethod
+    def is_blackjack(hand: Hand) -> bool:
+        """Check whether a hand is a natural Blackjack (21 with two cards)."""
+        return hand.size() == 2 and hand.value() == 21
+
+    def hand_result(self) -> float:
+        """Return the player's result in units of the bet: 1.5 for a Blackjack, 1 for a win, 0 for a push and -1 for a loss."""
         player_value = self.player.hand.value()
         dealer_value = self.dealer.hand.value()
+        player_blackjack = self.is_blackjack(self.player.hand)
+        dealer_blackjack = self.is_blackjack(self.dealer.hand)
 
-        if player_value > 21:
-            result = "Player busts! Dealer wins!"
+        if player_blackjack:
+            return 0 if dealer_blackjack else 1.5
+        elif player_value > 21 or dealer_blackjack:
+            return -1
         elif dealer_value > 21 or player_value > dealer_value:
-            result = "Player wins!"
+            return 1
         elif player_value < dealer_value:
+            return -1
+        return 0
+
+    def evaluate_hands(self):
+        """Evaluate and display the result of the game."""
+        player_result = self.hand_result()
+
+        if self.player.hand.value() > 21:
+            result = "Player busts! Dealer wins!"
+        elif player_result > 0:
+            result = "Player wins!"
+        elif player_result < 0:
             result = "Dealer wins!"
         else:
             result = "Push! It's a tie!"
@@ -106,6 +128,41 @@ class Blackjack:
             self.dealer_turn()
         self.evaluate_hands()
 
+    def play_round(self, strategy) -> float:
+        """
+        Play a round of blackjack from the deck without prompting, with the strategy choosing the player's actions.
+
+        The strategy must provide decide(hand, dealer_upcard) returning 'h' (hit), 's' (stand) or 'd' (double down,
+        played as a hit after the first decision). The dealer does not peek, so a dealer Blackjack is only revealed
+        once the player has finished.
+
+        Returns:
+            float: The player's result in units of the initial bet.
+        """
+        self.dealer.hand.clear()
+        self.player.hand.clear()
+        for player in (self.player, self.dealer, self.player, self.dealer):
+            self.deal_card(player)
+
+        bet = 1
+        dealer_upcard = self.dealer.hand.cards[0].value()
+        if not self.is_blackjack(self.player.hand):
+            while self.player.hand.value() < 21:
+                action = strategy.decide(self.player.hand, dealer_upcard)
+                if action == 'd' and self.player.hand.size() == 2:
+                    bet = 2
+                    self.deal_card(self.player)
+                    break
+                elif action in ('h', 'd'):
+                    self.deal_card(self.player)
+                else:
+                    break
+
+            if self.player.hand.value() <= 21:
+                self.dealer_turn(display=False)
+
+        return bet * self.hand_result()
+
 # To use the class, create an instance and call play_game()
 # game = Blackjack()
 # game.play_game()
\ No newline at end of file
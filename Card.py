@@ -1,23 +1,38 @@
 from collections.abc import Iterable
 
+# Ranks in the order of their integer codes, and the value of each rank (the ace counts as 11)
+RANKS = ("A", "2", "3", "4", "5", "6", "7", "8", "9", "T", "J", "Q", "K")
+RANK_VALUES = (11, 2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10)
+RANK_CODES = {rank: code for code, rank in enumerate(RANKS)}
+
 
 class Card:
+    __slots__ = ("rank", "code", "_value")
+
     def __init__(self, rank: str) -> None:
         self.rank = rank
+        # Unknown ranks get code -1 and are worth nothing
+        self.code = RANK_CODES.get(rank, -1)
+        self._value = RANK_VALUES[self.code] if self.code >= 0 else 0
+
+    @classmethod
+    def from_code(cls, code: int) -> "Card":
+        return CARDS[code]
 
     def value(self) -> int:
-        if self.rank in "23456789":
-            return int(self.rank)
-        elif self.rank in "TJQK":
-            return 10
-        elif self.rank == "A":
-            return 11
-        return 0
+        return self._value
     
     def __eq__(self, other: "Card") -> bool:
         if not isinstance(other, Card):
             return False
         return self.rank == other.rank
+
+    def __hash__(self) -> int:
+        return hash(self.rank)
     
     def __str__(self) -> str:
         return self.rank
+
+
+# One shared card per rank, indexed by code
+CARDS = tuple(Card(rank) for rank in RANKS)
@@ -0,0 +1,281 @@
+import argparse
+import asyncio
+import json
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from ProbabilityFunctions import *
+from ShoeProbabilityFunctions import (shoe_probability_distribution, shoe_stand_EV, shoe_action_EV, shoe_split_EV, shoe_cache_size,
+                                      clear_shoe_cache)
+from Rules import Rules, DEFAULT_RULES
+
+# Number of composition-dependent answers kept by the server
+DEFAULT_CACHE_SIZE = 100_000
+
+# Number of rule sets given by queries whose infinite-deck answers are kept, besides the server's own
+DEFAULT_RULES_CACHE_SIZE = 8
+
+# Number of memoized finite-shoe states a worker keeps before starting over, which bounds its memory
+SHOE_CACHE_LIMIT = 2_000_000
+
+
+def _card_value(card) -> int:
+    """Convert a card given as a value or label ("A", "K", ...) into its value (11 is the ace)."""
+    if card in ("A", 1, 11):
+        return 11
+    if card in ("T", "J", "Q", "K"):
+        return 10
+    return int(card)
+
+
+def _parse_hand(query: dict) -> tuple:
+    """
+    Read the player's hand from a query.
+
+    A hand is given either as "cards" (a list of card values or labels), as "pair" (the value of each card of a
+    pair), or as "total" with an optional "soft" flag. Hands given by total are treated as two-card hands.
+
+    Returns:
+        tuple: (hand total, whether the hand is soft, pair card value or None, whether this is the first decision).
+    """
+    if "cards" in query:
+        cards = [_card_value(card) for card in query["cards"]]
+        if len(cards) < 2:
+            raise ValueError("A hand needs at least two cards.")
+        total, is_soft = 0, False
+        for card in cards:
+            total, is_soft = add_card_to_total(total, is_soft, card)
+        pair = cards[0] if len(cards) == 2 and cards[0] == cards[1] else None
+        return total, is_soft, pair, len(cards) == 2
+
+    if "pair" in query:
+        card = _card_value(query["pair"])
+        total, is_soft = add_card_to_total(card, card == 11, card)
+        return total, is_soft, card, True
+
+    return int(query["total"]), bool(query.get("soft", False)), None, True
+
+
+def _best(evs: dict) -> dict:
+    """Build an answer from the EV of each available action."""
+    return {"action": max(evs, key=evs.get), "evs": evs}
+
+
+def _tensor_answers(rules: Rules) -> dict:
+    """
+    Precompute the infinite-deck answer for every upcard and hand state of a rule set.
+
+    Returns:
+        dict: A dictionary mapping (upcard, hand state, first decision) to an answer. Doubling, splitting and
+              surrendering are only offered on the first decision. With a dealer peek, a later decision is only
+              reached once the dealer is known not to have Blackjack, so its EVs are conditioned on that.
+    """
+    ev = ev_tensor(rules)
+    answers = {}
+    for i, upcard in enumerate(UPCARDS):
+        # Undo the peek adjustment (1 - p) * ev - p of the tensor to get the EVs given no dealer Blackjack
+        blackjack_prob = probability_distribution(upcard, rules)["BJ"] if rules.dealer_peek else 0.0
+        for state in range(BLACKJACK):
+            values = {ACTIONS[action]: float(value) for action, value in enumerate(ev[i, state]) if not np.isnan(value)}
+            answers[upcard, state, True] = _best(values)
+            answers[upcard, state, False] = _best({
+                action: (values[action] + blackjack_prob) / (1 - blackjack_prob) for action in ("Stand", "Hit")
+            })
+    return answers
+
+
+def shoe_answer(dealer_upcard: int, counts: tuple, total: int, is_soft: bool, first_decision: bool, rules: Rules,
+                pair: int = None) -> dict:
+    """
+    Calculate the composition-dependent answer for a hand. Executed in a worker process.
+
+    As in the infinite-deck answers, later decisions under a dealer peek are conditioned on the dealer not having
+    Blackjack.
+
+    Args:
+        dealer_upcard (int): The dealer's upcard value (must be between 2 and 11, inclusive).
+        counts (tuple): The cards left in the shoe, in the order of SHOE_CARDS, with the upcard and the player's cards removed.
+        total (int): The player's hand total.
+        is_soft (bool): Whether the hand contains an ace counted as 11.
+        first_decision (bool): Whether the hand still has two cards, so doubling and surrendering are possible.
+        rules (Rules): The table rules.
+        pair (int, optional): The value of each card if the hand is a pair that may be split. Defaults to None.
+
+    Returns:
+        dict: The best action and the EV of each available action.
+    """
+    evs = {
+        "Stand": shoe_stand_EV(dealer_upcard, counts, rules)[total],
+        "Hit": shoe_action_EV(dealer_upcard, counts, total, is_soft, rules=rules),
+    }
+    if not first_decision and rules.dealer_peek:
+        # Stand and hit EVs lose the whole bet to a dealer Blackjack, which the peek has ruled out
+        blackjack_prob = shoe_probability_distribution(dealer_upcard, counts, rules)["BJ"]
+        evs = {action: (value + blackjack_prob) / (1 - blackjack_prob) for action, value in evs.items()}
+    if first_decision and rules.can_double(total):
+        evs["DD"] = shoe_action_EV(dealer_upcard, counts, total, is_soft, double_down=True, rules=rules)
+    if first_decision and rules.surrender != "none":
+        evs["Surrender"] = surrender_EV(shoe_probability_distribution(dealer_upcard, counts, rules)["BJ"], rules)
+    if first_decision and pair:
+        evs["Split"] = shoe_split_EV(dealer_upcard, counts, pair, rules)
+
+    if shoe_cache_size() > SHOE_CACHE_LIMIT:
+        clear_shoe_cache()
+    return _best(evs)
+
+
+class DecisionService:
+    """
+    Answers "best action and EV of each action" queries, independently of how they arrive.
+
+    Infinite-deck answers are precomputed from the EV tensor for each rule set, so they are a dictionary lookup.
+    The server's own rules are always kept; those of up to rules_cache_size other rule sets given by queries are
+    kept in an LRU cache, and the EV tensors of evicted rule sets are removed from the strategy cache.
+    Queries with a "shoe" count vector get composition-dependent answers from the finite-shoe engine, kept in an
+    LRU cache. Cache misses are computed in a process pool, so other connections are answered in the meantime.
+    """
+
+    def __init__(self, rules: Rules = DEFAULT_RULES, cache_size: int = DEFAULT_CACHE_SIZE, workers: int = None,
+                 rules_cache_size: int = DEFAULT_RULES_CACHE_SIZE) -> None:
+        self.rules = rules
+        self.cache_size = cache_size
+        self.rules_cache_size = rules_cache_size
+        self.shoe_answers = OrderedDict()
+        self.tensor_answers = OrderedDict({rules: _tensor_answers(rules)})
+        self.executor = ProcessPoolExecutor(max_workers=workers) if workers != 0 else None
+
+    def close(self) -> None:
+        """Shut down the worker processes."""
+        if self.executor:
+            self.executor.shutdown()
+
+    def _rules(self, query: dict) -> Rules:
+        return Rules(**query["rules"]) if "rules" in query else self.rules
+
+    def _tensor_answers(self, rules: Rules) -> dict:
+        """Get the infinite-deck answers of a rule set, computing them if they are not cached."""
+        answers = self.tensor_answers.get(rules)
+        if answers is not None:
+            self.tensor_answers.move_to_end(rules)
+            return answers
+
+        answers = self.tensor_answers[rules] = _tensor_answers(rules)
+        if len(self.tensor_answers) > self.rules_cache_size + 1:
+            evicted = next(cached for cached in self.tensor_answers if cached != self.rules)
+            del self.tensor_answers[evicted]
+            clear_cache(evicted)
+        return answers
+
+    def cached_answer(self, query: dict):
+        """
+        Answer a query without computing anything new.
+
+        Returns:
+            tuple: (answer or None, key of the composition-dependent answer to compute, or None).
+        """
+        rules = self._rules(query)
+        dealer_upcard = _card_value(query["upcard"])
+        total, is_soft, pair, first_decision = _parse_hand(query)
+
+        if "shoe" not in query:
+            state = pair_state(pair) if pair and first_decision else hand_state(total, is_soft)
+            return self._tensor_answers(rules)[dealer_upcard, state, first_decision], None
+
+        key = (dealer_upcard, tuple(query["shoe"]), total, is_soft, first_decision, rules, pair if first_decision else None)
+        answer = self.shoe_answers.get(key)
+        if answer is not None:
+            self.shoe_answers.move_to_end(key)
+        return answer, key
+
+    async def answer(self, query: dict) -> dict:
+        """Answer one query, computing a composition-dependent answer if it is not cached."""
+        answer, key = self.cached_answer(query)
+        if answer is None:
+            if self.executor:
+                answer = await asyncio.get_running_loop().run_in_executor(self.executor, shoe_answer, *key)
+            else:
+                answer = shoe_answer(*key)
+            self.shoe_answers[key] = answer
+            if len(self.shoe_answers) > self.cache_size:
+                self.shoe_answers.popitem(last=False)
+        return answer
+
+    async def respond(self, query: dict) -> dict:
+        """Answer one query, reporting errors in the response rather than raising them."""
+        if not isinstance(query, dict):
+            return {"error": f"TypeError: A query must be a JSON object, not {json.dumps(query)}."}
+        try:
+            response = dict(await self.answer(query))
+        except (KeyError, TypeError, ValueError) as error:
+            response = {"error": f"{type(error).__name__}: {error}"}
+        if "id" in query:
+            response["id"] = query["id"]
+        return response
+
+    async def handle_line(self, line: str) -> str:
+        """
+        Answer one line of the JSON-lines protocol.
+
+        A line holds either one query object or a list of queries, answered with a list in the same order. The queries
+        of a list are answered concurrently, so their composition-dependent answers are computed in parallel.
+        """
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as error:
+            return json.dumps({"error": f"Invalid JSON: {error}"})
+
+        if isinstance(request, list):
+            return json.dumps(await asyncio.gather(*(self.respond(query) for query in request)))
+        return json.dumps(await self.respond(request))
+
+
+async def _serve_connection(service: DecisionService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Answer the queries of one socket connection in order."""
+    try:
+        while line := await reader.readline():
+            if line.strip():
+                writer.write((await service.handle_line(line)).encode() + b"\n")
+                await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve_socket(service: DecisionService, path: str) -> None:
+    """Serve the JSON-lines protocol on a Unix socket until cancelled."""
+    server = await asyncio.start_unix_server(lambda reader, writer: _serve_connection(service, reader, writer), path=path)
+    async with server:
+        await server.serve_forever()
+
+
+async def serve_stdio(service: DecisionService) -> None:
+    """Serve the JSON-lines protocol on standard input and output until the input ends."""
+    loop = asyncio.get_running_loop()
+    while line := await loop.run_in_executor(None, sys.stdin.readline):
+        if line.strip():
+            sys.stdout.write(await service.handle_line(line) + "\n")
+            sys.stdout.flush()
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Answer blackjack decision queries as JSON lines.")
+    parser.add_argument("--socket", help="Unix socket to listen on. Defaults to standard input and output.")
+    parser.add_argument("--rules", default="{}", help='Default rules as JSON, e.g. {"hit_soft_17": true}.')
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE, help="Number of composition-dependent answers to keep.")
+    parser.add_argument("--rules-cache-size", type=int, default=DEFAULT_RULES_CACHE_SIZE,
+                        help="Number of other rule sets given by queries whose answers are kept.")
+    parser.add_argument("--workers", type=int, help="Worker processes for composition-dependent answers. 0 computes them inline.")
+    args = parser.parse_args(argv)
+
+    service = DecisionService(Rules(**json.loads(args.rules)), args.cache_size, args.workers, args.rules_cache_size)
+    try:
+        asyncio.run(serve_socket(service, args.socket) if args.socket else serve_stdio(service))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
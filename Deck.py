@@ -2,48 +2,80 @@ from Card import *
 import random
 class Deck:
     def __init__(self, num = 1) -> None:
-        self.ranks = ("A", "2", "3", "4", "5", "6", "7", "8", "9", "T", "J", "Q", "K")
-        self.list = [Card(rank) for rank in self.ranks] * 4 * num
-        self.original_copy_list = self.list
+        self.ranks = RANKS
+        # The shoe is a buffer of rank codes, dealt from the end, with a running count of each rank
+        self.shoe = bytearray(range(len(RANKS))) * 4 * num
+        self.counts = [4 * num] * len(RANKS)
+        self.original_shoe = bytes(self.shoe)
+        self.listeners = []
+
+    @property
+    def list(self) -> list:
+        """The remaining cards, in dealing order from last to first."""
+        return [CARDS[code] for code in self.shoe]
+
+    def add_listener(self, listener) -> None:
+        """Register a callable notified as listener(card, change) whenever a card leaves (-1) or joins (+1) the deck."""
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener) -> None:
+        self.listeners.remove(listener)
+
+    def _notify(self, card: Card, change: int) -> None:
+        for listener in self.listeners:
+            listener(card, change)
 
     def deal_card(self) -> Card:
-        if self.list:
-            card = self.list.pop()
+        if self.shoe:
+            code = self.shoe.pop()
+            self.counts[code] -= 1
+            card = CARDS[code]
+            self._notify(card, -1)
             return card
         else:
             raise IndexError("No more cards in the deck.")
     
-    def shuffle(self) -> None:
-        random.shuffle(self.list)
+    def shuffle(self, rng: random.Random = None) -> None:
+        (rng or random).shuffle(self.shoe)
 
     def reset(self) -> None:
-        self.list = self.original_copy_list
+        previous_counts = self.counts
+        self.shoe = bytearray(self.original_shoe)
+        self.counts = [self.original_shoe.count(code) for code in range(len(RANKS))]
+        # Listeners are told about every card that came back or went away
+        for code, (before, after) in enumerate(zip(previous_counts, self.counts)):
+            for _ in range(abs(after - before)):
+                self._notify(CARDS[code], 1 if after > before else -1)
 
     def size(self) -> int:
-        return len(self.list)
+        return len(self.shoe)
 
     def add_card(self, card: Card) -> None:
-        self.list.append(card)
+        self.shoe.append(card.code)
+        self.counts[card.code] += 1
+        self._notify(card, 1)
 
     def remove_card(self, card_to_remove: Card) -> None:
-        self.list.remove(card_to_remove)
+        if card_to_remove.code < 0 or not self.counts[card_to_remove.code]:
+            raise ValueError("Card is not in the deck.")
+        self.shoe.remove(card_to_remove.code)
+        self.counts[card_to_remove.code] -= 1
+        self._notify(card_to_remove, -1)
 
     def is_empty(self) -> bool:
-        return self.count == 0
+        return not self.shoe
     
     def get_value_dict(self) -> dict: 
         rank_count = {num: 0 for num in range(1, 11)}
-        tens = ["T", "J", "Q", "K"]
-        for card in self.list:
-            if (card.rank == 'A'):
-                rank_count[1] += 1
-            elif (card.rank in tens):
-                rank_count[10] += 1
-            else:
-                rank_count[int(card.rank)] += 1
+        for code, count in enumerate(self.counts):
+            # Aces are counted under 1, and every ten-valued rank under 10
+            rank_count[1 if code == 0 else RANK_VALUES[code]] += count
         return rank_count
+
+    def __contains__(self, card: Card) -> bool:
+        return card.code >= 0 and self.counts[card.code] > 0
     
     def __str__(self) -> str:
-        return ", ".join(str(card) for card in self.list)
+        return ", ".join(RANKS[code] for code in self.shoe)
         
-    
\ No newline at end of file
+    
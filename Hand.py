@@ -2,28 +2,44 @@ from Card import *
 from typing import Optional
 
 class Hand:
+    __slots__ = ("cards", "_hard_total", "_has_ace")
+
     def __init__(self, card_list: Optional[list] = None) -> None:
         if card_list == None:
             self.cards = []
         else:
             self.cards = card_list
+        # Running total with every ace counted as 1, kept up to date by add_card
+        self._hard_total = sum(1 if card.code == 0 else card.value() for card in self.cards)
+        self._has_ace = any(card.code == 0 for card in self.cards)
 
     def add_card(self, card: Card) -> None:
         self.cards.append(card)
+        if card.code == 0:
+            self._hard_total += 1
+            self._has_ace = True
+        else:
+            self._hard_total += card.value()
+
+    def clear(self) -> None:
+        self.cards = []
+        self._hard_total = 0
+        self._has_ace = False
 
     def value(self) -> int:
-        value = sum(card.value() for card in self.cards)
-        num_aces = sum(1 for card in self.cards if card.rank == 'A')
-        while value > 21 and num_aces > 0:
-            value -= 10
-            num_aces -= 1
-        return value
+        # Two aces can never both count as 11, so at most one ace adds the extra 10
+        if self._has_ace and self._hard_total <= 11:
+            return self._hard_total + 10
+        return self._hard_total
+
+    def is_soft(self) -> bool:
+        return self._has_ace and self._hard_total <= 11
     
     def size(self) -> int:
         return len(self.cards)
 
     def is_bust(self) -> bool:
-        return self.value() > 21
+        return self._hard_total > 21
     
     def __eq__(self, other: "Hand") -> bool:
         if not isinstance(other, Hand):
@@ -32,4 +48,4 @@ class Hand:
     
     def __str__(self) -> str:
         return ", ".join(str(card) for card in self.cards)
-    
\ No newline at end of file
+    
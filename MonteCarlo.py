@@ -1,8 +1,17 @@
 from Blackjack import *
 import random
-import decimal
+import os
+import statistics
+import numpy as np
+from ProbabilityFunctions import (CARD_PROBABILITIES, UPCARDS, NUM_STATES, BLACKJACK, ACTIONS, add_card_to_total,
+                                  probability_distribution, ev_tensor, hand_state, pair_state)
+from Rules import Rules, DEFAULT_RULES
+from StrategyStore import ACTIONS as CHART_ACTIONS, HARD, SOFT, PAIR, build_chart
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from itertools import count, repeat
 
-def dealer_action(dealer_upcard: int) -> int:
+def dealer_action(dealer_upcard: int, rules: Rules = DEFAULT_RULES) -> int:
     """
     Perform the dealer's actions according to the game rules and return the dealer's final hand value.
     Intended for Monte Carlo functions.
@@ -10,8 +19,8 @@ def dealer_action(dealer_upcard: int) -> int:
     dealer_hand = [dealer_upcard]
     deck = [2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10, 11]
     
-    # Dealer draws cards until the hand value is at least 17
-    while sum(dealer_hand) < 17:
+    # Dealer draws cards until the hand value is at least 17, and on a soft 17 if the rules say so
+    while sum(dealer_hand) < 17 or (rules.hit_soft_17 and sum(dealer_hand) == 17 and 11 in dealer_hand):
         dealer_hand.append(random.choice(deck))
         
         # Handle soft aces during drawing
@@ -20,7 +29,7 @@ def dealer_action(dealer_upcard: int) -> int:
 
     return sum(dealer_hand)
 
-def monte_carlo_stand(simulations: int, player_hand_value: int, dealer_upcard: int) -> decimal.Decimal:
+def monte_carlo_stand(simulations: int, player_hand_value: int, dealer_upcard: int, rules: Rules = DEFAULT_RULES) -> float:
     """
     Simulate the outcome of standing in blackjack through Monte Carlo simulation.
     5 million simulations take about 15 seconds.
@@ -28,7 +37,7 @@ def monte_carlo_stand(simulations: int, player_hand_value: int, dealer_upcard: i
     wins, losses = 0, 0
     
     for _ in range(simulations):
-        dealer_value = dealer_action(dealer_upcard)
+        dealer_value = dealer_action(dealer_upcard, rules)
         
         if player_hand_value > 21:
             losses += 1
@@ -37,9 +46,9 @@ def monte_carlo_stand(simulations: int, player_hand_value: int, dealer_upcard: i
         elif dealer_value > player_hand_value:
             losses += 1
     
-    return decimal.Decimal(wins - losses) / decimal.Decimal(simulations)
+    return (wins - losses) / simulations
 
-def monte_carlo_hit(simulations: int, player_hand: list, dealer_upcard: int) -> decimal.Decimal:
+def monte_carlo_hit(simulations: int, player_hand: list, dealer_upcard: int, rules: Rules = DEFAULT_RULES) -> float:
     """
     Simulate the outcome of hitting in blackjack through Monte Carlo simulation.
     """
@@ -57,7 +66,7 @@ def monte_carlo_hit(simulations: int, player_hand: list, dealer_upcard: int) ->
             current_hand[current_hand.index(11)] = 1
             player_hand_value = sum(current_hand)
         
-        dealer_value = dealer_action(dealer_upcard)
+        dealer_value = dealer_action(dealer_upcard, rules)
         
         if player_hand_value > 21:
             losses += 1
@@ -66,4 +75,838 @@ def monte_carlo_hit(simulations: int, player_hand: list, dealer_upcard: int) ->
         elif dealer_value > player_hand_value:
             losses += 1
     
-    return decimal.Decimal(wins - losses) / decimal.Decimal(simulations)
\ No newline at end of file
+    return (wins - losses) / simulations
+
+# Card values of an infinite deck, one entry per rank (11 is the ace)
+DECK_VALUES = np.array([2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10, 11], dtype=np.int8)
+
+# Number of hands simulated at once by the batch functions, which bounds their memory use
+BATCH_SIZE = 1_000_000
+
+def _draw_cards(rng: np.random.Generator, size: int) -> np.ndarray:
+    """Draw card values from an infinite deck."""
+    return DECK_VALUES[rng.integers(0, len(DECK_VALUES), size=size, dtype=np.int8)]
+
+def _add_cards(totals: np.ndarray, soft_aces: np.ndarray, cards: np.ndarray) -> None:
+    """
+    Add one card to each hand in place, counting an ace as 1 where an 11 would bust the hand.
+
+    Args:
+        totals (np.ndarray): The hand totals, with soft aces counted as 11. Must be 21 or less.
+        soft_aces (np.ndarray): The number of aces in each hand still counted as 11.
+        cards (np.ndarray): The value of the card added to each hand.
+    """
+    totals += cards
+    soft_aces += cards == 11
+
+    # Handle soft aces during drawing. One card can push a hand of 21 or less at most 11 over,
+    # so turning a single ace into a 1 is always enough.
+    convert = (totals > 21) & (soft_aces > 0)
+    np.subtract(totals, 10, out=totals, where=convert)
+    np.subtract(soft_aces, 1, out=soft_aces, where=convert)
+
+def _dealer_step_table(draws: int, hit_soft_17: bool = False) -> np.ndarray:
+    """
+    Build a lookup table of the dealer's hand after drawing up to a number of cards.
+
+    Dealer hands are encoded as total + 32 for soft totals. Hands the dealer stands on are left unchanged.
+
+    Args:
+        draws (int): The number of cards drawn in one step.
+        hit_soft_17 (bool, optional): Whether the dealer hits soft 17. Defaults to False.
+
+    Returns:
+        np.ndarray: A table indexed by [encoded hand, card sequence] giving the encoded hand after the draws,
+                    where a card sequence is the base-13 number formed by the ranks drawn (indices into DECK_VALUES).
+    """
+    codes = np.arange(64)
+    totals = (codes % 32).astype(np.int8)
+    soft_aces = (codes >= 32).astype(np.int8)
+    table = codes.reshape(-1, 1)
+
+    for _ in range(draws):
+        # Each existing sequence is extended by every rank
+        next_totals = np.repeat(totals[table], len(DECK_VALUES), axis=1)
+        next_soft_aces = np.repeat(soft_aces[table], len(DECK_VALUES), axis=1)
+        cards = np.tile(DECK_VALUES, table.shape[1])
+        standing = (next_totals > 17) | ((next_totals == 17) & ~(hit_soft_17 & (next_soft_aces > 0)))
+
+        _add_cards(next_totals, next_soft_aces, np.broadcast_to(cards, next_totals.shape))
+        table = np.where(standing, np.repeat(table, len(DECK_VALUES), axis=1), next_totals + 32 * (next_soft_aces > 0))
+
+    return table.astype(np.int8)
+
+# Number of dealer cards drawn per vectorized pass, and the matching lookup tables for S17 and H17
+_DEALER_DRAWS = 3
+_DEALER_STEP = {hit_soft_17: _dealer_step_table(_DEALER_DRAWS, hit_soft_17).ravel() for hit_soft_17 in (False, True)}
+
+# Encoded dealer hand of a soft 17, which H17 dealers keep drawing to
+_SOFT_17 = 17 + 32
+
+def dealer_action_batch(simulations: int, dealer_upcard: int, rng: np.random.Generator, rules: Rules = DEFAULT_RULES) -> np.ndarray:
+    """
+    Play out many dealer hands at once and return the dealer's final hand values, in no particular order.
+    Vectorized counterpart of dealer_action.
+    """
+    sequences = len(DECK_VALUES) ** _DEALER_DRAWS
+    step = _DEALER_STEP[rules.hit_soft_17]
+    codes = np.full(simulations, dealer_upcard + 32 * (dealer_upcard == 11), dtype=np.intp)
+    final_totals = []
+
+    # Each pass draws several cards per hand at once. Finished hands are set aside, so later passes
+    # only work on the few hands still drawing.
+    while codes.size:
+        codes *= sequences
+        codes += rng.integers(0, sequences, size=codes.size)
+        codes = step[codes].astype(np.intp)
+        totals = codes % 32
+        done = totals >= 17
+        if rules.hit_soft_17:
+            done &= codes != _SOFT_17
+        final_totals.append(totals[done].astype(np.int8))
+        codes = codes[~done]
+
+    return np.concatenate(final_totals)
+
+def _count_outcomes(player_values: np.ndarray, dealer_values: np.ndarray) -> tuple:
+    """Count the wins, losses and pushes of player hands against dealer hands."""
+    player_bust = player_values > 21
+    wins = int(np.count_nonzero(~player_bust & ((dealer_values > 21) | (dealer_values < player_values))))
+    losses = int(np.count_nonzero(player_bust | ((dealer_values <= 21) & (dealer_values > player_values))))
+    return wins, losses, len(dealer_values) - wins - losses
+
+def _ev_and_error(wins: int, losses: int, pushes: int) -> tuple:
+    """
+    Turn outcome counts into an expected value and the standard error of that estimate.
+
+    Returns:
+        tuple: (expected value, standard error), both per unit bet.
+    """
+    simulations = wins + losses + pushes
+    ev = (wins - losses) / simulations
+    if simulations < 2:
+        return ev, float("nan")
+
+    # Every outcome is +1, -1 or 0, so the second moment is the share of decided hands
+    variance = ((wins + losses) / simulations - ev ** 2) * simulations / (simulations - 1)
+    return ev, float(np.sqrt(variance / simulations))
+
+def _stand_counts(simulations: int, player_hand_value: int, dealer_upcard: int, rules: Rules, rng: np.random.Generator) -> tuple:
+    """Simulate standing in batches and return the counts of wins, losses and pushes."""
+    wins, losses, pushes = 0, 0, 0
+    for start in range(0, simulations, BATCH_SIZE):
+        size = min(BATCH_SIZE, simulations - start)
+        dealer_values = dealer_action_batch(size, dealer_upcard, rng, rules)
+        batch_wins, batch_losses, batch_pushes = _count_outcomes(np.int8(player_hand_value), dealer_values)
+        wins, losses, pushes = wins + batch_wins, losses + batch_losses, pushes + batch_pushes
+    return wins, losses, pushes
+
+def _hand_value(player_hand: list) -> tuple:
+    """
+    Get the value of a hand of card values, counting aces as 1 until the hand is 21 or less.
+
+    Returns:
+        tuple: (hand value, number of aces still counted as 11).
+    """
+    hand_value, hand_soft_aces = sum(player_hand), player_hand.count(11)
+    while hand_value > 21 and hand_soft_aces > 0:
+        hand_value, hand_soft_aces = hand_value - 10, hand_soft_aces - 1
+    return hand_value, hand_soft_aces
+
+def _hit_counts(simulations: int, player_hand: list, dealer_upcard: int, rules: Rules, rng: np.random.Generator) -> tuple:
+    """Simulate hitting once and standing in batches and return the counts of wins, losses and pushes."""
+    hand_value, hand_soft_aces = _hand_value(player_hand)
+
+    wins, losses, pushes = 0, 0, 0
+    for start in range(0, simulations, BATCH_SIZE):
+        size = min(BATCH_SIZE, simulations - start)
+        player_values = np.full(size, hand_value, dtype=np.int8)
+        soft_aces = np.full(size, hand_soft_aces, dtype=np.int8)
+        _add_cards(player_values, soft_aces, _draw_cards(rng, size))
+
+        dealer_values = dealer_action_batch(size, dealer_upcard, rng, rules)
+        batch_wins, batch_losses, batch_pushes = _count_outcomes(player_values, dealer_values)
+        wins, losses, pushes = wins + batch_wins, losses + batch_losses, pushes + batch_pushes
+    return wins, losses, pushes
+
+def batch_monte_carlo_stand(simulations: int, player_hand_value: int, dealer_upcard: int, seed=None, rules: Rules = DEFAULT_RULES) -> tuple:
+    """
+    Simulate the outcome of standing in blackjack through vectorized Monte Carlo simulation.
+    Returns the expected value and its standard error. Passing the same seed reproduces the same result.
+    """
+    rng = np.random.default_rng(seed)
+    return _ev_and_error(*_stand_counts(simulations, player_hand_value, dealer_upcard, rules, rng))
+
+def batch_monte_carlo_hit(simulations: int, player_hand: list, dealer_upcard: int, seed=None, rules: Rules = DEFAULT_RULES) -> tuple:
+    """
+    Simulate the outcome of hitting in blackjack through vectorized Monte Carlo simulation.
+    Returns the expected value and its standard error. Passing the same seed reproduces the same result.
+    """
+    rng = np.random.default_rng(seed)
+    return _ev_and_error(*_hit_counts(simulations, player_hand, dealer_upcard, rules, rng))
+
+def _shard_counts(count_function, simulations: int, args: tuple, seed_sequence: np.random.SeedSequence) -> tuple:
+    """Run one shard of a simulation with its own random stream. Executed in a worker process."""
+    return count_function(simulations, *args, np.random.default_rng(seed_sequence))
+
+def _parallel_counts(count_function, simulations: int, args: tuple, seed, workers) -> tuple:
+    """
+    Split a simulation into shards of BATCH_SIZE hands and run them across a process pool.
+
+    Each shard draws from its own seed sequence spawned from the given seed, and the shards are the same
+    however many workers run them. The merged counts are therefore identical for a given seed whatever
+    the number of workers.
+
+    Args:
+        count_function: The function simulating one shard and returning its wins, losses and pushes.
+        simulations (int): The total number of hands to simulate.
+        args (tuple): The arguments describing the hand, passed to count_function.
+        seed: The root seed. None draws fresh entropy from the operating system.
+        workers (int): The number of worker processes. None uses every core, 1 runs in this process.
+
+    Returns:
+        tuple: The total counts of wins, losses and pushes.
+    """
+    sizes = [min(BATCH_SIZE, simulations - start) for start in range(0, simulations, BATCH_SIZE)]
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(sizes))
+    shard_args = (repeat(count_function), sizes, repeat(args), seed_sequences)
+
+    if workers == 1:
+        shard_counts = list(map(_shard_counts, *shard_args))
+    else:
+        workers = workers or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # A few chunks per worker keeps the pool balanced without sending every shard separately
+            chunksize = max(1, len(sizes) // (4 * workers))
+            shard_counts = list(executor.map(_shard_counts, *shard_args, chunksize=chunksize))
+
+    wins, losses, pushes = (sum(counts) for counts in zip(*shard_counts))
+    return wins, losses, pushes
+
+def parallel_monte_carlo_stand(simulations: int, player_hand_value: int, dealer_upcard: int, seed=None, workers=None,
+                               rules: Rules = DEFAULT_RULES) -> tuple:
+    """
+    Simulate the outcome of standing in blackjack across multiple processes.
+    Returns the expected value and its standard error, bit-identical for a given seed whatever the number of workers.
+    """
+    return _ev_and_error(*_parallel_counts(_stand_counts, simulations, (player_hand_value, dealer_upcard, rules), seed, workers))
+
+def parallel_monte_carlo_hit(simulations: int, player_hand: list, dealer_upcard: int, seed=None, workers=None,
+                             rules: Rules = DEFAULT_RULES) -> tuple:
+    """
+    Simulate the outcome of hitting in blackjack across multiple processes.
+    Returns the expected value and its standard error, bit-identical for a given seed whatever the number of workers.
+    """
+    return _ev_and_error(*_parallel_counts(_hit_counts, simulations, (player_hand, dealer_upcard, rules), seed, workers))
+
+@dataclass(frozen=True)
+class RunningEstimate:
+    """
+    A Monte Carlo estimate of an expected value, as reported while the simulation runs.
+
+    Attributes:
+        simulations (int): The number of hands simulated so far.
+        ev (float): The expected value per unit bet.
+        standard_error (float): The standard error of ev.
+        low (float): The lower bound of the confidence interval of ev.
+        high (float): The upper bound of the confidence interval of ev.
+        stop_reason (str, optional): On the last estimate of a run, why it stopped: "precision" (the confidence
+                                     interval is narrow enough), "distinguishable" (the estimate differs
+                                     significantly from the analytic EV) or "max_simulations". None while the run
+                                     goes on.
+    """
+    simulations: int
+    ev: float
+    standard_error: float
+    low: float
+    high: float
+    stop_reason: str = None
+
+def _stream_counts(count_function, args: tuple, report_every: int, precision: float, reference: float,
+                   max_simulations: int, confidence: float, seed):
+    """
+    Simulate in rounds of report_every hands and yield a RunningEstimate after each round until a stop condition is met.
+
+    The confidence interval is the normal approximation ev +/- z * standard error. The estimate is compared with the
+    reference after every round, so round k tests at significance (1 - confidence) / (k (k + 1)). These sum to
+    1 - confidence, which bounds the chance of a false alarm over the whole run. Without a precision, a reference
+    or max_simulations, the stream never stops by itself.
+    """
+    rng = np.random.default_rng(seed)
+    normal = statistics.NormalDist()
+    z = normal.inv_cdf(0.5 + confidence / 2)
+    wins, losses, pushes = 0, 0, 0
+
+    for round_number in count(1):
+        simulations = wins + losses + pushes
+        size = report_every if max_simulations is None else min(report_every, max_simulations - simulations)
+        round_wins, round_losses, round_pushes = count_function(size, *args, rng)
+        wins, losses, pushes = wins + round_wins, losses + round_losses, pushes + round_pushes
+        simulations += size
+
+        ev, error = _ev_and_error(wins, losses, pushes)
+        half_width = z * error
+        stop_reason = None
+        if precision is not None and half_width <= precision:
+            stop_reason = "precision"
+        elif reference is not None and abs(ev - reference) > error * normal.inv_cdf(1 - (1 - confidence) / (2 * round_number * (round_number + 1))):
+            stop_reason = "distinguishable"
+        elif max_simulations is not None and simulations >= max_simulations:
+            stop_reason = "max_simulations"
+
+        yield RunningEstimate(simulations, ev, error, ev - half_width, ev + half_width, stop_reason)
+        if stop_reason:
+            return
+
+def _simulated_dealer_probs(dealer_upcard: int, rules: Rules = DEFAULT_RULES) -> dict:
+    """
+    Get the exact probabilities of the dealer's final values (17 to 21 and "bust") as the simulations see them.
+
+    The simulations count a dealer Blackjack as an ordinary 21, which a player 21 pushes.
+    """
+    dealer_probs = probability_distribution(dealer_upcard, rules)
+    dealer_probs[21] += dealer_probs.pop("BJ")
+    return dealer_probs
+
+def _simulated_stand_EV(dealer_upcard: int, rules: Rules = DEFAULT_RULES) -> dict:
+    """
+    Calculate the analytic expected value of standing on each total the way the simulations score it.
+
+    Only a player 21 differs from stand_EV, since it pushes a dealer Blackjack.
+    """
+    dealer_probs = _simulated_dealer_probs(dealer_upcard, rules)
+    bust_prob = dealer_probs.pop("bust")
+    return {
+        total: bust_prob + sum(prob if value < total else -prob if value > total else 0 for value, prob in dealer_probs.items())
+        for total in range(2, 22)
+    }
+
+def _hit_once_EV(player_hand: list, dealer_upcard: int, rules: Rules = DEFAULT_RULES) -> float:
+    """Calculate the analytic expected value of hitting once and standing, the play simulated by the hit functions."""
+    hand_value, hand_soft_aces = _hand_value(player_hand)
+    stand_values = _simulated_stand_EV(dealer_upcard, rules)
+    ev = 0
+    for card, card_prob in CARD_PROBABILITIES.items():
+        new_value, _ = add_card_to_total(hand_value, hand_soft_aces > 0, card)
+        ev += card_prob * (-1 if new_value > 21 else stand_values[new_value])
+    return ev
+
+def stream_monte_carlo_stand(player_hand_value: int, dealer_upcard: int, report_every: int = 100_000, precision: float = None,
+                             compare_analytic: bool = False, max_simulations: int = None, confidence: float = 0.95,
+                             seed=None, rules: Rules = DEFAULT_RULES):
+    """
+    Simulate standing in blackjack and yield the running estimate every report_every hands, stopping once it has converged.
+
+    Args:
+        player_hand_value (int): The player's hand value. Values above 21 are busted hands, which always lose.
+        dealer_upcard (int): The dealer's upcard value (must be between 2 and 11, inclusive).
+        report_every (int, optional): The number of hands simulated between estimates. Defaults to 100,000.
+        precision (float, optional): Stop once the half-width of the confidence interval is at most this. Defaults to None.
+        compare_analytic (bool, optional): Stop once the estimate differs significantly from the analytic EV, which
+                                           signals a disagreement between the simulation and the analytic model.
+                                           The analytic EV counts a dealer Blackjack as a 21, like the simulation,
+                                           and the chance of a false alarm over the whole run is at most
+                                           1 - confidence. Defaults to False.
+        max_simulations (int, optional): Stop after this many hands. Defaults to None.
+        confidence (float, optional): The confidence level of the interval. Defaults to 0.95.
+        seed (optional): The random seed. Passing the same seed reproduces the same estimates. Defaults to None.
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
+
+    Yields:
+        RunningEstimate: The estimate after each round. The last one holds the reason the simulation stopped.
+    """
+    reference = None
+    if compare_analytic:
+        # A busted total always loses, as monte_carlo_stand scores it. Every total below 17 is worth the same, so
+        # totals below 2 share the EV of 2.
+        reference = -1.0 if player_hand_value > 21 else _simulated_stand_EV(dealer_upcard, rules)[max(player_hand_value, 2)]
+    yield from _stream_counts(_stand_counts, (player_hand_value, dealer_upcard, rules), report_every, precision, reference,
+                              max_simulations, confidence, seed)
+
+def stream_monte_carlo_hit(player_hand: list, dealer_upcard: int, report_every: int = 100_000, precision: float = None,
+                           compare_analytic: bool = False, max_simulations: int = None, confidence: float = 0.95,
+                           seed=None, rules: Rules = DEFAULT_RULES):
+    """
+    Simulate hitting once and standing in blackjack and yield the running estimate every report_every hands,
+    stopping once it has converged.
+
+    The analytic value compared against is that of hitting once and standing rather than hit_EV, which plays the
+    hand on optimally. Other arguments are as for stream_monte_carlo_stand.
+
+    Yields:
+        RunningEstimate: The estimate after each round. The last one holds the reason the simulation stopped.
+    """
+    reference = _hit_once_EV(player_hand, dealer_upcard, rules) if compare_analytic else None
+    yield from _stream_counts(_hit_counts, (player_hand, dealer_upcard, rules), report_every, precision, reference,
+                              max_simulations, confidence, seed)
+
+# Variance-reduction techniques for monte_carlo_stand_hit, which can be combined
+VARIANCE_REDUCTION_MODES = ("crn", "antithetic", "control")
+
+def _dealer_values(simulations: int, dealer_upcard: int, rng: np.random.Generator, rules: Rules = DEFAULT_RULES,
+                   antithetic: bool = False) -> np.ndarray:
+    """
+    Play out many dealer hands at once like dealer_action_batch, but return the final values in hand order.
+
+    With antithetic, simulations must be even and the second half of the hands are the antithetic partners of the
+    first half: each card they draw is the mirror image of the partner's card in DECK_VALUES order (rank r becomes
+    rank 12 - r, so a 2 becomes an ace and a 3 a 10). Complementing a sequence code mirrors every card in it.
+    """
+    sequences = len(DECK_VALUES) ** _DEALER_DRAWS
+    step = _DEALER_STEP[rules.hit_soft_17]
+    half = simulations // 2
+    codes = np.full(simulations, dealer_upcard + 32 * (dealer_upcard == 11), dtype=np.intp)
+    values = np.empty(simulations, dtype=np.int8)
+    drawing = np.arange(simulations)
+
+    while drawing.size:
+        if antithetic:
+            # Partners that are both still drawing share their cards, mirrored. Once one has finished,
+            # the other's draws are still uniform.
+            draws = rng.integers(0, sequences, size=half)
+            partner = drawing >= half
+            sequence = draws[np.where(partner, drawing - half, drawing)]
+            sequence[partner] = sequences - 1 - sequence[partner]
+        else:
+            sequence = rng.integers(0, sequences, size=drawing.size)
+
+        hand_codes = step[codes[drawing] * sequences + sequence].astype(np.intp)
+        totals = hand_codes % 32
+        done = totals >= 17
+        if rules.hit_soft_17:
+            done &= hand_codes != _SOFT_17
+        codes[drawing] = hand_codes
+        values[drawing[done]] = totals[done]
+        drawing = drawing[~done]
+
+    return values
+
+def _hand_results(player_values: np.ndarray, dealer_values: np.ndarray) -> np.ndarray:
+    """Get the result of each player hand against the dealer hand at the same position: +1, -1 or 0."""
+    player_bust = player_values > 21
+    wins = ~player_bust & ((dealer_values > 21) | (dealer_values < player_values))
+    losses = player_bust | ((dealer_values <= 21) & (dealer_values > player_values))
+    return wins.astype(np.int8) - losses.astype(np.int8)
+
+def _dealer_controls(dealer_values: np.ndarray) -> np.ndarray:
+    """Get the indicators of the dealer's final values 17 to 21, one row per hand, leaving out busts since they sum to 1."""
+    return (dealer_values[:, None] == np.arange(17, 22)[None, :]).astype(float)
+
+class _ControlledMean:
+    """
+    Running sums for estimating a mean from independent samples, optionally adjusted with control variates.
+
+    Every sample is a value together with controls whose exact means are known. The sums of the products of
+    [1, controls, value] are all that is kept, so memory does not grow with the number of samples.
+    """
+
+    def __init__(self, num_controls: int = 0) -> None:
+        self.num_controls = num_controls
+        self.gram = np.zeros((num_controls + 2, num_controls + 2))
+
+    def add(self, values: np.ndarray, controls: np.ndarray = None) -> None:
+        columns = [np.ones(len(values)), values.astype(float)]
+        if self.num_controls:
+            columns[1:1] = controls.T
+        samples = np.column_stack(columns)
+        self.gram += samples.T @ samples
+
+    def estimate(self, control_means: np.ndarray = None) -> tuple:
+        """
+        Estimate the mean. With controls, the estimate is the regression estimator ybar - beta (cbar - control_means).
+
+        Returns:
+            tuple: (estimate, variance of the estimate, variance of a single sample).
+        """
+        count = self.gram[0, 0]
+        means = self.gram[0] / count
+        covariance = (self.gram[1:, 1:] - count * np.outer(means[1:], means[1:])) / (count - 1)
+        sample_variance = covariance[-1, -1]
+        estimate = means[-1]
+        if self.num_controls:
+            # Controls that never varied in the sample cannot help, so a least squares fit stands in for the inverse
+            beta = np.linalg.lstsq(covariance[:-1, :-1], covariance[:-1, -1], rcond=None)[0]
+            estimate -= beta @ (means[1:-1] - control_means)
+            sample_variance = covariance[-1, -1] - covariance[:-1, -1] @ beta
+            # What is left when the controls explain the value exactly is rounding error
+            if sample_variance <= 1e-12 * covariance[-1, -1]:
+                sample_variance = 0.0
+        return float(estimate), float(sample_variance / count), float(covariance[-1, -1])
+
+def _summary(estimate: float, variance: float, plain_variance: float) -> dict:
+    """Summarize an estimate with its standard error and its effective-sample-size gain over plain sampling."""
+    return {
+        "ev": estimate,
+        "standard_error": float(np.sqrt(variance)),
+        "ess_gain": float(plain_variance / variance) if variance > 0 else float("inf"),
+    }
+
+def monte_carlo_stand_hit(simulations: int, player_hand: list, dealer_upcard: int, variance_reduction: tuple = (),
+                          seed=None, rules: Rules = DEFAULT_RULES) -> dict:
+    """
+    Estimate the expected values of standing and of hitting once and standing on a hand, and their difference,
+    with optional variance reduction.
+
+    Modes in VARIANCE_REDUCTION_MODES can be combined:
+        "crn": Common random numbers. Standing and hitting are played against the same dealer hands, so the
+               dealer's luck cancels out of their difference.
+        "antithetic": Hands are simulated in pairs whose cards mirror each other (a 2 for an ace, a 3 for a 10 and
+                      so on), so a lucky hand tends to be balanced by an unlucky partner. An odd hand left over in
+                      a batch is not simulated.
+        "control": Control variates. The share of dealer hands ending on each value is compared with the exact
+                   probability_distribution, and the estimates are corrected by how far it strayed. For standing,
+                   the result only depends on the dealer's value, so this recovers the exact EV.
+
+    Each estimate reports its effective-sample-size gain: the variance plain independent sampling would have
+    with the same number of hands, divided by the variance achieved. Without "crn", the difference is estimated
+    from independent stand and hit simulations.
+
+    Args:
+        simulations (int): The number of hands to simulate for each action.
+        player_hand (list): The values of the player's cards (11 for an ace).
+        dealer_upcard (int): The dealer's upcard value (must be between 2 and 11, inclusive).
+        variance_reduction (tuple, optional): The modes to use. Defaults to none.
+        seed (optional): The random seed. Passing the same seed reproduces the same result. Defaults to None.
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
+
+    Returns:
+        dict: A dictionary mapping "Stand", "Hit" and "Hit - Stand" to their "ev", "standard_error" and "ess_gain".
+    """
+    unknown = set(variance_reduction) - set(VARIANCE_REDUCTION_MODES)
+    if unknown:
+        raise ValueError(f"Unknown variance reduction modes {sorted(unknown)}, expected some of {VARIANCE_REDUCTION_MODES}.")
+    crn, antithetic, control = (mode in variance_reduction for mode in VARIANCE_REDUCTION_MODES)
+
+    rng = np.random.default_rng(seed)
+    hand_value, hand_soft_aces = _hand_value(player_hand)
+    dealer_probs = _simulated_dealer_probs(dealer_upcard, rules)
+    control_means = np.array([dealer_probs[value] for value in range(17, 22)]) if control else None
+
+    # Estimates are built from independent units: single hands, or antithetic pairs averaged together
+    num_controls = 5 if control else 0
+    stand_mean, hit_mean, difference_mean = (_ControlledMean(num_controls) for _ in range(3))
+    stand_plain, hit_plain = _ControlledMean(), _ControlledMean()
+
+    def units(values: np.ndarray) -> np.ndarray:
+        return (values[:len(values) // 2] + values[len(values) // 2:]) / 2 if antithetic else values
+
+    for start in range(0, simulations, BATCH_SIZE):
+        size = min(BATCH_SIZE, simulations - start)
+        size -= size % 2 if antithetic else 0
+        if size == 0:
+            continue
+
+        stand_dealer = _dealer_values(size, dealer_upcard, rng, rules, antithetic)
+        hit_dealer = stand_dealer if crn else _dealer_values(size, dealer_upcard, rng, rules, antithetic)
+
+        ranks = rng.integers(0, len(DECK_VALUES), size=size // 2 if antithetic else size)
+        if antithetic:
+            ranks = np.concatenate((ranks, len(DECK_VALUES) - 1 - ranks))
+        player_values = np.full(size, hand_value, dtype=np.int8)
+        _add_cards(player_values, np.full(size, hand_soft_aces, dtype=np.int8), DECK_VALUES[ranks])
+
+        stand_results = _hand_results(np.int8(hand_value), stand_dealer)
+        hit_results = _hand_results(player_values, hit_dealer)
+        stand_plain.add(stand_results)
+        hit_plain.add(hit_results)
+
+        stand_controls = units(_dealer_controls(stand_dealer)) if control else None
+        hit_controls = units(_dealer_controls(hit_dealer)) if control else None
+        stand_mean.add(units(stand_results), stand_controls)
+        hit_mean.add(units(hit_results), hit_controls)
+        if crn:
+            difference_mean.add(units(hit_results.astype(np.int16) - stand_results), hit_controls)
+
+    # Plain sampling would average independent hands, so its variance comes from the spread of single hands
+    hands = stand_plain.gram[0, 0]
+    stand_hand_variance = stand_plain.estimate()[2]
+    hit_hand_variance = hit_plain.estimate()[2]
+
+    stand, stand_variance, _ = stand_mean.estimate(control_means)
+    hit, hit_variance, _ = hit_mean.estimate(control_means)
+    if crn:
+        difference, difference_variance, _ = difference_mean.estimate(control_means)
+    else:
+        difference, difference_variance = hit - stand, hit_variance + stand_variance
+
+    return {
+        "Stand": _summary(stand, stand_variance, stand_hand_variance / hands),
+        "Hit": _summary(hit, hit_variance, hit_hand_variance / hands),
+        "Hit - Stand": _summary(difference, difference_variance, (stand_hand_variance + hit_hand_variance) / hands),
+    }
+
+# Chart action codes used by the full-strategy simulation
+_CHART_STAND, _CHART_HIT, _CHART_DOUBLE, _CHART_SPLIT, _CHART_SURRENDER = (
+    CHART_ACTIONS.index(action) for action in ("Stand", "Hit", "DD", "Split", "Surrender"))
+
+def _finish_dealer_hands(codes: np.ndarray, rng: np.random.Generator, rules: Rules = DEFAULT_RULES) -> np.ndarray:
+    """
+    Play out dealer hands from their current state and return their final values, in order.
+
+    Args:
+        codes (np.ndarray): The dealer hands, encoded as total + 32 for soft totals.
+    """
+    sequences = len(DECK_VALUES) ** _DEALER_DRAWS
+    step = _DEALER_STEP[rules.hit_soft_17]
+    codes = codes.astype(np.intp)
+    values = np.empty(len(codes), dtype=np.int8)
+    drawing = np.arange(len(codes))
+
+    # Hands the dealer already stands on are left unchanged by the step table
+    while drawing.size:
+        hand_codes = step[codes[drawing] * sequences + rng.integers(0, sequences, size=drawing.size)].astype(np.intp)
+        totals = hand_codes % 32
+        done = totals >= 17
+        if rules.hit_soft_17:
+            done &= hand_codes != _SOFT_17
+        codes[drawing] = hand_codes
+        values[drawing[done]] = totals[done]
+        drawing = drawing[~done]
+
+    return values
+
+def _draw_to(hands: np.ndarray, totals: np.ndarray, soft_aces: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Add a card to some of the hands in place and return the values of the cards drawn."""
+    cards = _draw_cards(rng, hands.size)
+    hand_totals, hand_soft_aces = totals[hands], soft_aces[hands]
+    _add_cards(hand_totals, hand_soft_aces, cards)
+    totals[hands], soft_aces[hands] = hand_totals, hand_soft_aces
+    return cards
+
+def _play_charted_rounds(rounds: int, chart: np.ndarray, split_chart: np.ndarray, no_double_chart: np.ndarray,
+                         rng: np.random.Generator, rules: Rules = DEFAULT_RULES) -> tuple:
+    """
+    Play complete rounds from an infinite deck at once, following strategy charts.
+
+    Every hand of every round is a row of the hand arrays. Each pass, hands that were just split draw their second
+    card, and every other unfinished hand makes one decision. Splitting shortens a hand to its first card and adds
+    a row for the second, until the round holds rules.max_split_hands hands.
+
+    Args:
+        rounds (int): The number of rounds to play.
+        chart (np.ndarray): The strategy chart laid out as by StrategyStore.build_chart, used for the first decision.
+        split_chart (np.ndarray): The chart used for resplits and for the first decision of a split hand that may
+                                  double, which may not surrender.
+        no_double_chart (np.ndarray): The chart used where doubling is not possible, which may not surrender either.
+        rng (np.random.Generator): The random number generator.
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
+
+    Returns:
+        tuple: (result of each round in units of the initial bet, index of each round's starting cell in the
+               flattened (upcard, hand state) axes of the EV tensor).
+    """
+    first_cards, second_cards, upcards, hole_cards = (_draw_cards(rng, rounds) for _ in range(4))
+    player_totals, player_soft_aces = first_cards.copy(), (first_cards == 11).astype(np.int8)
+    _add_cards(player_totals, player_soft_aces, second_cards)
+    dealer_totals, dealer_soft_aces = upcards.copy(), (upcards == 11).astype(np.int8)
+    _add_cards(dealer_totals, dealer_soft_aces, hole_cards)
+
+    player_blackjack = player_totals == 21
+    dealer_blackjack = dealer_totals == 21
+    pairs = first_cards == second_cards
+    states = np.where(player_blackjack, BLACKJACK, np.where(
+        pairs, pair_state(first_cards), np.where(player_soft_aces > 0, hand_state(player_totals, True), hand_state(player_totals))))
+    cells = (upcards - UPCARDS[0]).astype(np.intp) * NUM_STATES + states
+
+    # A player Blackjack is paid unless the dealer has one too. With a peek, a dealer Blackjack ends the round.
+    results = np.where(player_blackjack & ~dealer_blackjack, rules.blackjack_payout, 0.0)
+    if rules.dealer_peek:
+        peeked = dealer_blackjack & ~player_blackjack
+        results[peeked] = -1
+        # An early surrender comes before the peek, so it still saves half the bet against a dealer Blackjack
+        if rules.surrender == "early":
+            kinds = np.where(pairs, PAIR, np.where(player_soft_aces > 0, SOFT, HARD))
+            first_choices = chart[kinds, np.where(pairs, first_cards, player_totals), upcards]
+            results[peeked & (first_choices == _CHART_SURRENDER)] = -0.5
+        playing = np.flatnonzero(~player_blackjack & ~dealer_blackjack)
+    else:
+        playing = np.flatnonzero(~player_blackjack)
+
+    # One row per hand. pair_cards holds the card value of two-card pairs and split_cards the card value of the
+    # pair a hand was split from, both 0 otherwise.
+    hand_rounds = playing
+    totals, soft_aces = player_totals[playing], player_soft_aces[playing]
+    num_cards = np.full(playing.size, 2, dtype=np.int8)
+    pair_cards = np.where(pairs[playing], first_cards[playing], 0).astype(np.intp)
+    split_cards = np.zeros(playing.size, dtype=np.int8)
+    bets = np.ones(playing.size, dtype=np.int8)
+    surrendered = np.zeros(playing.size, dtype=bool)
+    done = np.zeros(playing.size, dtype=bool)
+    round_hands = np.ones(rounds, dtype=np.int8)
+
+    while not done.all():
+        # Hands that were just split draw their second card, which may make another pair
+        waiting = np.flatnonzero(~done & (num_cards == 1))
+        if waiting.size:
+            drawn = _draw_to(waiting, totals, soft_aces, rng)
+            pair_cards[waiting] = np.where(drawn == split_cards[waiting], split_cards[waiting], 0)
+            num_cards[waiting] = 2
+
+        deciding = np.flatnonzero(~done)
+        hand_upcards = upcards[hand_rounds[deciding]]
+        hand_pairs = pair_cards[deciding]
+        after_split = split_cards[deciding] > 0
+
+        # Pairs the chart splits, while the round has room for another hand. A resplit is a decision after a
+        # split, so it follows the split chart. Where several hands of a round could split at once, the first ones
+        # in row order take the remaining room.
+        pair_choices = np.where(after_split, split_chart[PAIR, hand_pairs, hand_upcards], chart[PAIR, hand_pairs, hand_upcards])
+        may_split = (hand_pairs > 0) & (pair_choices == _CHART_SPLIT)
+        if not rules.resplit_aces:
+            may_split &= ~(after_split & (hand_pairs == 11))
+        candidates = deciding[may_split]
+        candidates = candidates[np.argsort(hand_rounds[candidates], kind="stable")]
+        candidate_rounds = hand_rounds[candidates]
+        rank = np.arange(candidates.size) - np.searchsorted(candidate_rounds, candidate_rounds)
+        splitting = np.isin(deciding, candidates[rank < rules.max_split_hands - round_hands[candidate_rounds]])
+
+        kinds = np.where(soft_aces[deciding] > 0, SOFT, HARD)
+        hand_totals = totals[deciding]
+        may_double = (num_cards[deciding] == 2) & (~after_split | rules.double_after_split)
+        choices = np.where(may_double, np.where(after_split, split_chart[kinds, hand_totals, hand_upcards],
+                                                chart[kinds, hand_totals, hand_upcards]),
+                           no_double_chart[kinds, hand_totals, hand_upcards])
+        if rules.split_aces_one_card:
+            choices[split_cards[deciding] == 11] = _CHART_STAND
+        choices[splitting] = _CHART_SPLIT
+
+        done[deciding[choices == _CHART_STAND]] = True
+
+        surrendering = deciding[choices == _CHART_SURRENDER]
+        surrendered[surrendering] = True
+        done[surrendering] = True
+
+        doubling = deciding[choices == _CHART_DOUBLE]
+        bets[doubling] = 2
+        done[doubling] = True
+
+        # Doubled hands get one card. Hit hands keep deciding until they reach 21 or bust.
+        hitting = deciding[choices == _CHART_HIT]
+        _draw_to(np.concatenate((doubling, hitting)), totals, soft_aces, rng)
+        num_cards[hitting] += 1
+        pair_cards[hitting] = 0
+        done[hitting[totals[hitting] >= 21]] = True
+
+        # A split hand keeps the first card of the pair and a new row gets the second
+        split = deciding[splitting]
+        if split.size:
+            cards = pair_cards[split]
+            np.add.at(round_hands, hand_rounds[split], 1)
+            totals[split], soft_aces[split] = cards, cards == 11
+            num_cards[split], split_cards[split], pair_cards[split] = 1, cards, 0
+
+            hand_rounds = np.concatenate((hand_rounds, hand_rounds[split]))
+            totals = np.concatenate((totals, totals[split]))
+            soft_aces = np.concatenate((soft_aces, soft_aces[split]))
+            num_cards = np.concatenate((num_cards, num_cards[split]))
+            pair_cards = np.concatenate((pair_cards, pair_cards[split]))
+            split_cards = np.concatenate((split_cards, split_cards[split]))
+            bets = np.concatenate((bets, bets[split]))
+            surrendered = np.concatenate((surrendered, surrendered[split]))
+            done = np.concatenate((done, done[split]))
+
+    # The dealer only plays on when some hand of the round has neither busted nor surrendered
+    dealer_values = dealer_totals.copy()
+    live = np.unique(hand_rounds[(totals <= 21) & ~surrendered])
+    live = live[~dealer_blackjack[live]]
+    dealer_values[live] = _finish_dealer_hands(dealer_totals[live] + 32 * (dealer_soft_aces[live] > 0), rng, rules)
+
+    # Without a peek, a dealer Blackjack takes every bet of the round, doubles and splits included
+    hand_dealer = dealer_values[hand_rounds].astype(np.int16)
+    lost = (totals > 21) | dealer_blackjack[hand_rounds] | ((hand_dealer <= 21) & (hand_dealer > totals))
+    won = ~lost & ((hand_dealer > 21) | (totals > hand_dealer))
+    hand_results = (won.astype(np.int8) - lost.astype(np.int8)) * bets
+
+    # A surrendered hand loses half its bet, or all of it to a dealer Blackjack unless the surrender was early
+    surrender_results = np.where(dealer_blackjack[hand_rounds] & (rules.surrender == "late"), -1, -0.5)
+    hand_results = np.where(surrendered, surrender_results, hand_results)
+    results += np.bincount(hand_rounds, weights=hand_results, minlength=rounds)
+
+    return results, cells
+
+def _charted_cell_EVs(chart: np.ndarray, rules: Rules = DEFAULT_RULES) -> tuple:
+    """
+    Look up the analytic EV of the charted move in every starting cell, and the probability of each cell.
+
+    Returns:
+        tuple: Two arrays of shape (len(UPCARDS), NUM_STATES) indexed like the EV tensor. Cells without a
+               charted move or that no starting hand reaches hold NaN EVs.
+    """
+    ev = ev_tensor(rules)
+    cell_EVs = np.full((len(UPCARDS), NUM_STATES), np.nan)
+    cell_probs = np.zeros((len(UPCARDS), NUM_STATES))
+
+    for i, upcard in enumerate(UPCARDS):
+        for first, first_prob in CARD_PROBABILITIES.items():
+            for second, second_prob in CARD_PROBABILITIES.items():
+                total, is_soft = add_card_to_total(*add_card_to_total(0, False, first), second)
+                if total == 21:
+                    state, action = BLACKJACK, "Stand"
+                elif first == second:
+                    state, action = pair_state(first), CHART_ACTIONS[chart[PAIR, first, upcard]]
+                else:
+                    state, action = hand_state(total, is_soft), CHART_ACTIONS[chart[SOFT if is_soft else HARD, total, upcard]]
+                cell_probs[i, state] += CARD_PROBABILITIES[upcard] * first_prob * second_prob
+                cell_EVs[i, state] = ev[i, state, ACTIONS.index(action)]
+
+    return cell_EVs, cell_probs
+
+def simulate_basic_strategy(simulations: int, seed=None, rules: Rules = DEFAULT_RULES) -> dict:
+    """
+    Play complete rounds of blackjack from an infinite deck following the optimal strategy charts.
+
+    Moves come from create_optimal_table, create_soft_optimal_table and create_split_optimal_table, gathered as by
+    StrategyStore.build_chart. Where the chart doubles but doubling is not possible (after the first decision, or
+    after a split without DAS), the move comes from the same tables computed without doubling, which is the hit or
+    stand choice the analytic EVs assume. Surrender is only offered on the first decision of a round, so split hands
+    follow the tables computed without it, resplits included, as the analytic split EVs do. The rules decide dealer
+    peeks, soft 17s, doubling, splitting, surrender and the Blackjack payout.
+
+    Results are gathered per starting cell, the dealer upcard and the player's first two cards as a hand state of
+    the EV tensor, so the whole chart is checked against the analytic EVs in one run.
+
+    Args:
+        simulations (int): The number of rounds to play.
+        seed (optional): The random seed. Passing the same seed reproduces the same result. Defaults to None.
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
+
+    Returns:
+        dict: The number of rounds, the "ev" per round with its "standard_error" and the "analytic_ev" of the charts,
+              and per-cell arrays of shape (len(UPCARDS), NUM_STATES) indexed like the EV tensor: "cell_rounds",
+              "cell_ev", "cell_standard_error" and "cell_analytic_ev", the EV of the charted move. All EVs are in
+              units of the initial bet. Cells that were not played hold NaN.
+    """
+    rng = np.random.default_rng(seed)
+    chart = build_chart(rules)
+    split_chart = build_chart(replace(rules, surrender="none"))
+    no_double_chart = build_chart(replace(rules, double_on=(), surrender="none"))
+
+    num_cells = len(UPCARDS) * NUM_STATES
+    cell_rounds, cell_totals, cell_squares = np.zeros(num_cells), np.zeros(num_cells), np.zeros(num_cells)
+    for start in range(0, simulations, BATCH_SIZE):
+        results, cells = _play_charted_rounds(min(BATCH_SIZE, simulations - start), chart, split_chart, no_double_chart, rng, rules)
+        cell_rounds += np.bincount(cells, minlength=num_cells)
+        cell_totals += np.bincount(cells, weights=results, minlength=num_cells)
+        cell_squares += np.bincount(cells, weights=np.square(results), minlength=num_cells)
+
+    def mean_and_error(rounds, total, squares):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / rounds
+            variance = (squares / rounds - mean ** 2) * rounds / (rounds - 1)
+            return mean, np.sqrt(variance / rounds)
+
+    ev, standard_error = mean_and_error(simulations, cell_totals.sum(), cell_squares.sum())
+    cell_ev, cell_standard_error = mean_and_error(cell_rounds, cell_totals, cell_squares)
+    cell_EVs, cell_probs = _charted_cell_EVs(chart, rules)
+    shape = (len(UPCARDS), NUM_STATES)
+
+    return {
+        "rounds": simulations,
+        "ev": float(ev),
+        "standard_error": float(standard_error),
+        "analytic_ev": float(np.nansum(cell_probs * cell_EVs)),
+        "cell_rounds": cell_rounds.astype(np.int64).reshape(shape),
+        "cell_ev": cell_ev.reshape(shape),
+        "cell_standard_error": cell_standard_error.reshape(shape),
+        "cell_analytic_ev": cell_EVs,
+    }
@@ -1,279 +1,600 @@
-import pandas as pd
+from fractions import Fraction
+from functools import lru_cache, wraps
+import inspect
+import copy
+import numpy as np
+from Rules import Rules, DEFAULT_RULES
 
-def probability_distribution(dealer_upcard: int = None) -> dict:
+# Shared cache of computed distributions and EV tables, keyed on function name and arguments
+_strategy_cache = {}
+_cache_stats = {}
+
+
+def _cached(func):
+    """
+    Store the results of an EV function in the shared strategy cache.
+
+    Each distinct set of arguments is computed once per process. Callers receive a copy of the
+    cached result, so modifying it never corrupts the cache.
+    """
+    stats = _cache_stats.setdefault(func.__name__, {"hits": 0, "misses": 0})
+    signature = inspect.signature(func)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        # Bind defaults so that f(x) and f(x, False) share a cache entry
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (func.__name__, tuple(bound.arguments.items()))
+        if key in _strategy_cache:
+            stats["hits"] += 1
+        else:
+            stats["misses"] += 1
+            _strategy_cache[key] = func(*args, **kwargs)
+        return copy.copy(_strategy_cache[key])
+
+    wrapper.cache_stats = stats
+    return wrapper
+
+
+def cache_info() -> dict:
+    """
+    Report the usage of the shared strategy cache.
+
+    Returns:
+        dict: A dictionary mapping each cached function name to its hit count, miss count and number of stored results.
+    """
+    info = {}
+    for name, stats in _cache_stats.items():
+        size = sum(1 for key in _strategy_cache if key[0] == name)
+        info[name] = {"hits": stats["hits"], "misses": stats["misses"], "size": size}
+    return info
+
+
+def clear_cache(rules: Rules = None) -> None:
+    """
+    Remove stored results from the strategy cache.
+
+    Args:
+        rules (Rules, optional): Only remove the results computed for these rules. By default every result is
+                                 removed and the hit/miss counters are reset.
+    """
+    if rules is not None:
+        for key in [key for key in _strategy_cache if ("rules", rules) in key[1]]:
+            del _strategy_cache[key]
+        return
+
+    _strategy_cache.clear()
+    _dealer_outcomes.cache_clear()
+    _no_blackjack_outcomes.cache_clear()
+    for stats in _cache_stats.values():
+        stats["hits"] = 0
+        stats["misses"] = 0
+
+
+# Dealer outcomes in the order used by the dealer engine
+DEALER_OUTCOMES = (17, 18, 19, 20, 21, "bust", "BJ")
+
+# Probability of drawing each card value from an infinite deck (11 is the ace)
+CARD_PROBABILITIES = {card: (4 / 13 if card == 10 else 1 / 13) for card in range(2, 12)}
+
+# The same probabilities as exact fractions, for the exact=True mode of the analytic functions
+EXACT_CARD_PROBABILITIES = {card: Fraction(4 if card == 10 else 1, 13) for card in range(2, 12)}
+
+
+def _card_probabilities(exact: bool) -> dict:
+    """Get the card probabilities in floating point or as exact fractions."""
+    return EXACT_CARD_PROBABILITIES if exact else CARD_PROBABILITIES
+
+
+def add_card_to_total(total: int, is_soft: bool, card: int) -> tuple:
+    """
+    Add a card to a hand, counting an ace as 1 where an 11 would bust the hand.
+
+    Args:
+        total (int): The hand total, counting a soft ace as 11.
+        is_soft (bool): Whether the hand contains an ace still counted as 11.
+        card (int): The value of the card added (2 to 11, inclusive).
+
+    Returns:
+        tuple: The new hand total and whether the new hand is soft.
+    """
+    new_total = total + card
+    new_soft = is_soft or card == 11
+    if new_total > 21 and new_soft:
+        new_total -= 10
+        # An ace drawn to a soft hand leaves one of the two aces counted as 11
+        new_soft = is_soft and card == 11
+    if new_total > 21 and new_soft:
+        # Only an ace drawn to a soft 21 needs both aces counted as 1
+        new_total -= 10
+        new_soft = False
+    return new_total, new_soft
+
+
+def _dealer_stands(total: int, is_soft: bool, hit_soft_17: bool) -> bool:
+    """Check whether the dealer stands on a hand."""
+    return total > 17 or (total == 17 and not (hit_soft_17 and is_soft))
+
+
+@lru_cache(maxsize=None)
+def _dealer_outcomes(total: int, is_soft: bool, num_cards: int, hit_soft_17: bool = False, exact: bool = False) -> tuple:
+    """
+    Calculate the probabilities of the dealer's final outcomes from a given hand state.
+
+    Args:
+        total (int): The dealer's current hand total, counting a soft ace as 11.
+        is_soft (bool): Whether the hand contains an ace still counted as 11.
+        num_cards (int): The number of cards in the hand, capped at 3 since it only matters for the Blackjack check.
+        hit_soft_17 (bool, optional): Whether the dealer hits soft 17. Defaults to False.
+        exact (bool, optional): Whether to calculate with exact fractions rather than floats. Defaults to False.
+
+    Returns:
+        tuple: The probabilities of each outcome, in the order of DEALER_OUTCOMES.
+    """
+    if _dealer_stands(total, is_soft, hit_soft_17):
+        outcomes = [0] * len(DEALER_OUTCOMES)
+        if num_cards == 2 and total == 21:
+            outcomes[6] = 1  # Blackjack
+        elif total <= 21:
+            outcomes[total - 17] = 1  # Final hand value
+        else:
+            outcomes[5] = 1  # Dealer busts
+        return tuple(outcomes)
+
+    outcomes = [0] * len(DEALER_OUTCOMES)
+    for card, card_prob in _card_probabilities(exact).items():
+        new_total, new_soft = add_card_to_total(total, is_soft, card)
+        next_outcomes = _dealer_outcomes(new_total, new_soft, min(num_cards + 1, 3), hit_soft_17, exact)
+        for i, prob in enumerate(next_outcomes):
+            outcomes[i] += card_prob * prob
+
+    return tuple(outcomes)
+
+
+@lru_cache(maxsize=None)
+def _no_blackjack_outcomes(dealer_upcard: int, hit_soft_17: bool = False, exact: bool = False) -> tuple:
+    """Calculate the dealer's outcome probabilities for an upcard, given that the hole card does not make a Blackjack."""
+    outcomes = [0] * len(DEALER_OUTCOMES)
+    no_blackjack_prob = 0
+    for card, card_prob in _card_probabilities(exact).items():
+        new_total, new_soft = add_card_to_total(dealer_upcard, dealer_upcard == 11, card)
+        if new_total == 21:
+            continue  # The hole card makes a Blackjack
+        no_blackjack_prob += card_prob
+        for i, prob in enumerate(_dealer_outcomes(new_total, new_soft, 2, hit_soft_17, exact)):
+            outcomes[i] += card_prob * prob
+
+    return tuple(prob / no_blackjack_prob for prob in outcomes)
+
+
+@_cached
+def probability_distribution(dealer_upcard: int = None, rules: Rules = DEFAULT_RULES, exact: bool = False) -> dict:
     """
     Calculate the probability distribution of the dealer's final hand values in blackjack.
 
     Args:
         dealer_upcard (int, optional): The dealer's upcard value. If not provided, the general probability distribution is generated.
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
+        exact (bool, optional): Whether to return exact Fractions rather than floats. Defaults to False.
 
     Returns:
         dict: A dictionary representing the probability distribution of the dealer's final hand values, including possible outcomes for busting and Blackjack.
     """
-    def calculate_probabilities(path: list, result: dict) -> None:
-        """
-        Recursively calculate probabilities of different hand values for the dealer.
-
-        Args:
-            path (list): The current sequence of cards drawn.
-            result (dict): The dictionary to store probabilities of different hand outcomes.
-        """
-        # Handle soft ace conversion (11 to 1) to prevent busting
-        if 11 in path and sum(path) >= 22:
-            path = path[:]
-            path[path.index(11)] = 1
-
-        total = sum(path)
-        
-        if total >= 17:
-            # Calculate the probability for the current path
-            probability = 1
-            start = 0 if dealer_upcard is None else 1
-            for i in range(start, len(path)):
-                probability *= (1 / 13) if path[i] != 10 else (4 / 13)
-
-            if len(path) == 2 and 10 in path and 11 in path:
-                result["BJ"] += probability  # Blackjack
-            elif total <= 21:
-                result[total] += probability  # Final hand value
+    if dealer_upcard:
+        outcomes = _dealer_outcomes(dealer_upcard, dealer_upcard == 11, 1, rules.hit_soft_17, exact)
+    else:
+        outcomes = _dealer_outcomes(0, False, 0, rules.hit_soft_17, exact)
+
+    return dict(zip(DEALER_OUTCOMES, outcomes))
+
+
+@_cached
+def no_blackjack_distribution(dealer_upcard: int, rules: Rules = DEFAULT_RULES, exact: bool = False) -> dict:
+    """
+    Calculate the probability distribution of the dealer's final hand values once the dealer has checked for Blackjack.
+
+    Args:
+        dealer_upcard (int): The dealer's upcard value (must be between 2 and 11, inclusive).
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
+        exact (bool, optional): Whether to return exact Fractions rather than floats. Defaults to False.
+
+    Returns:
+        dict: A dictionary representing the probability distribution of the dealer's final hand values given
+              that the dealer does not have Blackjack. The Blackjack outcome always has probability 0.
+    """
+    return dict(zip(DEALER_OUTCOMES, _no_blackjack_outcomes(dealer_upcard, rules.hit_soft_17, exact)))
+
+
+def dealer_distributions(rules: Rules = DEFAULT_RULES) -> dict:
+    """
+    Calculate the probability distribution of the dealer's final hand values for every upcard.
+
+    Args:
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
+
+    Returns:
+        dict: A dictionary mapping each dealer upcard value (2 to 11) to its probability distribution.
+    """
+    return {upcard: probability_distribution(upcard, rules) for upcard in range(2, 12)}
+
+
+# Upcards along the first axis of the EV tensor (11 is the ace)
+UPCARDS = tuple(range(2, 12))
+
+# Hand states along the second axis of the EV tensor
+HARD_TOTALS = tuple(range(2, 22))
+SOFT_TOTALS = tuple(range(11, 22))
+PAIR_CARDS = tuple(range(2, 12))
+NUM_STATES = len(HARD_TOTALS) + len(SOFT_TOTALS) + len(PAIR_CARDS) + 1
+BLACKJACK = NUM_STATES - 1
+
+# Actions along the third axis of the EV tensor
+ACTIONS = ("Stand", "Hit", "DD", "Split", "Surrender")
+STAND, HIT, DOUBLE, SPLIT, SURRENDER = range(len(ACTIONS))
+
+# Hard and soft states are the ones a card can be drawn to; one extra column records a bust
+_NUM_PLAYABLE = len(HARD_TOTALS) + len(SOFT_TOTALS)
+_BUST = _NUM_PLAYABLE
+
+
+def hand_state(total: int, is_soft: bool = False) -> int:
+    """
+    Get the index of a player hand along the hand state axis of the EV tensor.
+
+    Args:
+        total (int): The player's hand total (2 to 21 for hard hands, 11 to 21 for soft hands).
+        is_soft (bool, optional): Whether the hand contains an ace counted as 11. Defaults to False.
+
+    Returns:
+        int: The hand state index.
+    """
+    if is_soft:
+        return len(HARD_TOTALS) + total - SOFT_TOTALS[0]
+    return total - HARD_TOTALS[0]
+
+
+def pair_state(card: int) -> int:
+    """
+    Get the index of a pair of equal cards along the hand state axis of the EV tensor.
+
+    Args:
+        card (int): The value of each card in the pair (2 to 11, inclusive).
+
+    Returns:
+        int: The hand state index.
+    """
+    return _NUM_PLAYABLE + card - PAIR_CARDS[0]
+
+
+def _transition_matrix(exact: bool = False) -> np.ndarray:
+    """
+    Build the one-card transition matrix between hard and soft hand states.
+
+    Returns:
+        np.ndarray: A matrix whose row for each hard or soft state holds the probability of moving to each
+                    hard or soft state, with the last column holding the probability of busting. With exact,
+                    it is an object array of Fractions.
+    """
+    transitions = np.zeros((_NUM_PLAYABLE, _NUM_PLAYABLE + 1), dtype=object if exact else float)
+
+    for total in HARD_TOTALS:
+        for card, card_prob in _card_probabilities(exact).items():
+            if card == 11 and total <= 10:
+                next_state = hand_state(total + card, is_soft=True)
             else:
-                result["bust"] += probability  # Dealer busts
-            return
+                # An ace drawn to a hard 11 or more can only count as 1
+                new_value = total + (1 if card == 11 else card)
+                next_state = _BUST if new_value > 21 else hand_state(new_value)
+            transitions[hand_state(total), next_state] += card_prob
 
-        # Recursively explore the next possible card values
-        for card in range(2, 12):
-            path.append(card)
-            calculate_probabilities(path, result)
-            path.pop()
+    for total in SOFT_TOTALS:
+        for card, card_prob in _card_probabilities(exact).items():
+            new_value = total + (1 if card == 11 else card)
+            # Going over 21 turns the soft ace into a 1
+            next_state = hand_state(new_value, is_soft=True) if new_value <= 21 else hand_state(new_value - 10)
+            transitions[hand_state(total, is_soft=True), next_state] += card_prob
 
-    # Initialize result dictionary
-    result = {value: 0 for value in range(17, 22)}
-    result["bust"] = 0
-    result["BJ"] = 0
+    return transitions
 
-    # Start the recursive probability calculation
-    if dealer_upcard:
-        calculate_probabilities([dealer_upcard], result)
+
+@_cached
+def ev_tensor(rules: Rules = DEFAULT_RULES, exact: bool = False) -> np.ndarray:
+    """
+    Calculate the expected value of every action for every dealer upcard and player hand state in one pass.
+
+    Args:
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
+        exact (bool, optional): Whether to calculate with exact Fractions rather than floats. This is much slower
+                                and meant for producing reference values. Defaults to False.
+
+    Returns:
+        np.ndarray: An array of shape (len(UPCARDS), NUM_STATES, len(ACTIONS)) indexed by upcard (see UPCARDS),
+                    hand state (see hand_state and pair_state, plus BLACKJACK) and action (see ACTIONS).
+                    Actions that are unavailable in a hand state are NaN. With exact, it is an object array
+                    whose available entries are Fractions.
+    """
+    dtype = object if exact else float
+    card_probs = _card_probabilities(exact)
+    dealer_probs = np.array([_dealer_outcomes(upcard, upcard == 11, 1, rules.hit_soft_17, exact) for upcard in UPCARDS], dtype=dtype)
+    blackjack_probs = dealer_probs[:, DEALER_OUTCOMES.index("BJ")]
+
+    # With a peek, hands are only played out when the dealer does not have Blackjack
+    if rules.dealer_peek:
+        play_probs = np.array([_no_blackjack_outcomes(upcard, rules.hit_soft_17, exact) for upcard in UPCARDS], dtype=dtype)
     else:
-        calculate_probabilities([], result)
+        play_probs = dealer_probs
+
+    # Payoff of standing on each hard total against each dealer outcome
+    payoff = np.zeros((len(DEALER_OUTCOMES), len(HARD_TOTALS)), dtype=dtype)
+    for i, outcome in enumerate(DEALER_OUTCOMES):
+        for j, total in enumerate(HARD_TOTALS):
+            if outcome == "BJ":
+                payoff[i, j] = -1  # Dealer Blackjack results in loss
+            elif outcome == "bust" or outcome < total:
+                payoff[i, j] = 1  # Player wins
+            elif outcome > total:
+                payoff[i, j] = -1  # Player loses
+
+    ev = np.full((len(UPCARDS), NUM_STATES, len(ACTIONS)), np.nan, dtype=dtype)
+    hard = slice(hand_state(HARD_TOTALS[0]), hand_state(HARD_TOTALS[-1]) + 1)
+    soft = slice(hand_state(SOFT_TOTALS[0], True), hand_state(SOFT_TOTALS[-1], True) + 1)
+
+    # Standing on a soft total is worth the same as standing on the hard total
+    stand = play_probs @ payoff
+    ev[:, hard, STAND] = stand
+    ev[:, soft, STAND] = stand[:, hand_state(SOFT_TOTALS[0]):]
+
+    transitions = _transition_matrix(exact)
+
+    # Doubling draws exactly one card and then stands, at twice the stakes
+    stand_next = np.concatenate([ev[:, :_NUM_PLAYABLE, STAND], -np.ones((len(UPCARDS), 1), dtype=dtype)], axis=1)
+    ev[:, :_NUM_PLAYABLE, DOUBLE] = 2 * stand_next @ transitions.T
+    for total in HARD_TOTALS:
+        if not rules.can_double(total):
+            ev[:, hand_state(total), DOUBLE] = np.nan
+    for total in SOFT_TOTALS:
+        if not rules.can_double(total):
+            ev[:, hand_state(total, is_soft=True), DOUBLE] = np.nan
+
+    # Hitting continues with the best of hitting or standing, so states are filled in an order where every
+    # state a card can lead to is already known
+    best_next = np.zeros((len(UPCARDS), _NUM_PLAYABLE + 1), dtype=dtype)
+    best_next[:, _BUST] = -1
+    order = (
+        [hand_state(total) for total in range(21, 10, -1)]
+        + [hand_state(total, is_soft=True) for total in range(21, 10, -1)]
+        + [hand_state(total) for total in range(10, 1, -1)]
+    )
+    for state in order:
+        ev[:, state, HIT] = best_next @ transitions[state]
+        best_next[:, state] = np.maximum(ev[:, state, STAND], ev[:, state, HIT])
+
+    # The first decision on a hand after a split may also be a double when doubling after a split is allowed.
+    # NaN is the only value unequal to itself, which also holds in object arrays where np.fmax does not work.
+    first_decision = best_next[:, :_NUM_PLAYABLE]
+    if rules.double_after_split:
+        double = ev[:, :_NUM_PLAYABLE, DOUBLE]
+        with np.errstate(invalid="ignore"):
+            first_decision = np.where(double == double, np.maximum(first_decision, double), first_decision)
+
+    # A pair plays like its total unless split, in which case each hand draws to a single card
+    for card in PAIR_CARDS:
+        total_state = hand_state(12, is_soft=True) if card == 11 else hand_state(card * 2)
+        ev[:, pair_state(card), :SPLIT] = ev[:, total_state, :SPLIT]
+
+        # Split aces that receive one card can only stand
+        values = ev[:, :_NUM_PLAYABLE, STAND] if card == 11 and rules.split_aces_one_card else first_decision
+        non_pair = sum(
+            card_prob * values[:, hand_state(*add_card_to_total(card, card == 11, draw))]
+            for draw, card_prob in card_probs.items() if draw != card
+        )
+        hand_values = (non_pair, card_probs[card], values[:, total_state])
+        max_hands = rules.max_split_hands if card != 11 or rules.resplit_aces else 2
+        ev[:, pair_state(card), SPLIT] = resplit_EV(lambda hands: hand_values, max_hands)
+
+    # Against a peeked Blackjack only the original bet is lost, whatever the player would have done
+    if rules.dealer_peek:
+        ev[:, :BLACKJACK, :] = (1 - blackjack_probs)[:, None, None] * ev[:, :BLACKJACK, :] - blackjack_probs[:, None, None]
+
+    # Surrendering is only possible on the first decision, and its EV already accounts for a dealer Blackjack
+    if rules.surrender != "none":
+        surrender = np.broadcast_to(surrender_EV(blackjack_probs, rules), blackjack_probs.shape)
+        if exact:
+            # An early surrender is a float constant, and -0.5 converts to a Fraction exactly
+            surrender = np.array([Fraction(value) for value in surrender], dtype=object)
+        ev[:, :BLACKJACK, SURRENDER] = surrender[:, None]
+
+    # A player Blackjack pushes against a dealer Blackjack and is paid out otherwise
+    ev[:, BLACKJACK, STAND] = _blackjack_payout(rules, exact) * (1 - blackjack_probs)
+
+    return ev
+
+
+def _blackjack_payout(rules: Rules, exact: bool = False):
+    """Get the Blackjack payout, converted from its decimal form with exact so 1.2 becomes 6/5 rather than the nearest binary fraction."""
+    return Fraction(str(rules.blackjack_payout)) if exact else rules.blackjack_payout
+
+
+def surrender_EV(blackjack_prob, rules: Rules = DEFAULT_RULES):
+    """
+    Calculate the expected value of surrendering, which gives up half the bet.
+
+    A late surrender is only accepted once the dealer has checked for Blackjack, so a dealer Blackjack still takes
+    the whole bet. An early surrender comes before the check.
+
+    Args:
+        blackjack_prob: The probability that the dealer has Blackjack. May be a NumPy array, for example one per upcard.
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
+
+    Returns:
+        The expected value per unit bet, or NaN if the rules do not allow surrender. An early surrender does not
+        depend on blackjack_prob, so it is the scalar -0.5 whatever its shape.
+    """
+    if rules.surrender == "early":
+        return -0.5
+    if rules.surrender == "late":
+        return -(1 + blackjack_prob) / 2
+    return np.nan
+
+
+@_cached
+def insurance_EV(rules: Rules = DEFAULT_RULES, exact: bool = False) -> dict:
+    """
+    Calculate the expected values of insurance and even money against a dealer ace.
+
+    Insurance is a side bet of half the original bet that pays 2:1 if the dealer has Blackjack. Even money is
+    insurance on a player Blackjack, which settles the hand at 1:1 when Blackjack pays 3:2.
+
+    Args:
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
+        exact (bool, optional): Whether to return exact Fractions rather than floats. Defaults to False.
+
+    Returns:
+        dict: "Insurance", the EV of the insurance bet per unit of the original bet; "Even money", the EV of an
+              insured player Blackjack; and "Blackjack", the EV of a player Blackjack without insurance.
+    """
+    blackjack_prob = _dealer_outcomes(11, True, 1, rules.hit_soft_17, exact)[DEALER_OUTCOMES.index("BJ")]
+    insurance = (3 * blackjack_prob - 1) / 2
+    blackjack = _blackjack_payout(rules, exact) * (1 - blackjack_prob)
+    return {"Insurance": insurance, "Even money": blackjack + insurance, "Blackjack": blackjack}
+
+
+def resplit_EV(hand_values, max_hands: int):
+    """
+    Calculate the expected value of splitting a pair, resplitting every new pair whenever that is better and
+    fewer than max_hands hands are in play.
+
+    Args:
+        hand_values: A function taking the number of hands in play and returning, for a hand drawing to one card
+                     of the pair: the EV of the hands that do not draw another card of the pair weighted by their
+                     probability, the probability of drawing another card of the pair, and the EV of playing that
+                     pair on without splitting it. Values may be NumPy arrays, for example one per upcard.
+        max_hands (int): The number of hands a player may split up to.
+
+    Returns:
+        The expected value summed over every hand resulting from the split.
+    """
+    values = {}
+
+    def pending_value(pending: int, hands: int):
+        # Expected value of the hands still waiting for their second card, with hands in play so far
+        if pending == 0:
+            return 0
+        if (pending, hands) not in values:
+            non_pair, pair_prob, pair_value = hand_values(hands)
+            rest = pending_value(pending - 1, hands)
+            pair_outcome = pair_value + rest
+            if hands < max_hands and np.any(pair_prob > 0):
+                # Resplitting turns the hand into two hands waiting for their second card
+                pair_outcome = np.maximum(pair_outcome, pending_value(pending + 1, hands + 1))
+            values[pending, hands] = non_pair + (1 - pair_prob) * rest + pair_prob * pair_outcome
+        return values[pending, hands]
+
+    return pending_value(2, 2)
 
-    return result
 
+def _upcard_row(dealer_upcard: int, rules: Rules = DEFAULT_RULES) -> np.ndarray:
+    """Get the slice of the EV tensor for a dealer upcard."""
+    return ev_tensor(rules)[UPCARDS.index(dealer_upcard)]
 
-def stand_EV(dealer_upcard: int) -> dict:
+
+@_cached
+def stand_EV(dealer_upcard: int, rules: Rules = DEFAULT_RULES) -> dict:
     """
     Calculate the expected value of standing with a given dealer upcard.
 
     Args:
         dealer_upcard (int): The dealer's upcard value (must be between 2 and 11, inclusive).
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
 
     Returns:
         dict: A dictionary mapping player hand values (2 to 21, and "BJ" for Blackjack) to their expected values when standing.
     """
-    # Get the probability distribution for the dealer's hand outcomes given the upcard
-    dealer_probs = probability_distribution(dealer_upcard)
-    
-    # Initialize the expected value dictionary for all player hand values from 21 down to 2, plus "BJ" for Blackjack
-    ev_dict = {hand_value: 0 for hand_value in range(21, 1, -1)}
-    ev_dict["BJ"] = 0
-
-    # Calculate the expected value for each possible player hand value
-    for player_value in ev_dict.keys():
-        if player_value == "BJ":
-            # Calculate EV specifically for Blackjack (payout is typically 1.5x)
-            for dealer_value, prob in dealer_probs.items():
-                if dealer_value != "BJ":
-                    ev_dict[player_value] += prob
-            ev_dict[player_value] *= 1.5
-        else:
-            # Calculate EV for regular hand values
-            for dealer_value, prob in dealer_probs.items():
-                if dealer_value == "BJ":
-                    ev_dict[player_value] -= prob  # Dealer Blackjack results in loss
-                elif dealer_value == "bust" or dealer_value < player_value:
-                    ev_dict[player_value] += prob  # Player wins
-                elif dealer_value > player_value:
-                    ev_dict[player_value] -= prob  # Player loses
+    ev = _upcard_row(dealer_upcard, rules)
+    ev_dict = {hand_value: float(ev[hand_state(hand_value), STAND]) for hand_value in range(21, 1, -1)}
+    ev_dict["BJ"] = float(ev[BLACKJACK, STAND])
 
     return ev_dict
 
 
-def hit_EV(dealer_upcard: int, double_down: bool = False) -> dict:
+@_cached
+def hit_EV(dealer_upcard: int, double_down: bool = False, rules: Rules = DEFAULT_RULES) -> dict:
     """
     Calculate the expected value of hitting with a given dealer upcard. Optionally includes the impact of doubling down.
 
     Args:
         dealer_upcard (int): The dealer's upcard value (must be between 2 and 11, inclusive).
         double_down (bool, optional): Whether the player will double down (draw one card and double the stakes). Defaults to False.
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
 
     Returns:
         dict: A dictionary mapping player hand values (11 to 21) to their expected values when hitting.
-              The EV is doubled if double_down is True.
+              The EV is doubled if double_down is True, and totals the rules do not allow doubling on are left out.
     """
-    # Get the expected values for standing
-    stand_ev = stand_EV(dealer_upcard)
-    hit_ev = {}
-
-    # Calculate expected value for each player hand value
-    for player_value in range(21, 10, -1):
-        total_ev = 0
-        for card in range(1, 11):
-            new_value = player_value + card
-
-            if new_value > 21:
-                # Calculate probability of busting
-                total_ev += (-1 / 13) if card != 10 else (-4 / 13)
-            else:
-                # Get the maximum EV from hitting or standing
-                prob = max(hit_ev.get(new_value, 0), stand_ev.get(new_value, 0)) if not double_down else stand_ev.get(new_value, 0)
-                # Add probability weighted expected value
-                total_ev += (1 / 13 * prob) if card != 10 else (4 / 13 * prob)
-
-        # Double the expected value if doubling down
-        hit_ev[player_value] = total_ev * 2 if double_down else total_ev
+    ev = _upcard_row(dealer_upcard, rules)
+    action = DOUBLE if double_down else HIT
 
-    return hit_ev
+    return {player_value: float(ev[hand_state(player_value), action]) for player_value in range(21, 10, -1)
+            if not np.isnan(ev[hand_state(player_value), action])}
 
 
-def soft_hit_EV(dealer_upcard: int, double_down: bool = False) -> dict:
+@_cached
+def soft_hit_EV(dealer_upcard: int, double_down: bool = False, rules: Rules = DEFAULT_RULES) -> dict:
     """
     Calculate the expected value of hitting with a soft hand (a hand containing an ace) and a given dealer upcard.
 
     Args:
         dealer_upcard (int): The dealer's upcard value (must be between 2 and 11, inclusive).
         double_down (bool, optional): Whether the player will double down (draw one card and double the stakes). Defaults to False.
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
 
     Returns:
         dict: A dictionary mapping player hand values (11 to 21) to their expected values when hitting with a soft hand.
-              The EV is doubled if double_down is True.
-    """
-    # Get the expected values for standing and hitting
-    stand_ev = stand_EV(dealer_upcard)
-    hit_ev = hit_EV(dealer_upcard)
-    soft_hit_ev = {}
-
-    # Calculate expected value for each player hand value with a soft hand
-    for player_value in range(21, 10, -1):
-        total_ev = 0
-        
-        for card in range(1, 11):
-            new_value = player_value + card
-
-            if new_value > 21:
-                # Handle case where the new value exceeds 21
-                prob = max(hit_ev.get(new_value - 10, 0), stand_ev.get(new_value - 10, 0)) if not double_down else stand_ev.get(new_value - 10, 0)
-                total_ev += (1 / 13 * prob) if card != 10 else (4 / 13 * prob)
-            else:
-                # Get the maximum EV from soft hit, hit, or stand
-                prob = max(soft_hit_ev.get(new_value, 0), hit_ev.get(new_value, 0), stand_ev.get(new_value, 0)) if not double_down else stand_ev.get(new_value, 0)
-                total_ev += (1 / 13 * prob) if card != 10 else (4 / 13 * prob)
-
-        # Double the expected value if doubling down
-        soft_hit_ev[player_value] = total_ev * 2 if double_down else total_ev
+              The EV is doubled if double_down is True, and totals the rules do not allow doubling on are left out.
+    """
+    ev = _upcard_row(dealer_upcard, rules)
+    action = DOUBLE if double_down else HIT
 
-    return soft_hit_ev
+    return {player_value: float(ev[hand_state(player_value, is_soft=True), action]) for player_value in range(21, 10, -1)
+            if not np.isnan(ev[hand_state(player_value, is_soft=True), action])}
 
 
-def total_hit_EV(dealer_upcard: int, double_down = False) -> dict:
+@_cached
+def total_hit_EV(dealer_upcard: int, double_down = False, rules: Rules = DEFAULT_RULES) -> dict:
     """
     Calculates the expected value of hitting for all player hand values between 2 and 21, inclusive.
 
     Args:
         dealer_upcard (int): The dealer's upcard value (must be between 2 and 11, inclusive).
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
 
     Returns:
         dict: A dictionary mapping player hand values (2 to 21) to their expected values when hitting.
-              Includes the effects of both soft and hard hands.
-    """
-    # Get expected values for standing, hitting, and soft hitting
-    stand_ev = stand_EV(dealer_upcard)
-    hit_ev = hit_EV(dealer_upcard, double_down)
-    soft_hit_ev = soft_hit_EV(dealer_upcard)
-    
-    # Calculate the expected value for each player hand value from 10 to 2
-    for player_value in range(10, 1, -1):
-        total_ev = 0
-        for card in range(2, 12):
-            new_value = player_value + card
-
-            if new_value > 21:
-                # Calculate probability of busting
-                total_ev += (-1 / 13) if card != 10 else (-4 / 13)
-            else:
-                # Determine the best possible EV considering the card drawn
-                if card == 11:
-                    prob = max(stand_ev.get(new_value, 0), soft_hit_ev.get(new_value, 0)) if not double_down else stand_ev.get(new_value, 0)
-                else:
-                    prob = max(stand_ev.get(new_value, 0), hit_ev.get(new_value, 0)) if not double_down else stand_ev.get(new_value, 0)
-                total_ev += (1 / 13 * prob) if card != 10 else (4 / 13 * prob)
-        
-        hit_ev[player_value] = total_ev * 2 if double_down else total_ev
+              Includes the effects of both soft and hard hands. With double_down, totals the rules do not allow
+              doubling on are left out.
+    """
+    ev = _upcard_row(dealer_upcard, rules)
+    action = DOUBLE if double_down else HIT
 
-    return hit_ev
+    return {player_value: float(ev[hand_state(player_value), action]) for player_value in range(21, 1, -1)
+            if not np.isnan(ev[hand_state(player_value), action])}
 
 
-def split_EV(dealer_upcard: int) -> dict:
+@_cached
+def split_EV(dealer_upcard: int, rules: Rules = DEFAULT_RULES) -> dict:
     """
     Calculate the expected value of splitting a pair of equal cards with a given dealer upcard.
 
     Args:
         dealer_upcard (int): The dealer's upcard value (must be between 2 and 11, inclusive).
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
 
     Returns:
         dict: A dictionary mapping card values (2 to 11) to their expected values when splitting pairs.
-              The EV is calculated by taking the best possible EV from hitting or standing and doubling it.
-    """
-    # Get the expected values for standing, hitting, and soft hitting
-    stand_ev = stand_EV(dealer_upcard)
-    hit_ev = total_hit_EV(dealer_upcard)
-    soft_hit_ev = soft_hit_EV(dealer_upcard)
-    
-    split_ev = {}
-
-    # Calculate expected value for each card value when splitting
-    for card in range(2, 12):
-        # Use the maximum expected value from hitting or standing
-        if card == 11:
-            ev = max(stand_ev.get(card, 0), soft_hit_ev.get(card, 0))
-        else:
-            ev = max(stand_ev.get(card, 0), hit_ev.get(card, 0))
-        # Double the expected value as splitting involves two hands
-        split_ev[card] = ev * 2
-
-    return split_ev
-
-
-# def alternate_split_EV(dealer_upcard: int) -> dict:
-#     """
-#     An alternate way to calculate the expected value of splits. Gives different numbers than split_EV.
-    
-#     :param dealer_upcard: The dealer's upcard value (must be between 2 and 11, inclusive).
-#     :return: A dictionary representing the expected values for splitting pairs of cards (between pairs of 2 and pairs of 11)."""
-#     s_EV = stand_EV(dealer_upcard)
-#     h_EV = total_hit_EV(dealer_upcard)
-#     s_h_EV = soft_hit_EV(dealer_upcard)
-#     split_EV = {}
-    
-#     for card in range(2, 12):
-#         total = 0
-#         if card != 11:
-#             for hand_1_card_2 in range(2, 12):
-#                 hand_1_prob = max(s_EV[card + hand_1_card_2], h_EV[card + hand_1_card_2]) if hand_1_card_2 != 11 else max(s_EV[card + hand_1_card_2], s_h_EV[card + hand_1_card_2])
-#                 hand_1_prob *= 4 if hand_1_card_2 == 10 else 1
-#                 for hand_2_card_2 in range(2, 12):
-#                     hand_2_prob = max(s_EV[card + hand_2_card_2], h_EV[card + hand_2_card_2]) if hand_2_card_2 != 11 else max(s_EV[card + hand_2_card_2], s_h_EV[card + hand_2_card_2])
-#                     hand_2_prob *= 4 if hand_2_card_2 == 10 else 1
-#                     total += (hand_1_prob + hand_2_prob)/169
-#         else:
-#             for hand_1_card_2 in range(1, 11):
-#                 hand_1_prob = s_EV[card + hand_1_card_2] 
-#                 hand_1_prob *= 4 if hand_1_card_2 == 10 else 1
-#                 for hand_2_card_2 in range(1, 11):
-#                     hand_2_prob = s_EV[card + hand_2_card_2]
-#                     hand_2_prob *= 4 if hand_2_card_2 == 10 else 1
-#                     total += hand_1_prob + hand_2_prob
-#             total /= 169
-        
-#         split_EV[card] = total
-    
-#     return split_EV
\ No newline at end of file
+              Each hand is played on optimally, with resplits, doubling after a split and split aces following the rules.
+    """
+    ev = _upcard_row(dealer_upcard, rules)
+
+    return {card: float(ev[pair_state(card), SPLIT]) for card in PAIR_CARDS}
+
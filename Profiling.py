@@ -0,0 +1,217 @@
+import importlib
+import inspect
+import json
+import sys
+import time
+from functools import wraps
+
+# Modules whose functions are instrumented by default
+PROFILED_MODULES = ("ProbabilityFunctions", "TableCreation", "MonteCarlo")
+
+# Cache attributes of lru_cache functions that callers such as clear_cache rely on
+_CACHE_METHODS = ("cache_info", "cache_clear")
+
+# The profiler whose wrappers are installed, if any
+_active_profiler = None
+
+
+def _cache_counts(func) -> tuple:
+    """
+    Get the hit and miss counts of a memoized function.
+
+    Returns:
+        tuple: (hits, misses), or None if the function has no cache. Both lru_cache and the shared strategy cache
+               of ProbabilityFunctions are recognised.
+    """
+    if hasattr(func, "cache_info"):
+        info = func.cache_info()
+        return info.hits, info.misses
+    stats = getattr(func, "cache_stats", None)
+    if stats is not None:
+        return stats["hits"], stats["misses"]
+    return None
+
+
+def _profiled_functions(modules: tuple) -> dict:
+    """
+    Find the functions defined in the given modules, importing them if needed.
+
+    Returns:
+        dict: A dictionary mapping each function to its name, qualified with its module.
+    """
+    functions = {}
+    for module_name in modules:
+        module = importlib.import_module(module_name)
+        for name, value in vars(module).items():
+            if callable(value) and not inspect.isclass(value) and getattr(value, "__module__", None) == module_name:
+                functions[value] = f"{module_name}.{name}"
+    return functions
+
+
+class Profiler:
+    """
+    Opt-in instrumentation of the EV engine and simulators, without an external profiler.
+
+    While started, every function of the profiled modules is replaced by a wrapper that records its call count,
+    cumulative and self time, recursive calls, and the cache hits and misses of memoized functions. The wrappers
+    are bound wherever the functions were imported, including through star imports. Stopping puts the original
+    functions back, so a disabled profiler adds no overhead at all.
+
+    Only calls made in this process and thread are recorded, so the workers of the parallel functions are not.
+
+    Example:
+        with Profiler() as profiler:
+            create_optimal_table(dealer_upcards)
+        profiler.save_json("profile.json")
+        profiler.save_collapsed("profile.folded")
+    """
+
+    def __init__(self, modules: tuple = PROFILED_MODULES) -> None:
+        self.modules = tuple(modules)
+        self.functions = {}
+        self.stacks = {}
+        self.wall_time = 0.0
+        self._originals = {}
+        self._frames = []
+        self._started = None
+
+    def _stats(self, name: str) -> dict:
+        return self.functions.setdefault(name, {
+            "calls": 0, "total_time": 0, "self_time": 0, "recursive_calls": 0, "max_depth": 0, "depth": 0,
+            "cache_hits": 0, "cache_misses": 0, "cached": False,
+        })
+
+    def _wrap(self, func, name: str):
+        """Build the recording wrapper of one function."""
+        stats = self._stats(name)
+        stats["cached"] = _cache_counts(func) is not None
+        frames, stacks = self._frames, self.stacks
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            stats["calls"] += 1
+            stats["depth"] += 1
+            outermost = stats["depth"] == 1
+            if outermost:
+                cache_before = _cache_counts(func)
+            else:
+                stats["recursive_calls"] += 1
+            stats["max_depth"] = max(stats["max_depth"], stats["depth"])
+
+            # Each frame holds the function name and the time spent in its callees
+            frames.append([name, 0])
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter_ns() - start
+                stack = tuple(frame[0] for frame in frames)
+                child_time = frames.pop()[1]
+                if frames:
+                    frames[-1][1] += elapsed
+                stats["self_time"] += elapsed - child_time
+                stacks[stack] = stacks.get(stack, 0) + elapsed - child_time
+                stats["depth"] -= 1
+
+                # Recursive calls are already inside the outermost call's time and cache counts
+                if outermost:
+                    stats["total_time"] += elapsed
+                    if cache_before is not None:
+                        hits, misses = _cache_counts(func)
+                        stats["cache_hits"] += hits - cache_before[0]
+                        stats["cache_misses"] += misses - cache_before[1]
+
+        for method in _CACHE_METHODS:
+            if hasattr(func, method):
+                setattr(wrapper, method, getattr(func, method))
+        return wrapper
+
+    def start(self) -> "Profiler":
+        """Install the recording wrappers. Only one profiler may be started at a time."""
+        global _active_profiler
+        if _active_profiler is not None:
+            raise RuntimeError("Another profiler is already running.")
+
+        wrappers = {func: self._wrap(func, name) for func, name in _profiled_functions(self.modules).items()}
+        for module in list(sys.modules.values()):
+            for name, value in list(getattr(module, "__dict__", {}).items()):
+                try:
+                    wrapper = wrappers.get(value)
+                except TypeError:
+                    continue  # Unhashable values cannot be profiled functions
+                if wrapper is not None:
+                    self._originals[module, name] = value
+                    setattr(module, name, wrapper)
+
+        _active_profiler = self
+        self._started = time.perf_counter()
+        return self
+
+    def stop(self) -> "Profiler":
+        """Put the original functions back."""
+        global _active_profiler
+        if _active_profiler is not self:
+            return self
+
+        for (module, name), original in self._originals.items():
+            setattr(module, name, original)
+        self._originals.clear()
+        self.wall_time += time.perf_counter() - self._started
+        _active_profiler = None
+        return self
+
+    def __enter__(self) -> "Profiler":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def report(self) -> dict:
+        """
+        Summarise the recorded calls.
+
+        Returns:
+            dict: The profiled "wall_time" in seconds and, under "functions", a dictionary mapping each function that
+                  was called to its "calls", "total_time" and "self_time" in seconds, "recursive_calls" and
+                  "max_depth". Memoized functions also report their "cache_hits", "cache_misses" and "hit_rate";
+                  for a recursive function, its cache misses are the number of nodes actually expanded.
+                  Functions are ordered by total time.
+        """
+        functions = {}
+        for name, stats in sorted(self.functions.items(), key=lambda item: -item[1]["total_time"]):
+            if not stats["calls"]:
+                continue
+            entry = {
+                "calls": stats["calls"],
+                "total_time": stats["total_time"] / 1e9,
+                "self_time": stats["self_time"] / 1e9,
+                "recursive_calls": stats["recursive_calls"],
+                "max_depth": stats["max_depth"],
+            }
+            if stats["cached"]:
+                lookups = stats["cache_hits"] + stats["cache_misses"]
+                entry["cache_hits"] = stats["cache_hits"]
+                entry["cache_misses"] = stats["cache_misses"]
+                entry["hit_rate"] = stats["cache_hits"] / lookups if lookups else None
+            functions[name] = entry
+        return {"wall_time": self.wall_time, "functions": functions}
+
+    def collapsed_stacks(self) -> str:
+        """
+        Get the self time of every call stack in the collapsed format read by flamegraph.pl and speedscope.
+
+        Returns:
+            str: One line per stack, the function names from the outermost call joined by ";" followed by the self
+                 time in microseconds.
+        """
+        return "".join(f"{';'.join(stack)} {round(time_ns / 1000)}\n" for stack, time_ns in self.stacks.items())
+
+    def save_json(self, path: str) -> None:
+        """Write the report to a JSON file."""
+        with open(path, "w") as file:
+            json.dump(self.report(), file, indent=2)
+
+    def save_collapsed(self, path: str) -> None:
+        """Write the collapsed stacks to a file, ready for a flame graph tool."""
+        with open(path, "w") as file:
+            file.write(self.collapsed_stacks())
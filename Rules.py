@@ -0,0 +1,58 @@
+from dataclasses import dataclass
+from typing import Optional
+
+# Surrender options, from most to least favourable to the player
+SURRENDER_OPTIONS = ("early", "late", "none")
+
+
+@dataclass(frozen=True)
+class Rules:
+    """
+    The table rules that expected values and strategies are computed for.
+
+    Rules are immutable and hashable, so computed results can be cached per rule set.
+
+    Attributes:
+        hit_soft_17 (bool): Whether the dealer hits soft 17 (H17) instead of standing on it (S17).
+        double_after_split (bool): Whether hands may be doubled after a split (DAS).
+        blackjack_payout (float): The payout of a player Blackjack per unit bet.
+        surrender (str): "none", "late" (after the dealer checks for Blackjack) or "early" (before it).
+        dealer_peek (bool): Whether the dealer checks for Blackjack with a 10 or ace showing, so the player
+                            only loses the original bet to a dealer Blackjack.
+        double_on (tuple, optional): The hand totals the player may double on, or None to allow any total.
+        max_split_hands (int): The number of hands a player may split up to, so 2 allows no resplits.
+        resplit_aces (bool): Whether a pair of aces may be resplit.
+        split_aces_one_card (bool): Whether split aces receive exactly one card each.
+        num_decks (int, optional): The number of decks in the shoe, or None for an infinite deck. The infinite-deck
+                                   EV functions ignore it; Sweep.py uses it to weight the initial deal.
+    """
+    hit_soft_17: bool = False
+    double_after_split: bool = False
+    blackjack_payout: float = 1.5
+    surrender: str = "none"
+    dealer_peek: bool = False
+    double_on: Optional[tuple] = None
+    max_split_hands: int = 2
+    resplit_aces: bool = False
+    split_aces_one_card: bool = False
+    num_decks: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        if self.surrender not in SURRENDER_OPTIONS:
+            raise ValueError(f"surrender must be one of {SURRENDER_OPTIONS}, not {self.surrender!r}.")
+        if self.double_on is not None:
+            # Accept any iterable of totals while keeping the rules hashable
+            object.__setattr__(self, "double_on", tuple(sorted(self.double_on)))
+        if self.max_split_hands < 2:
+            raise ValueError(f"max_split_hands must be at least 2, not {self.max_split_hands}.")
+        if self.num_decks is not None and self.num_decks < 1:
+            raise ValueError(f"num_decks must be at least 1, not {self.num_decks}.")
+
+    def can_double(self, total: int) -> bool:
+        """Check whether the player may double down on a hand total."""
+        return self.double_on is None or total in self.double_on
+
+
+# Dealer stands on soft 17, no peek, Blackjack pays 3:2, doubling on any total, one split without doubling after it
+# (split aces are played on like any other hand), no surrender, infinite deck
+DEFAULT_RULES = Rules()
@@ -0,0 +1,144 @@
+import numpy as np
+from Card import Card
+from Deck import Deck
+from ShoeProbabilityFunctions import *
+from ShoeProbabilityFunctions import _IMPOSSIBLE, _STAND_PAYOFFS, _dealer_draws
+from Rules import Rules, DEFAULT_RULES
+
+# Number of memoized finite-shoe states kept before the engine's caches are cleared, which bounds the memory of a
+# long-running evaluator
+SHOE_CACHE_LIMIT = 2_000_000
+
+
+def _log_falling(n: int, k_max: int, impossible: float) -> np.ndarray:
+    """Get the log of n (n - 1) ... (n - k + 1) for every k up to k_max, with impossible where k is larger than n."""
+    falling = np.concatenate(([0.0], np.cumsum(np.log(np.maximum(n - np.arange(k_max), 1)))))
+    falling[max(n, -1) + 1:] = impossible
+    return falling
+
+
+class ShoeEvaluator:
+    """
+    Keeps finite-shoe dealer distributions and player EVs in step with a Deck.
+
+    The evaluator listens to the deck, so every remove_card, add_card, deal_card or reset adjusts its count
+    vector immediately. The probability of each dealer hand of every upcard is kept as a sum of log terms, one
+    per card value and one for the number of cards left (see _shoe_dealer_table). A card only changes its own
+    value's term and the total's, so those two columns are recomputed for every upcard and the others are kept.
+    The dealer distribution and stand EVs of an upcard then take one exponential and sum over its dealer hands,
+    on the first query against the new shoe.
+
+    The hit and double down EVs of a player hand depend on every card value through the cards it can draw, so a
+    change drops them and each hand is computed again by the shoe engine the first time it is asked for. The
+    engine's caches are keyed on the full composition, so entries for earlier compositions are not reused. They
+    are cleared once they hold more than SHOE_CACHE_LIMIT states. Repeated queries against the same shoe are
+    dictionary lookups.
+
+    As in the shoe functions, the deck is expected to no longer hold the dealer's upcard or the player's cards.
+    """
+
+    def __init__(self, deck: Deck, rules: Rules = DEFAULT_RULES) -> None:
+        self.deck = deck
+        self.rules = rules
+        self.counts = shoe_counts(deck)
+        # The dealer hands of every upcard, one after the other, and the log term of each card value and of the total
+        # for each hand
+        draws = [_dealer_draws(upcard, rules.hit_soft_17) for upcard in range(2, 12)]
+        self.card_counts, self.num_drawn, self.log_orderings, self.outcomes = (np.concatenate(arrays) for arrays in zip(*draws))
+        stops = np.cumsum([len(card_counts) for card_counts, _, _, _ in draws])
+        self.upcard_hands = {upcard: slice(stop - len(draw[0]), stop) for upcard, stop, draw in zip(range(2, 12), stops, draws)}
+        self.log_terms = np.zeros((len(self.card_counts), len(SHOE_CARDS) + 1))
+        for column in range(len(SHOE_CARDS) + 1):
+            self._update_terms(column)
+        self.dealer_outcomes = {}
+        self.stand_values = {}
+        self.action_values = {}
+        deck.add_listener(self.update)
+
+    def _update_terms(self, column: int) -> None:
+        """Recompute the log term of a card value (or of the total, past the last card value) for every dealer hand."""
+        if column < len(SHOE_CARDS):
+            drawn = self.card_counts[:, column]
+            self.log_terms[:, column] = _log_falling(self.counts[column], drawn.max(), _IMPOSSIBLE)[drawn]
+        else:
+            # When the shoe runs out, a card value does too, so the total is never impossible on its own
+            self.log_terms[:, column] = self.log_orderings - _log_falling(sum(self.counts), self.num_drawn.max(), 0)[self.num_drawn]
+
+    def _invalidate(self) -> None:
+        """Drop the tables of the previous composition, and bound the shoe engine's memory."""
+        self.dealer_outcomes.clear()
+        self.stand_values.clear()
+        self.action_values.clear()
+        if shoe_cache_size() > SHOE_CACHE_LIMIT:
+            clear_shoe_cache()
+
+    def update(self, card: Card, change: int) -> None:
+        """Apply a card leaving (-1) or joining (+1) the deck. Called by the deck itself."""
+        index = SHOE_CARDS.index(card.value())
+        self.counts = self.counts[:index] + (self.counts[index] + change,) + self.counts[index + 1:]
+        self._update_terms(index)
+        self._update_terms(len(SHOE_CARDS))
+        self._invalidate()
+
+    def resync(self) -> None:
+        """Recount the deck from scratch, for changes made without notifying listeners."""
+        self.counts = shoe_counts(self.deck)
+        for column in range(len(SHOE_CARDS) + 1):
+            self._update_terms(column)
+        self._invalidate()
+
+    def detach(self) -> None:
+        """Stop following the deck."""
+        self.deck.remove_listener(self.update)
+
+    def _refresh(self, dealer_upcard: int) -> None:
+        """Compute the dealer tables of an upcard if the current shoe does not have them yet."""
+        if dealer_upcard not in self.dealer_outcomes:
+            hands = self.upcard_hands[dealer_upcard]
+            outcomes = self.outcomes[hands]
+            weights = np.exp(self.log_terms[hands].sum(axis=1))
+            present, starts = np.unique(outcomes, return_index=True)
+            probabilities = np.zeros(len(DEALER_OUTCOMES))
+            probabilities[present] = np.add.reduceat(weights, starts)
+            self.dealer_outcomes[dealer_upcard] = dict(zip(DEALER_OUTCOMES, probabilities.tolist()))
+
+            stand_values = {total: float(np.dot(probabilities, _STAND_PAYOFFS[total])) for total in range(21, 1, -1)}
+            # Blackjack pushes against a dealer Blackjack
+            stand_values["BJ"] = self.rules.blackjack_payout * (1 - self.dealer_outcomes[dealer_upcard]["BJ"])
+            self.stand_values[dealer_upcard] = stand_values
+
+    def probability_distribution(self, dealer_upcard: int) -> dict:
+        """Get the dealer's final hand distribution for an upcard and the current shoe."""
+        self._refresh(dealer_upcard)
+        return self.dealer_outcomes[dealer_upcard]
+
+    def stand_EV(self, dealer_upcard: int) -> dict:
+        """Get the expected value of standing on each player hand value for an upcard and the current shoe."""
+        self._refresh(dealer_upcard)
+        return self.stand_values[dealer_upcard]
+
+    def action_EVs(self, dealer_upcard: int, total: int, is_soft: bool = False) -> dict:
+        """
+        Calculate the expected value of each action for a player hand against an upcard, with the current shoe.
+
+        Args:
+            dealer_upcard (int): The dealer's upcard value (must be between 2 and 11, inclusive).
+            total (int): The player's hand total.
+            is_soft (bool, optional): Whether the player's hand contains an ace counted as 11. Defaults to False.
+
+        Returns:
+            dict: A dictionary mapping "Stand", "Hit" and "DD" to their expected values.
+        """
+        key = (dealer_upcard, total, is_soft)
+        if key not in self.action_values:
+            self.action_values[key] = {
+                "Stand": self.stand_EV(dealer_upcard)[total],
+                "Hit": shoe_action_EV(dealer_upcard, self.counts, total, is_soft, rules=self.rules),
+                "DD": shoe_action_EV(dealer_upcard, self.counts, total, is_soft, double_down=True, rules=self.rules),
+            }
+        return dict(self.action_values[key])
+
+    def best_action(self, dealer_upcard: int, total: int, is_soft: bool = False) -> str:
+        """Get the action with the highest expected value for a player hand against an upcard, with the current shoe."""
+        action_evs = self.action_EVs(dealer_upcard, total, is_soft)
+        return max(action_evs, key=action_evs.get)
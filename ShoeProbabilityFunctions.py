@@ -0,0 +1,466 @@
+from functools import lru_cache
+import numpy as np
+from Deck import Deck
+from ProbabilityFunctions import DEALER_OUTCOMES, add_card_to_total, resplit_EV
+from Rules import Rules, DEFAULT_RULES
+
+# Card values in the order of a shoe count vector (index 0 holds the aces, counted as 11)
+SHOE_CARDS = (11, 2, 3, 4, 5, 6, 7, 8, 9, 10)
+
+
+def shoe_counts(deck: Deck) -> tuple:
+    """
+    Get the count vector of the cards remaining in a deck.
+
+    Args:
+        deck (Deck): The deck or shoe whose remaining cards are counted.
+
+    Returns:
+        tuple: The number of remaining cards of each value, in the order of SHOE_CARDS.
+    """
+    value_counts = deck.get_value_dict()
+    return tuple(value_counts[1 if card == 11 else card] for card in SHOE_CARDS)
+
+
+def full_shoe_counts(num_decks: int = 1) -> tuple:
+    """
+    Get the count vector of a full shoe.
+
+    Args:
+        num_decks (int, optional): The number of decks in the shoe. Defaults to 1.
+
+    Returns:
+        tuple: The number of cards of each value, in the order of SHOE_CARDS.
+    """
+    return tuple((16 if card == 10 else 4) * num_decks for card in SHOE_CARDS)
+
+
+def remove_cards(counts: tuple, *cards: int) -> tuple:
+    """
+    Remove cards from a count vector.
+
+    Args:
+        counts (tuple): The count vector, in the order of SHOE_CARDS.
+        *cards (int): The values of the cards to remove (2 to 11, inclusive).
+
+    Returns:
+        tuple: The count vector without the given cards.
+    """
+    counts = list(counts)
+    for card in cards:
+        index = SHOE_CARDS.index(card)
+        if counts[index] == 0:
+            raise ValueError(f"No card of value {card} left in the shoe.")
+        counts[index] -= 1
+    return tuple(counts)
+
+
+def _draws(counts: tuple):
+    """
+    Iterate over the cards that can be drawn from a count vector.
+
+    Yields:
+        tuple: (card value, probability of drawing it, count vector after drawing it) for each value left in the shoe.
+    """
+    remaining = sum(counts)
+    for index, count in enumerate(counts):
+        if count:
+            yield SHOE_CARDS[index], count / remaining, counts[:index] + (count - 1,) + counts[index + 1:]
+
+
+def _final_outcome(total: int, num_cards: int) -> int:
+    """Get the index in DEALER_OUTCOMES of a dealer hand that stands."""
+    if num_cards == 2 and total == 21:
+        return 6  # Blackjack
+    elif total <= 21:
+        return total - 17  # Final hand value
+    return 5  # Dealer busts
+
+
+# Log-probability of an impossible draw, low enough that exp() of any sum including it is exactly zero
+_IMPOSSIBLE = -1e4
+
+
+def _stand_payoff(total: int, dealer_value) -> int:
+    """Get the result of standing on a total against a final dealer hand."""
+    if dealer_value == "BJ":
+        return -1  # Dealer Blackjack results in loss
+    elif dealer_value == "bust" or dealer_value < total:
+        return 1  # Player wins
+    elif dealer_value > total:
+        return -1  # Player loses
+    return 0
+
+
+# Result of standing on each player total (row) against each of DEALER_OUTCOMES (column)
+_STAND_PAYOFFS = np.array([[_stand_payoff(total, dealer_value) for dealer_value in DEALER_OUTCOMES] for total in range(22)])
+
+# The same once a peek has settled any dealer Blackjack, which then costs the hand nothing more
+_PEEKED_STAND_PAYOFFS = _STAND_PAYOFFS.copy()
+_PEEKED_STAND_PAYOFFS[:, DEALER_OUTCOMES.index("BJ")] = 0
+
+
+@lru_cache(maxsize=None)
+def _dealer_draws(dealer_upcard: int, hit_soft_17: bool = False) -> tuple:
+    """
+    Enumerate the sets of cards the dealer can draw to a finished hand.
+
+    Drawing without replacement makes every ordering of the same cards equally likely, so a dealer hand only
+    depends on which cards it drew. Collecting the draw sequences by their cards leaves at most about two
+    thousand hands per upcard, which can then be weighted for any number of shoes at once.
+
+    Returns:
+        tuple: Arrays of the number of cards of each value drawn (in the order of SHOE_CARDS), the number of cards
+               drawn, the log of the number of orderings and the index in DEALER_OUTCOMES of the outcome of
+               each hand, sorted by outcome.
+    """
+    hands = {}
+
+    def draw(total: int, is_soft: bool, drawn: tuple) -> None:
+        if total > 17 or (total == 17 and not (hit_soft_17 and is_soft)):
+            key = (drawn, _final_outcome(total, sum(drawn) + 1))
+            hands[key] = hands.get(key, 0) + 1
+            return
+        for index, card in enumerate(SHOE_CARDS):
+            new_total, new_soft = add_card_to_total(total, is_soft, card)
+            draw(new_total, new_soft, drawn[:index] + (drawn[index] + 1,) + drawn[index + 1:])
+
+    draw(dealer_upcard, dealer_upcard == 11, (0,) * len(SHOE_CARDS))
+    # Sorting by outcome lets the probabilities of each outcome be summed over a contiguous range of hands
+    keys = sorted(hands, key=lambda key: key[1])
+    card_counts = np.array([drawn for drawn, _ in keys], dtype=np.intp)
+    outcomes = np.array([outcome for _, outcome in keys])
+    return card_counts, card_counts.sum(axis=1), np.log([hands[key] for key in keys]), outcomes
+
+
+@lru_cache(maxsize=None)
+def _player_draws(total: int, is_soft: bool) -> tuple:
+    """
+    Enumerate the sets of cards a player hand can draw by hitting without busting.
+
+    Like the dealer's, a player hand only depends on which cards it drew, whatever their order.
+
+    Returns:
+        tuple: Arrays of the number of cards of each value drawn (in the order of SHOE_CARDS) and the hand total
+               of each set, the index of the set reached by drawing each card value from each set (-1 if it busts),
+               and the (start, stop) index range of the sets of each size. Sets are ordered by size, starting
+               with the hand itself.
+    """
+    hands = [((0,) * len(SHOE_CARDS), total, is_soft)]
+    index = {hands[0][0]: 0}
+    children = []
+    for drawn, hand_total, hand_soft in hands:  # Grows while it is iterated over, one size after the other
+        hand_children = []
+        for card_index, card in enumerate(SHOE_CARDS):
+            new_total, new_soft = add_card_to_total(hand_total, hand_soft, card)
+            if new_total > 21:
+                hand_children.append(-1)
+                continue
+            new_drawn = drawn[:card_index] + (drawn[card_index] + 1,) + drawn[card_index + 1:]
+            if new_drawn not in index:
+                index[new_drawn] = len(hands)
+                hands.append((new_drawn, new_total, new_soft))
+            hand_children.append(index[new_drawn])
+        children.append(hand_children)
+
+    drawn = np.array([hand[0] for hand in hands], dtype=np.intp)
+    sizes = drawn.sum(axis=1)
+    levels = [(int(np.searchsorted(sizes, size)), int(np.searchsorted(sizes, size, side="right"))) for size in range(sizes[-1] + 1)]
+    return drawn, np.array([hand[1] for hand in hands]), np.array(children), levels
+
+
+def _shoe_dealer_table(dealer_upcard: int, counts: tuple, drawn: np.ndarray, hit_soft_17: bool = False) -> np.ndarray:
+    """
+    Calculate the probabilities of the dealer's final outcomes for many player hands drawn from one shoe at once.
+
+    A sequence of L cards holding k_c cards of each value c is drawn from n_c cards of each value (N in total)
+    with probability prod_c n_c (n_c - 1) ... (n_c - k_c + 1) / (N (N - 1) ... (N - L + 1)). In logs this is a
+    sum of one term per card value, so every player hand and dealer hand of _dealer_draws is weighted with a
+    single matrix product of one-hot encoded card counts.
+
+    Args:
+        dealer_upcard (int): The dealer's upcard value (must be between 2 and 11, inclusive).
+        counts (tuple): The cards left in the shoe before the player's draws, in the order of SHOE_CARDS.
+        drawn (np.ndarray): The number of cards of each value drawn by each player hand, one row per hand.
+                            No row may draw more cards of a value than the shoe holds.
+        hit_soft_17 (bool, optional): Whether the dealer hits soft 17. Defaults to False.
+
+    Returns:
+        np.ndarray: The probabilities of each outcome in the order of DEALER_OUTCOMES, one row per player hand.
+    """
+    card_counts, num_drawn, log_orderings, outcomes = _dealer_draws(dealer_upcard, hit_soft_17)
+    counts = np.array(counts)
+    # Dealer hands holding more cards of a value than the shoe are impossible for every player hand
+    possible = (card_counts <= counts).all(axis=1)
+    card_counts, num_drawn, log_orderings, outcomes = card_counts[possible], num_drawn[possible], log_orderings[possible], outcomes[possible]
+    log_factorials = np.concatenate(([0.0], np.cumsum(np.log(np.arange(1, counts.sum() + 1)))))
+
+    def log_falling(n: np.ndarray, k: np.ndarray, impossible: float) -> np.ndarray:
+        # log of n (n - 1) ... (n - k + 1) for every n (rows) and k (columns)
+        left = n[:, None] - k[None, :]
+        return np.where(left >= 0, log_factorials[n][:, None] - log_factorials[np.maximum(left, 0)], impossible)
+
+    # One block of columns (player hands) and rows (dealer hands) per card value, and one for the total drawn.
+    # When the shoe runs out, a card value does too, so the total is never impossible on its own.
+    player_blocks = [*drawn.T, drawn.sum(axis=1)]
+    dealer_blocks = [*card_counts.T, num_drawn]
+    shoe_sizes = [*counts, counts.sum()]
+    one_hot, log_weights = [], []
+    for block, (player, dealer, size) in enumerate(zip(player_blocks, dealer_blocks, shoe_sizes)):
+        player_values = np.arange(player.max() + 1)
+        one_hot.append(player[:, None] == player_values[None, :])
+        if block < len(SHOE_CARDS):
+            log_weights.append(log_falling(size - player_values, np.arange(dealer.max() + 1), _IMPOSSIBLE)[:, dealer])
+        else:
+            log_weights.append(log_orderings - log_falling(size - player_values, np.arange(dealer.max() + 1), 0)[:, dealer])
+
+    weights = np.exp(np.concatenate(one_hot, axis=1) @ np.concatenate(log_weights))
+    present, starts = np.unique(outcomes, return_index=True)
+    table = np.zeros((len(drawn), len(DEALER_OUTCOMES)))
+    table[:, present] = np.add.reduceat(weights, starts, axis=1)
+    return table
+
+
+@lru_cache(maxsize=None)
+def _shoe_dealer_outcomes(counts: tuple, dealer_upcard: int, hit_soft_17: bool = False) -> tuple:
+    """Calculate the probabilities of the dealer's final outcomes, in the order of DEALER_OUTCOMES, from one shoe."""
+    return tuple(_shoe_dealer_table(dealer_upcard, counts, np.zeros((1, len(SHOE_CARDS)), dtype=np.intp), hit_soft_17)[0].tolist())
+
+
+def shoe_probability_distribution(dealer_upcard: int, counts: tuple, rules: Rules = DEFAULT_RULES) -> dict:
+    """
+    Calculate the probability distribution of the dealer's final hand values when drawing from a finite shoe.
+
+    Args:
+        dealer_upcard (int): The dealer's upcard value (must be between 2 and 11, inclusive).
+        counts (tuple): The cards left in the shoe, in the order of SHOE_CARDS, with the upcard and any player cards already removed.
+        rules (Rules, optional): The table rules. Only the dealer's soft 17 rule applies to finite shoes. Defaults to DEFAULT_RULES.
+
+    Returns:
+        dict: A dictionary representing the probability distribution of the dealer's final hand values, including possible outcomes for busting and Blackjack.
+    """
+    outcomes = _shoe_dealer_outcomes(tuple(counts), dealer_upcard, rules.hit_soft_17)
+    return dict(zip(DEALER_OUTCOMES, outcomes))
+
+
+@lru_cache(maxsize=None)
+def _shoe_stand_value(dealer_upcard: int, counts: tuple, total: int, hit_soft_17: bool = False, dealer_peek: bool = False) -> float:
+    """
+    Calculate the expected value of standing on a total against the dealer drawing from the given shoe.
+
+    With dealer_peek, a dealer Blackjack counts as nothing, which leaves the value of the hand when the dealer does
+    not have one, weighted by that probability (see _shoe_hand_values).
+    """
+    payoffs = _PEEKED_STAND_PAYOFFS if dealer_peek else _STAND_PAYOFFS
+    return float(np.dot(_shoe_dealer_outcomes(counts, dealer_upcard, hit_soft_17), payoffs[total]))
+
+
+def _shoe_hand_values(dealer_upcard: int, counts: tuple, total: int, is_soft: bool, hit_soft_17: bool = False,
+                      dealer_peek: bool = False) -> tuple:
+    """
+    Calculate the expected values of every hand reachable by hitting a player hand, removing every card drawn.
+
+    The dealer's hole card is drawn after the player's cards, which is equally likely to give any composition.
+    With dealer_peek, a dealer Blackjack counts as nothing, even against a hand that busts, so the values are the
+    EVs given no dealer Blackjack weighted by its probability. That probability is the same for every action of a
+    hand, so the best action is still the one played once the dealer has peeked.
+
+    Returns:
+        tuple: Arrays of the EV of standing, of hitting and then playing on optimally, and of doubling down,
+               for each set of cards drawn in the order of _player_draws.
+    """
+    drawn, totals, children, levels = _player_draws(total, is_soft)
+    left = np.array(counts) - drawn
+    possible = (left >= 0).all(axis=1)
+
+    stand = np.zeros(len(drawn))
+    dealer_table = _shoe_dealer_table(dealer_upcard, counts, drawn[possible], hit_soft_17)
+    payoffs = _PEEKED_STAND_PAYOFFS if dealer_peek else _STAND_PAYOFFS
+    stand[possible] = (dealer_table * payoffs[totals[possible]]).sum(axis=1)
+
+    # Drawing from a set of cards the shoe cannot hold, or from an empty shoe, has probability zero
+    draw_probs = np.maximum(left, 0) / np.maximum(left.sum(axis=1), 1)[:, None]
+
+    # Value of busting by drawing each card value from each set
+    bust = -np.ones(children.shape)
+    if dealer_peek and dealer_upcard in (10, 11):
+        # The bust only costs the bet when the hole card left after it does not complete a dealer Blackjack
+        hole = SHOE_CARDS.index(11 if dealer_upcard == 10 else 10)
+        hole_left = left[:, hole][:, None] - (np.arange(len(SHOE_CARDS)) == hole)
+        bust = -(1 - np.maximum(hole_left, 0) / np.maximum(left.sum(axis=1) - 1, 1)[:, None])
+
+    bust_or_stand = np.where(children >= 0, stand[children], bust)
+    double = 2 * (draw_probs * bust_or_stand).sum(axis=1)
+
+    # Every set drawn to is one card larger, so sizes are evaluated from the largest down
+    hit = np.zeros(len(drawn))
+    for start, stop in reversed(levels):
+        level_children = children[start:stop]
+        best = np.where(level_children >= 0, np.maximum(stand, hit)[level_children], bust[start:stop])
+        hit[start:stop] = (draw_probs[start:stop] * best).sum(axis=1)
+
+    return stand, hit, double
+
+
+@lru_cache(maxsize=None)
+def _shoe_draw_values(dealer_upcard: int, counts: tuple, total: int, is_soft: bool, hit_soft_17: bool = False,
+                      dealer_peek: bool = False) -> tuple:
+    """Calculate the expected values of hitting (and then playing on optimally) and of doubling down on a hand."""
+    _, hit, double = _shoe_hand_values(dealer_upcard, counts, total, is_soft, hit_soft_17, dealer_peek)
+    # A peeked Blackjack takes only the original bet, even from a double
+    blackjack_prob = _shoe_dealer_outcomes(counts, dealer_upcard, hit_soft_17)[DEALER_OUTCOMES.index("BJ")] if dealer_peek else 0
+    return float(hit[0] - blackjack_prob), float(double[0] - blackjack_prob)
+
+
+def shoe_stand_EV(dealer_upcard: int, counts: tuple, rules: Rules = DEFAULT_RULES) -> dict:
+    """
+    Calculate the expected value of standing with a given dealer upcard and finite shoe.
+
+    Args:
+        dealer_upcard (int): The dealer's upcard value (must be between 2 and 11, inclusive).
+        counts (tuple): The cards left in the shoe, in the order of SHOE_CARDS, with the upcard and any player cards already removed.
+        rules (Rules, optional): The table rules. The dealer's soft 17 rule and the Blackjack payout apply to finite shoes. Defaults to DEFAULT_RULES.
+
+    Returns:
+        dict: A dictionary mapping player hand values (2 to 21, and "BJ" for Blackjack) to their expected values when standing.
+    """
+    counts = tuple(counts)
+    ev_dict = {hand_value: _shoe_stand_value(dealer_upcard, counts, hand_value, rules.hit_soft_17) for hand_value in range(21, 1, -1)}
+
+    # Calculate EV specifically for Blackjack, which pushes against a dealer Blackjack
+    ev_dict["BJ"] = rules.blackjack_payout * (1 - shoe_probability_distribution(dealer_upcard, counts, rules)["BJ"])
+
+    return ev_dict
+
+
+def shoe_hit_EV(dealer_upcard: int, counts: tuple, double_down: bool = False, rules: Rules = DEFAULT_RULES) -> dict:
+    """
+    Calculate the expected value of hitting hard hands with a given dealer upcard and finite shoe.
+
+    Args:
+        dealer_upcard (int): The dealer's upcard value (must be between 2 and 11, inclusive).
+        counts (tuple): The cards left in the shoe, in the order of SHOE_CARDS, with the upcard and any player cards already removed.
+        double_down (bool, optional): Whether the player will double down (draw one card and double the stakes). Defaults to False.
+        rules (Rules, optional): The table rules. The dealer's soft 17 and peek rules apply to finite shoes. Defaults to DEFAULT_RULES.
+
+    Returns:
+        dict: A dictionary mapping hard player hand values (2 to 21) to their expected values when hitting.
+              The EV is doubled if double_down is True.
+    """
+    counts = tuple(counts)
+    return {player_value: _shoe_draw_values(dealer_upcard, counts, player_value, False, rules.hit_soft_17, rules.dealer_peek)[double_down] for player_value in range(21, 1, -1)}
+
+
+def shoe_soft_hit_EV(dealer_upcard: int, counts: tuple, double_down: bool = False, rules: Rules = DEFAULT_RULES) -> dict:
+    """
+    Calculate the expected value of hitting soft hands with a given dealer upcard and finite shoe.
+
+    Args:
+        dealer_upcard (int): The dealer's upcard value (must be between 2 and 11, inclusive).
+        counts (tuple): The cards left in the shoe, in the order of SHOE_CARDS, with the upcard and any player cards already removed.
+        double_down (bool, optional): Whether the player will double down (draw one card and double the stakes). Defaults to False.
+        rules (Rules, optional): The table rules. The dealer's soft 17 and peek rules apply to finite shoes. Defaults to DEFAULT_RULES.
+
+    Returns:
+        dict: A dictionary mapping soft player hand values (11 to 21) to their expected values when hitting.
+              The EV is doubled if double_down is True.
+    """
+    counts = tuple(counts)
+    return {player_value: _shoe_draw_values(dealer_upcard, counts, player_value, True, rules.hit_soft_17, rules.dealer_peek)[double_down] for player_value in range(21, 10, -1)}
+
+
+def shoe_action_EV(dealer_upcard: int, counts: tuple, total: int, is_soft: bool = False, double_down: bool = False,
+                   rules: Rules = DEFAULT_RULES) -> float:
+    """
+    Calculate the expected value of hitting or doubling down on a single player hand with a finite shoe.
+
+    Args:
+        dealer_upcard (int): The dealer's upcard value (must be between 2 and 11, inclusive).
+        counts (tuple): The cards left in the shoe, in the order of SHOE_CARDS, with the upcard and any player cards already removed.
+        total (int): The player's hand total.
+        is_soft (bool, optional): Whether the player's hand contains an ace counted as 11. Defaults to False.
+        double_down (bool, optional): Whether the player will double down (draw one card and double the stakes). Defaults to False.
+        rules (Rules, optional): The table rules. The dealer's soft 17 and peek rules apply to finite shoes. Defaults to DEFAULT_RULES.
+
+    Returns:
+        float: The expected value of the action.
+    """
+    return _shoe_draw_values(dealer_upcard, tuple(counts), total, is_soft, rules.hit_soft_17, rules.dealer_peek)[double_down]
+
+
+@lru_cache(maxsize=None)
+def _shoe_split_hand(dealer_upcard: int, counts: tuple, card: int, rules: Rules) -> tuple:
+    """
+    Calculate the values of a hand drawing to one card of a split pair, removing every card drawn.
+
+    Returns:
+        tuple: The EV of the hand when it does not draw another card of the pair, weighted by its probability,
+               the probability of drawing another card of the pair, and the EV of playing that pair on unsplit.
+    """
+    if card == 11 and rules.split_aces_one_card:
+        # Split aces that receive one card can only stand
+        def first_decision(draw: int, next_counts: tuple) -> float:
+            return _shoe_stand_value(dealer_upcard, next_counts, add_card_to_total(card, True, draw)[0], rules.hit_soft_17,
+                                     rules.dealer_peek)
+    else:
+        # Every hand the split card can draw to is evaluated in one pass
+        stand, hit, double = _shoe_hand_values(dealer_upcard, counts, card, card == 11, rules.hit_soft_17, rules.dealer_peek)
+        _, totals, children, _ = _player_draws(card, card == 11)
+
+        def first_decision(draw: int, next_counts: tuple) -> float:
+            hand = children[0][SHOE_CARDS.index(draw)]
+            value = max(stand[hand], hit[hand])
+            if rules.double_after_split and rules.can_double(totals[hand]):
+                value = max(value, double[hand])
+            return float(value)
+
+    non_pair, pair_prob, pair_value = 0, 0, 0
+    for draw, draw_prob, next_counts in _draws(counts):
+        if draw == card:
+            pair_prob, pair_value = draw_prob, first_decision(draw, next_counts)
+        else:
+            non_pair += draw_prob * first_decision(draw, next_counts)
+    return non_pair, pair_prob, pair_value
+
+
+def shoe_split_EV(dealer_upcard: int, counts: tuple, card: int, rules: Rules = DEFAULT_RULES) -> float:
+    """
+    Calculate the expected value of splitting a pair with a finite shoe.
+
+    Each hand is played on from the composition left after the split and after any resplits, so the cards drawn
+    by one split hand are not removed from the shoe of the others. With a dealer peek, a dealer Blackjack only takes the original bet rather than every split and doubled hand.
+
+    Args:
+        dealer_upcard (int): The dealer's upcard value (must be between 2 and 11, inclusive).
+        counts (tuple): The cards left in the shoe, in the order of SHOE_CARDS, with the upcard and both cards of the pair already removed.
+        card (int): The value of each card in the pair (2 to 11, inclusive).
+        rules (Rules, optional): The table rules. The split rules and the dealer's soft 17 and peek rules apply to finite shoes. Defaults to DEFAULT_RULES.
+
+    Returns:
+        float: The expected value summed over every hand resulting from the split.
+    """
+    counts = tuple(counts)
+    max_hands = rules.max_split_hands if card != 11 or rules.resplit_aces else 2
+
+    def hand_values(hands: int) -> tuple:
+        # Every resplit has drawn one more card of the pair from the shoe
+        return _shoe_split_hand(dealer_upcard, remove_cards(counts, *[card] * (hands - 2)), card, rules)
+
+    value = resplit_EV(hand_values, max_hands)
+    if rules.dealer_peek:
+        # The hands were valued as if a dealer Blackjack cost nothing
+        value -= _shoe_dealer_outcomes(counts, dealer_upcard, rules.hit_soft_17)[DEALER_OUTCOMES.index("BJ")]
+    return value
+
+
+def shoe_cache_size() -> int:
+    """Get the number of memoized dealer distributions and player EVs computed for finite shoes."""
+    return sum(function.cache_info().currsize for function in (_shoe_dealer_outcomes, _shoe_stand_value, _shoe_draw_values, _shoe_split_hand))
+
+
+def clear_shoe_cache() -> None:
+    """Remove every memoized dealer distribution and player EV computed for finite shoes."""
+    _shoe_dealer_outcomes.cache_clear()
+    _shoe_stand_value.cache_clear()
+    _shoe_draw_values.cache_clear()
+    _shoe_split_hand.cache_clear()
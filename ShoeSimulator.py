@@ -0,0 +1,506 @@
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from Blackjack import Blackjack
+from TableCreation import create_optimal_table, create_soft_optimal_table
+from TrueCount import CARDS_PER_DECK, SHOE_CARDS, card_tags
+
+# Strategy actions as stored in action tables, and the matching moves accepted by Blackjack.play_round
+STAND, HIT, DOUBLE = 0, 1, 2
+MOVES = ("s", "h", "d")
+ACTION_CODES = {"Stand": STAND, "Hit": HIT, "DD": DOUBLE}
+
+# Card values of one deck, one entry per card (11 is the ace)
+DECK_CARD_VALUES = np.repeat(np.array([11, 2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10], dtype=np.int8), 4)
+
+# Percentiles of the bankroll reported by simulate_bankroll
+BANKROLL_PERCENTILES = (5, 25, 50, 75, 95)
+
+# Largest number of points on the bankroll percentile curve, each of which keeps one histogram per chunk
+MAX_BANKROLL_CHECKPOINTS = 1_000
+
+# Number of bankroll trajectories simulated per task sent to a worker process
+DEFAULT_TRAJECTORY_CHUNK = 10_000
+
+# Number of tables played at once by simulate_table
+DEFAULT_TABLE_CHUNK = 10_000
+
+
+class BasicStrategy:
+    """
+    Plays the infinite-deck chart given by create_optimal_table and create_soft_optimal_table.
+
+    Hard totals below the chart are hit. The action table is indexed by [is_soft, total, dealer upcard value].
+    """
+
+    def __init__(self) -> None:
+        dealer_upcards = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'A']
+        hard_table = create_optimal_table(dealer_upcards)
+        soft_table = create_soft_optimal_table(dealer_upcards)
+
+        self.actions = np.full((2, 32, 12), HIT, dtype=np.int8)
+        self.actions[:, 21:, :] = STAND
+        for is_soft, table in ((0, hard_table), (1, soft_table)):
+            for upcard in dealer_upcards:
+                upcard_value = 11 if upcard == 'A' else int(upcard)
+                for total, action in table[upcard].items():
+                    self.actions[is_soft, total, upcard_value] = ACTION_CODES[action]
+
+    def action_table(self) -> np.ndarray:
+        """Get the action table used by the vectorized simulator."""
+        return self.actions
+
+    def decide(self, hand, dealer_upcard: int) -> str:
+        """Choose 'h', 's' or 'd' for a Hand against the dealer's upcard value."""
+        return MOVES[self.actions[int(hand.is_soft()), min(hand.value(), 31), dealer_upcard]]
+
+
+def _max_round_cards(num_decks: int, seats: int = 1) -> int:
+    """
+    Get the most cards a round without splits can use, so a shoe is reshuffled before fewer remain.
+
+    Every hand ends with a last card drawn to cards worth less than its stopping total (21 for a seat, 17 for the
+    dealer), counting aces as 1. The cards before the last ones are at most the smallest cards of the shoe worth that
+    much, so the bound grows with the number of decks and seats.
+    """
+    values = np.sort(np.tile(np.where(DECK_CARD_VALUES == 11, 1, DECK_CARD_VALUES), num_decks))
+    budget = seats * 20 + 16
+    return int(np.count_nonzero(np.cumsum(values) <= budget)) + seats + 1
+
+
+def _reshuffle_point(shoe_size: int, penetration: float, reserve: int) -> int:
+    """Get the number of dealt cards after which a shoe is reshuffled, keeping at least reserve cards for the next round."""
+    return shoe_size - max(int(round(shoe_size * (1 - penetration))), reserve)
+
+
+def _summarize(total: float, total_squares: float, rounds: int, elapsed: float) -> dict:
+    """
+    Turn the sums of round results into summary statistics.
+
+    Returns:
+        dict: The number of rounds, the EV and variance per round in units of the initial bet, the standard
+              error of the EV, and the throughput in rounds per second.
+    """
+    ev = total / rounds
+    variance = (total_squares / rounds - ev ** 2) * rounds / max(rounds - 1, 1)
+    return {
+        "rounds": rounds,
+        "ev": ev,
+        "variance": variance,
+        "std_error": (variance / rounds) ** 0.5,
+        "rounds_per_second": rounds / elapsed if elapsed > 0 else float("inf"),
+    }
+
+
+def simulate_shoe(rounds: int, strategy, num_decks: int = 6, penetration: float = 0.75, seed=None) -> dict:
+    """
+    Play rounds of blackjack through Blackjack.play_round, dealing from a shoe that is reshuffled at the penetration.
+    Works with any strategy object providing decide(hand, dealer_upcard).
+    """
+    rng = random.Random(seed)
+    game = Blackjack(num_decks)
+    shoe_size = game.deck.size()
+    reshuffle_at = _reshuffle_point(shoe_size, penetration, _max_round_cards(num_decks))
+    game.deck.shuffle(rng)
+
+    start = time.perf_counter()
+    total, total_squares = 0.0, 0.0
+    for _ in range(rounds):
+        if shoe_size - game.deck.size() >= reshuffle_at:
+            game.deck.reset()
+            game.deck.shuffle(rng)
+        result = game.play_round(strategy)
+        total += result
+        total_squares += result * result
+
+    return _summarize(total, total_squares, rounds, time.perf_counter() - start)
+
+
+def _add_card(totals: np.ndarray, soft: np.ndarray, cards: np.ndarray) -> tuple:
+    """
+    Add one card to each hand, counting aces as 1 where an 11 would bust the hand.
+
+    Args:
+        totals (np.ndarray): The hand totals, with a soft ace counted as 11.
+        soft (np.ndarray): Whether each hand has an ace counted as 11.
+        cards (np.ndarray): The value of the card added to each hand.
+
+    Returns:
+        tuple: The new totals and soft flags.
+    """
+    new_totals = totals + cards
+    new_soft = soft | (cards == 11)
+    over = (new_totals > 21) & new_soft
+    new_totals = np.where(over, new_totals - 10, new_totals)
+    # An ace drawn to a soft hand leaves one ace counted as 11, unless the hand was a soft 21
+    new_soft = np.where(over, soft & (cards == 11), new_soft)
+    over = (new_totals > 21) & new_soft
+    return np.where(over, new_totals - 10, new_totals), new_soft & ~over
+
+
+def _player_turn(deal, totals: np.ndarray, soft: np.ndarray, blackjack: np.ndarray, dealer_upcards: np.ndarray,
+                 actions: np.ndarray) -> np.ndarray:
+    """
+    Play one seat's hand in each shoe at once, drawing cards in place.
+
+    The player acts until standing, doubling, busting or reaching 21. Doubling is only possible on two cards.
+
+    Returns:
+        np.ndarray: The bet of each hand in units of the initial bet.
+    """
+    bets = np.ones(len(totals), dtype=np.int8)
+    active = np.flatnonzero(~blackjack)
+    first_decision = True
+    while active.size:
+        choices = actions[soft[active].astype(np.intp), totals[active], dealer_upcards[active]]
+        if not first_decision:
+            choices[choices == DOUBLE] = HIT
+        drawing = active[choices != STAND]
+        bets[active[choices == DOUBLE]] = 2
+
+        totals[drawing], soft[drawing] = _add_card(totals[drawing], soft[drawing], deal(drawing))
+        active = drawing[(bets[drawing] == 1) & (totals[drawing] < 21)]
+        first_decision = False
+    return bets
+
+
+def _play_table_rounds(shoes: np.ndarray, positions: np.ndarray, rows: np.ndarray, seat_actions: tuple) -> np.ndarray:
+    """
+    Play one round at a table in each of the given shoes at once, with every seat drawing from the table's shoe.
+
+    Cards are dealt in table order: one to each seat from the first, the dealer's upcard, a second card to each
+    seat and the dealer's hole card. Seats then play their hands in the same order before the dealer, following
+    the same rules as Blackjack.play_round.
+
+    Args:
+        shoes (np.ndarray): The card values of every shoe, one shoe per row.
+        positions (np.ndarray): The position of the next card in each shoe, advanced in place.
+        rows (np.ndarray): The shoes playing a round.
+        seat_actions (tuple): The action table of each seat's strategy, indexed by [is_soft, total, dealer upcard value].
+
+    Returns:
+        np.ndarray: An array of shape (len(seat_actions), len(rows)) with each seat's result in units of the initial bet.
+    """
+    def deal(hands: np.ndarray) -> np.ndarray:
+        shoe_rows = rows[hands]
+        cards = shoes[shoe_rows, positions[shoe_rows]]
+        positions[shoe_rows] += 1
+        return cards
+
+    everyone = np.arange(len(rows))
+    seats = range(len(seat_actions))
+    player_totals = np.zeros((len(seat_actions), len(rows)), dtype=np.int8)
+    player_soft = np.zeros((len(seat_actions), len(rows)), dtype=bool)
+    for seat in seats:
+        player_totals[seat], player_soft[seat] = _add_card(player_totals[seat], player_soft[seat], deal(everyone))
+    dealer_upcards = deal(everyone)
+    for seat in seats:
+        player_totals[seat], player_soft[seat] = _add_card(player_totals[seat], player_soft[seat], deal(everyone))
+    dealer_totals, dealer_soft = _add_card(dealer_upcards, dealer_upcards == 11, deal(everyone))
+
+    player_blackjack = player_totals == 21
+    dealer_blackjack = dealer_totals == 21
+    # Each seat's rows are views, so the hands are played in place
+    bets = np.stack([_player_turn(deal, player_totals[seat], player_soft[seat], player_blackjack[seat], dealer_upcards,
+                                  seat_actions[seat]) for seat in seats])
+
+    # The dealer only draws when some seat still has a live hand
+    live = (~player_blackjack & (player_totals <= 21)).any(axis=0)
+    drawing = everyone[live & (dealer_totals < 17)]
+    while drawing.size:
+        dealer_totals[drawing], dealer_soft[drawing] = _add_card(dealer_totals[drawing], dealer_soft[drawing], deal(drawing))
+        drawing = drawing[dealer_totals[drawing] < 17]
+
+    results = np.where(
+        (player_totals > 21) | dealer_blackjack | ((dealer_totals <= 21) & (dealer_totals > player_totals)),
+        -1.0,
+        np.where((dealer_totals > 21) | (player_totals > dealer_totals), 1.0, 0.0)
+    ) * bets
+    return np.where(player_blackjack, np.where(dealer_blackjack, 0.0, 1.5), results)
+
+
+def _play_rounds(shoes: np.ndarray, positions: np.ndarray, rows: np.ndarray, actions: np.ndarray) -> np.ndarray:
+    """
+    Play one round in each of the given shoes at once, with a single player at the table.
+
+    Returns:
+        np.ndarray: The player's result in each shoe, in units of the initial bet.
+    """
+    return _play_table_rounds(shoes, positions, rows, (actions,))[0]
+
+
+def _simulate_tables(rounds: int, seat_actions: tuple, num_decks: int, penetration: float, reserve: int,
+                     num_tables: int, rng: np.random.Generator) -> tuple:
+    """
+    Play rounds at many tables at once, each with its own shoe, reshuffled once fewer than reserve cards are left past
+    the penetration.
+
+    Returns:
+        tuple: The sum of each seat's results and the sum of their squares, as arrays of length len(seat_actions).
+    """
+    num_tables = max(1, min(num_tables, rounds))
+    shoe_size = len(DECK_CARD_VALUES) * num_decks
+    reshuffle_at = _reshuffle_point(shoe_size, penetration, reserve)
+    if reshuffle_at <= 0:
+        raise ValueError(f"A {num_decks}-deck shoe is too small for {len(seat_actions)} seats.")
+    shoes = rng.permuted(np.tile(DECK_CARD_VALUES, (num_tables, num_decks)), axis=1)
+    positions = np.zeros(num_tables, dtype=np.intp)
+
+    total, total_squares, played = np.zeros(len(seat_actions)), np.zeros(len(seat_actions)), 0
+    while played < rounds:
+        rows = np.arange(min(num_tables, rounds - played))
+        results = _play_table_rounds(shoes, positions, rows, seat_actions)
+        total += results.sum(axis=1)
+        total_squares += np.square(results).sum(axis=1)
+        played += len(rows)
+
+        # Shoes past the cut card are reshuffled before their next round
+        finished = np.flatnonzero(positions >= reshuffle_at)
+        if finished.size:
+            shoes[finished] = rng.permuted(shoes[finished], axis=1)
+            positions[finished] = 0
+
+    return total, total_squares
+
+
+def batch_simulate_shoe(rounds: int, strategy, num_decks: int = 6, penetration: float = 0.75, seed=None, num_shoes: int = 100_000) -> dict:
+    """
+    Play rounds of blackjack in many independent shoes at once with NumPy, following the rules of simulate_shoe.
+    The strategy must provide action_table(), as BasicStrategy does. Passing the same seed reproduces the same result.
+    """
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    total, total_squares = _simulate_tables(rounds, (strategy.action_table(),), num_decks, penetration, _max_round_cards(num_decks),
+                                            num_shoes, rng)
+    return _summarize(float(total[0]), float(total_squares[0]), rounds, time.perf_counter() - start)
+
+
+def simulate_table(rounds: int, strategies: list, num_decks: int = 6, penetration: float = 0.75, seed=None,
+                   num_tables: int = DEFAULT_TABLE_CHUNK, heads_up: bool = True) -> dict:
+    """
+    Play rounds at tables of several seats sharing one shoe, and report each seat's EV.
+
+    Every table deals from its own shoe in table order, as _play_table_rounds describes, so each seat's cards depend
+    on what the seats before it drew. Thousands of tables are played at once with NumPy. The shoe is reshuffled at
+    the penetration, or earlier if a full round might not fit in the cards left.
+
+    To measure the effect of the cards other seats remove, each strategy is also played heads-up, alone at a table
+    with the same reshuffle point. The difference is expected to be close to zero, since cards drawn
+    by others are unknown to a seat's strategy and so only move its EV through the reshuffle point.
+
+    Args:
+        rounds (int): The number of rounds to play, summed over all tables.
+        strategies (list): The strategy of each seat from first base, providing action_table() as BasicStrategy does.
+        num_decks (int, optional): The number of decks in each shoe. Defaults to 6.
+        penetration (float, optional): The share of the shoe dealt before it is reshuffled. Defaults to 0.75.
+        seed (optional): The random seed. Passing the same seed reproduces the same result. Defaults to None.
+        num_tables (int, optional): The number of tables played at once. Defaults to DEFAULT_TABLE_CHUNK.
+        heads_up (bool, optional): Whether to also play each strategy heads-up for comparison. Defaults to True.
+
+    Returns:
+        dict: The number of "rounds", "seats" (a list with the summary of each seat, as batch_simulate_shoe returns,
+              plus its "heads_up_ev", "ev_difference" and "ev_difference_std_error" when heads_up is set) and the
+              "rounds_per_second" and "hands_per_second" of the table simulation.
+    """
+    if not strategies:
+        raise ValueError("A table needs at least one seat.")
+    seat_seeds, heads_up_seed = np.random.SeedSequence(seed).spawn(2)
+    seat_actions = tuple(strategy.action_table() for strategy in strategies)
+    reserve = _max_round_cards(num_decks, len(strategies))
+
+    start = time.perf_counter()
+    total, total_squares = _simulate_tables(rounds, seat_actions, num_decks, penetration, reserve, num_tables,
+                                            np.random.default_rng(seat_seeds))
+    elapsed = time.perf_counter() - start
+    seats = [_summarize(float(total[seat]), float(total_squares[seat]), rounds, elapsed) for seat in range(len(strategies))]
+
+    if heads_up:
+        # Seats sharing a strategy share its heads-up run
+        heads_up_summaries = {}
+        for seat, strategy in zip(seats, strategies):
+            if id(strategy) not in heads_up_summaries:
+                alone_total, alone_squares = _simulate_tables(rounds, (strategy.action_table(),), num_decks, penetration,
+                                                              reserve, num_tables, np.random.default_rng(heads_up_seed))
+                heads_up_summaries[id(strategy)] = _summarize(float(alone_total[0]), float(alone_squares[0]), rounds, elapsed)
+            alone = heads_up_summaries[id(strategy)]
+            seat["heads_up_ev"] = alone["ev"]
+            seat["ev_difference"] = seat["ev"] - alone["ev"]
+            seat["ev_difference_std_error"] = (seat["std_error"] ** 2 + alone["std_error"] ** 2) ** 0.5
+
+    return {
+        "rounds": rounds,
+        "seats": seats,
+        "rounds_per_second": rounds / elapsed if elapsed > 0 else float("inf"),
+        "hands_per_second": rounds * len(strategies) / elapsed if elapsed > 0 else float("inf"),
+    }
+
+
+def _running_counts(shoes: np.ndarray, card_tags_by_value: np.ndarray) -> np.ndarray:
+    """Get the running count of each shoe before each position: column p holds the count of the first p cards."""
+    counts = np.zeros((len(shoes), shoes.shape[1] + 1), dtype=np.int16)
+    np.cumsum(card_tags_by_value[shoes], axis=1, out=counts[:, 1:])
+    return counts
+
+
+def _bankroll_chunk(trajectories: int, rounds: int, actions: np.ndarray, ramp: tuple, bankroll: float, num_decks: int,
+                    penetration: float, card_tags_by_value: np.ndarray, report_every: int, bin_width: float,
+                    seed_sequence: np.random.SeedSequence) -> dict:
+    """
+    Play bankroll trajectories, each in its own shoe. Executed in a worker process.
+
+    Only running sums and one bankroll histogram per checkpoint are kept, and simulate_bankroll bounds the number of
+    checkpoints.
+
+    Returns:
+        dict: The number of ruined trajectories, the number of rounds played, the sums of round results, of their
+              squares and of the bets, and the bankroll histogram (with bins of bin_width) at each checkpoint.
+    """
+    rng = np.random.default_rng(seed_sequence)
+    thresholds, bets = ramp
+    shoe_size = len(DECK_CARD_VALUES) * num_decks
+    reshuffle_at = _reshuffle_point(shoe_size, penetration, _max_round_cards(num_decks))
+    shoes = rng.permuted(np.tile(DECK_CARD_VALUES, (trajectories, num_decks)), axis=1)
+    running_counts = _running_counts(shoes, card_tags_by_value)
+    positions = np.zeros(trajectories, dtype=np.intp)
+    bankrolls = np.full(trajectories, float(bankroll))
+    playing = np.arange(trajectories)
+
+    total, total_squares, total_bets, played = 0.0, 0.0, 0.0, 0
+    histograms = []
+    for round_number in range(1, rounds + 1):
+        if playing.size:
+            # The bet follows the true count before the round, the running count per deck left in the shoe
+            decks_left = (shoe_size - positions[playing]) / CARDS_PER_DECK
+            true_counts = running_counts[playing, positions[playing]] / decks_left
+            wagers = bets[np.maximum(np.searchsorted(thresholds, true_counts, side="right") - 1, 0)]
+            # A player cannot bet more than is left, and doubles for less when the bankroll does not cover a double
+            available = bankrolls[playing]
+            wagers = np.minimum(wagers, available)
+
+            results = _play_rounds(shoes, positions, playing, actions)
+            doubled = np.abs(results) == 2
+            results = np.where(doubled, np.sign(results) * np.minimum(2 * wagers, available), results * wagers)
+            bankrolls[playing] += results
+            total += results.sum()
+            total_squares += np.square(results).sum()
+            total_bets += wagers.sum()
+            played += playing.size
+            # A trajectory whose bankroll is gone stops playing
+            playing = playing[bankrolls[playing] > 0]
+
+            finished = np.flatnonzero(positions >= reshuffle_at)
+            if finished.size:
+                shoes[finished] = rng.permuted(shoes[finished], axis=1)
+                running_counts[finished] = _running_counts(shoes[finished], card_tags_by_value)
+                positions[finished] = 0
+
+        if round_number % report_every == 0 or round_number == rounds:
+            histograms.append(np.bincount((bankrolls // bin_width).astype(np.intp)))
+
+    return {
+        "ruined": trajectories - playing.size,
+        "played": played,
+        "total": float(total),
+        "total_squares": float(total_squares),
+        "total_bets": float(total_bets),
+        "histograms": histograms,
+    }
+
+
+def _histogram_percentiles(histogram: np.ndarray, bin_width: float) -> list:
+    """Get the lower edge of the histogram bin holding each of BANKROLL_PERCENTILES."""
+    cumulative = np.cumsum(histogram)
+    ranks = np.array(BANKROLL_PERCENTILES) / 100 * cumulative[-1]
+    return (np.searchsorted(cumulative, ranks) * bin_width).tolist()
+
+
+def simulate_bankroll(trajectories: int, rounds: int, strategy, bet_ramp: dict, bankroll: float, num_decks: int = 6,
+                      penetration: float = 0.75, tags="hi-lo", report_every: int = 100, bin_width: float = None, seed=None,
+                      workers: int = None, chunk_size: int = DEFAULT_TRAJECTORY_CHUNK) -> dict:
+    """
+    Play many independent bankroll trajectories with a count-driven bet ramp, and report the risk of ruin.
+
+    Each trajectory is a player with their own shoe, playing rounds as batch_simulate_shoe does while keeping
+    a running count. Before each round, the true count (the running count per deck left in the shoe) sets the bet.
+    No bet is larger than the bankroll left, and a double the bankroll cannot cover is made for less, so a bankroll
+    never goes below zero. A trajectory is ruined once its bankroll is gone, and then stops playing. Trajectories are
+    simulated in vectorized chunks across a process pool. Each chunk draws from its own seed sequence, so a given
+    seed gives the same result for any number of workers. Only running sums and at most MAX_BANKROLL_CHECKPOINTS
+    bankroll histograms per chunk are kept, so memory does not grow with the number of rounds.
+
+    Args:
+        trajectories (int): The number of independent bankrolls to simulate.
+        rounds (int): The number of rounds each bankroll plays, unless it is ruined first.
+        strategy: The playing strategy, providing action_table() as BasicStrategy does.
+        bet_ramp (dict): A dictionary mapping true counts to bets. A true count at or above a key bets at least its
+                         value, and counts below the lowest key bet that key's value.
+        bankroll (float): The starting bankroll, in the same units as the bets.
+        num_decks (int, optional): The number of decks in each shoe. Defaults to 6.
+        penetration (float, optional): The share of the shoe dealt before it is reshuffled. Defaults to 0.75.
+        tags (optional): A name in TrueCount.TAG_SYSTEMS or the tag of each card value in the order of SHOE_CARDS.
+                         Defaults to "hi-lo".
+        report_every (int, optional): The number of rounds between points of the bankroll percentile curve. It is
+                                      widened when the curve would have more than MAX_BANKROLL_CHECKPOINTS points.
+                                      Defaults to 100.
+        bin_width (float, optional): The resolution of the bankroll percentiles. Defaults to 1% of the starting bankroll.
+        seed (optional): The random seed. Defaults to None.
+        workers (int, optional): The number of worker processes. None uses every core, 1 runs in this process.
+        chunk_size (int, optional): The number of trajectories simulated at once by one worker. Defaults to DEFAULT_TRAJECTORY_CHUNK.
+
+    Returns:
+        dict: The number of "trajectories" and "rounds", the "risk_of_ruin" (the share of trajectories ruined),
+              the "win_rate" and "std_per_100" (mean and standard deviation of the result of 100 rounds),
+              "n0" (the number of rounds after which the expected win equals one standard deviation), the
+              "average_bet", "percentile_rounds" (the rounds at each point of the curve) and "bankroll_percentiles"
+              (the bankroll at each of BANKROLL_PERCENTILES at each point, to within bin_width, counting ruined
+              bankrolls as 0), and the "rounds_per_second".
+    """
+    thresholds = np.array(sorted(bet_ramp), dtype=float)
+    bets = np.array([bet_ramp[count] for count in sorted(bet_ramp)], dtype=float)
+    if not len(bets) or (bets <= 0).any():
+        raise ValueError("A bet ramp needs at least one true count, and every bet must be positive.")
+    bin_width = bankroll / 100 if bin_width is None else bin_width
+    report_every = max(report_every, -(-rounds // MAX_BANKROLL_CHECKPOINTS))
+
+    tags_by_value = np.zeros(12, dtype=np.int16)
+    tags_by_value[list(SHOE_CARDS)] = card_tags(tags)
+
+    sizes = [min(chunk_size, trajectories - start) for start in range(0, trajectories, chunk_size)]
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(sizes))
+    arguments = (rounds, strategy.action_table(), (thresholds, bets), bankroll, num_decks, penetration, tags_by_value,
+                 report_every, bin_width)
+
+    start = time.perf_counter()
+    if workers == 1:
+        chunks = [_bankroll_chunk(size, *arguments, seed_sequence) for size, seed_sequence in zip(sizes, seed_sequences)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            futures = [executor.submit(_bankroll_chunk, size, *arguments, seed_sequence) for size, seed_sequence in zip(sizes, seed_sequences)]
+            chunks = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    played = sum(chunk["played"] for chunk in chunks)
+    summary = _summarize(sum(chunk["total"] for chunk in chunks), sum(chunk["total_squares"] for chunk in chunks), played, elapsed)
+
+    # Histograms of different chunks grow to different lengths, so they are padded before being merged
+    percentiles = []
+    for histograms in zip(*(chunk["histograms"] for chunk in chunks)):
+        merged = np.zeros(max(len(histogram) for histogram in histograms), dtype=np.int64)
+        for histogram in histograms:
+            merged[:len(histogram)] += histogram
+        percentiles.append(_histogram_percentiles(merged, bin_width))
+
+    return {
+        "trajectories": trajectories,
+        "rounds": rounds,
+        "risk_of_ruin": sum(chunk["ruined"] for chunk in chunks) / trajectories,
+        "win_rate": 100 * summary["ev"],
+        "std_per_100": (100 * summary["variance"]) ** 0.5,
+        "n0": summary["variance"] / summary["ev"] ** 2 if summary["ev"] else float("inf"),
+        "average_bet": sum(chunk["total_bets"] for chunk in chunks) / played,
+        "percentile_rounds": np.array([*range(report_every, rounds + 1, report_every)] + ([rounds] if rounds % report_every else [])),
+        "bankroll_percentiles": np.array(percentiles),
+        "rounds_per_second": summary["rounds_per_second"],
+    }
@@ -0,0 +1,161 @@
+import hashlib
+import os
+import struct
+from dataclasses import replace
+import numpy as np
+from Rules import Rules, DEFAULT_RULES
+
+# File format. Bump FORMAT_VERSION whenever the header, the chart layout, the action codes or the EVs the
+# charts are built from change, so stale files are rebuilt rather than misread.
+MAGIC = b"BJSTRAT\0"
+FORMAT_VERSION = 3
+HEADER = struct.Struct("<8sI16s")
+HEADER_SIZE = 64
+
+# Action codes stored in a chart. They are part of the file format, so they are kept here rather than
+# following ProbabilityFunctions.ACTIONS.
+ACTIONS = ("Stand", "Hit", "DD", "Split", "Surrender")
+NO_ACTION = -1
+
+# Chart layout: [hand kind, hand total (or pair card value), dealer upcard value (11 is the ace)]
+HARD, SOFT, PAIR = 0, 1, 2
+CHART_SHAPE = (3, 22, 12)
+
+DEFAULT_STORE_DIRECTORY = "strategy_store"
+
+
+def rules_hash(rules: Rules) -> str:
+    """
+    Get a digest of a rule set that is stable across processes, unlike hash().
+
+    The charts assume an infinite deck, so rules that only differ in deck count share a digest.
+    """
+    return hashlib.sha1(repr(replace(rules, num_decks=None)).encode()).hexdigest()[:16]
+
+
+def build_chart(rules: Rules = DEFAULT_RULES) -> np.ndarray:
+    """
+    Compute the strategy chart of a rule set from the optimal move tables.
+
+    Args:
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
+
+    Returns:
+        np.ndarray: An int8 array of shape CHART_SHAPE holding the index in ACTIONS of the best move, or NO_ACTION
+                    where the tables have no entry. Pairs that should not be split hold the move for their total.
+    """
+    # Only building a chart needs the EV math and pandas, so loading a stored chart stays cheap
+    from TableCreation import create_optimal_table, create_soft_optimal_table, create_split_optimal_table
+
+    dealer_upcards = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'A']
+    hard_table = create_optimal_table(dealer_upcards, rules)
+    soft_table = create_soft_optimal_table(dealer_upcards, rules)
+    split_table = create_split_optimal_table(dealer_upcards, rules)
+
+    chart = np.full(CHART_SHAPE, NO_ACTION, dtype=np.int8)
+    for upcard in dealer_upcards:
+        upcard_value = 11 if upcard == 'A' else int(upcard)
+        for kind, table in ((HARD, hard_table), (SOFT, soft_table)):
+            for total, action in table[upcard].items():
+                chart[kind, total, upcard_value] = ACTIONS.index(action)
+        for card, move in split_table[upcard].items():
+            if move == "S":
+                chart[PAIR, card, upcard_value] = ACTIONS.index("Split")
+            else:
+                chart[PAIR, card, upcard_value] = chart[SOFT, 12, upcard_value] if card == 11 else chart[HARD, card * 2, upcard_value]
+
+    return chart
+
+
+class StrategyChart:
+    """
+    A read-only strategy chart for one rule set, usually memory-mapped from a StrategyStore file.
+    """
+
+    def __init__(self, actions: np.ndarray, rules: Rules = DEFAULT_RULES) -> None:
+        self.actions = actions
+        self.rules = rules
+
+    def action(self, dealer_upcard: int, total: int, is_soft: bool = False, pair: bool = False) -> str:
+        """
+        Look up the best move for a player hand.
+
+        Args:
+            dealer_upcard (int): The dealer's upcard value (must be between 2 and 11, inclusive).
+            total (int): The player's hand total, or the value of each card for a pair.
+            is_soft (bool, optional): Whether the hand contains an ace counted as 11. Defaults to False.
+            pair (bool, optional): Whether the hand is a pair of equal cards that may be split. Defaults to False.
+
+        Returns:
+            str: "Stand", "Hit", "DD", "Split" or "Surrender".
+        """
+        kind = PAIR if pair else SOFT if is_soft else HARD
+        code = self.actions[kind, total, dealer_upcard] if 0 <= total < CHART_SHAPE[1] else NO_ACTION
+        if code == NO_ACTION:
+            raise KeyError(f"No chart entry for {'pair of ' if pair else 'soft ' if is_soft else ''}{total} against {dealer_upcard}.")
+        return ACTIONS[code]
+
+
+class StrategyStore:
+    """
+    A directory of strategy charts, one fixed-layout binary file per rule set.
+
+    Each file holds a small header (magic bytes, FORMAT_VERSION and the rules_hash) followed by the raw chart.
+    Charts are loaded with numpy.memmap, so every process reading a chart shares one page-cached copy and a
+    lookup is a single array index. Missing or outdated charts are built on first use.
+    """
+
+    def __init__(self, directory: str = DEFAULT_STORE_DIRECTORY) -> None:
+        self.directory = directory
+
+    def path(self, rules: Rules = DEFAULT_RULES) -> str:
+        """Get the path of the chart file of a rule set."""
+        return os.path.join(self.directory, f"{rules_hash(rules)}.bjs")
+
+    def _header(self, rules: Rules) -> bytes:
+        return HEADER.pack(MAGIC, FORMAT_VERSION, rules_hash(rules).encode()).ljust(HEADER_SIZE, b"\0")
+
+    def is_current(self, rules: Rules = DEFAULT_RULES) -> bool:
+        """Check whether the store holds a chart for a rule set in the current format."""
+        try:
+            with open(self.path(rules), "rb") as file:
+                return file.read(HEADER_SIZE) == self._header(rules)
+        except FileNotFoundError:
+            return False
+
+    def build(self, rules: Rules = DEFAULT_RULES) -> str:
+        """
+        Compute the chart of a rule set and write it to the store, replacing any existing file.
+
+        The file is written under a temporary name and then renamed, so readers never see a partial chart.
+
+        Returns:
+            str: The path of the chart file.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(rules)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(self._header(rules))
+            file.write(build_chart(rules).tobytes())
+        os.replace(temporary_path, path)
+        return path
+
+    def load(self, rules: Rules = DEFAULT_RULES, build: bool = True) -> StrategyChart:
+        """
+        Memory-map the chart of a rule set.
+
+        Args:
+            rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
+            build (bool, optional): Whether to build the chart if it is missing or in an older format. Defaults to True.
+
+        Returns:
+            StrategyChart: The chart, backed by a read-only memory map of the file.
+        """
+        if not self.is_current(rules):
+            if not build:
+                raise FileNotFoundError(f"No current strategy chart for {rules} in {self.directory}.")
+            self.build(rules)
+
+        actions = np.memmap(self.path(rules), dtype=np.int8, mode="r", offset=HEADER_SIZE, shape=CHART_SHAPE)
+        return StrategyChart(actions, rules)
@@ -0,0 +1,334 @@
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import fields, replace
+from functools import lru_cache
+from typing import get_args
+import numpy as np
+from ProbabilityFunctions import *
+from ShoeProbabilityFunctions import (SHOE_CARDS, full_shoe_counts, remove_cards, shoe_probability_distribution, shoe_stand_EV,
+                                      shoe_action_EV, clear_shoe_cache)
+from Rules import Rules, DEFAULT_RULES
+
+RULE_FIELDS = tuple(field.name for field in fields(Rules))
+RESULT_COLUMNS = RULE_FIELDS + ("ev", "chart_hash")
+
+# Rule fields that change the dealer's distributions. They vary slowest through a sweep, so neighbouring
+# variants (and the chunks sent to each worker) share the same memoized dealer subresults.
+DEALER_FIELDS = ("hit_soft_17", "dealer_peek")
+
+# Number of variants evaluated per task sent to a worker process
+DEFAULT_CHUNK_SIZE = 64
+
+# Number of rows written to each Parquet row group
+PARQUET_ROW_GROUP_SIZE = 10_000
+
+
+def rule_variants(grid: dict):
+    """
+    Iterate over every combination of rule values in a grid.
+
+    Args:
+        grid (dict): A dictionary mapping Rules field names to lists of values. Fields left out keep
+                     their value from DEFAULT_RULES.
+
+    Yields:
+        Rules: One rule set per combination, with the fields in DEALER_FIELDS varying slowest.
+    """
+    unknown = set(grid) - set(RULE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown rule fields: {', '.join(sorted(unknown))}.")
+
+    names = sorted(grid, key=lambda name: (name not in DEALER_FIELDS, RULE_FIELDS.index(name)))
+    for values in itertools.product(*(grid[name] for name in names)):
+        yield replace(DEFAULT_RULES, **dict(zip(names, values)))
+
+
+def _starting_state(first: int, second: int) -> int:
+    """Get the EV tensor hand state of the player's first two cards."""
+    if first == second:
+        return pair_state(first)
+    elif first + second == 21:
+        return BLACKJACK
+    return hand_state(first + second, is_soft=11 in (first, second))
+
+
+def _deal_probability(num_decks: int, *cards: int) -> float:
+    """Get the probability of dealing the given cards in order, from num_decks decks or from an infinite deck if None."""
+    if num_decks is None:
+        return float(np.prod([CARD_PROBABILITIES[card] for card in cards]))
+
+    # Each card dealt is removed from the shoe before the next one
+    counts = dict(zip(SHOE_CARDS, full_shoe_counts(num_decks)))
+    remaining = sum(counts.values())
+    prob = 1
+    for card in cards:
+        prob *= counts[card] / remaining
+        counts[card] -= 1
+        remaining -= 1
+    return prob
+
+
+@lru_cache(maxsize=None)
+def _deal_weights(num_decks: int = None) -> np.ndarray:
+    """
+    Calculate the probability of each dealer upcard and starting hand state of the player.
+
+    Args:
+        num_decks (int, optional): The number of decks the cards are dealt from without replacement, or None for an infinite deck.
+
+    Returns:
+        np.ndarray: An array of shape (len(UPCARDS), NUM_STATES) summing to 1, aligned with the EV tensor.
+    """
+    weights = np.zeros((len(UPCARDS), NUM_STATES))
+    for first, second, upcard in itertools.product(UPCARDS, repeat=3):
+        weights[UPCARDS.index(upcard), _starting_state(first, second)] += _deal_probability(num_decks, first, second, upcard)
+
+    return weights
+
+
+def _correction_rules(rules: Rules) -> Rules:
+    """
+    Keep only the rules a deck correction depends on, so variants that differ in nothing else share one correction.
+
+    Splits and the dealer's peek keep their infinite-deck values, so the split rules, the peek and the Blackjack
+    payout (Blackjacks are left out) are reset to their defaults.
+    """
+    return Rules(hit_soft_17=rules.hit_soft_17, surrender=rules.surrender, double_on=rules.double_on, num_decks=rules.num_decks)
+
+
+def deck_correction(rules: Rules) -> float:
+    """
+    Calculate how much dealing from a finite shoe changes the expected value of a round compared with an infinite deck.
+
+    Every starting hand other than a Blackjack is played with the best of standing, hitting, doubling where the
+    rules allow it and surrendering where the rules allow it, once with the exact finite-shoe EVs for its cards and
+    the upcard and once with the infinite-deck EVs. The correction is the probability-weighted difference. Splits
+    and the dealer's peek keep their infinite-deck values, so both sides are computed without a peek.
+
+    Args:
+        rules (Rules): The table rules, with num_decks set to the number of decks in the shoe.
+
+    Returns:
+        float: The change in the player's expected value per unit bet.
+    """
+    return _deck_correction(_correction_rules(rules))
+
+
+@lru_cache(maxsize=None)
+def _deck_correction(rules: Rules) -> float:
+    """Calculate the deck_correction of rules already reduced by _correction_rules."""
+    ev = ev_tensor(replace(rules, num_decks=None))
+    compared_actions = [STAND, HIT, DOUBLE, SURRENDER]
+    correction = 0
+    for first, second in itertools.combinations_with_replacement(UPCARDS, 2):
+        total, is_soft = add_card_to_total(*add_card_to_total(0, False, first), second)
+        if total == 21:
+            continue  # Blackjack
+        state = hand_state(total, is_soft)
+        for upcard in UPCARDS:
+            # Either order of two different cards makes the same hand
+            prob = _deal_probability(rules.num_decks, first, second, upcard) * (1 if first == second else 2)
+            counts = remove_cards(full_shoe_counts(rules.num_decks), first, second, upcard)
+            shoe_values = [
+                shoe_stand_EV(upcard, counts, rules)[total],
+                shoe_action_EV(upcard, counts, total, is_soft, rules=rules),
+            ]
+            if rules.can_double(total):
+                shoe_values.append(shoe_action_EV(upcard, counts, total, is_soft, double_down=True, rules=rules))
+            if rules.surrender != "none":
+                shoe_values.append(surrender_EV(shoe_probability_distribution(upcard, counts, rules)["BJ"], rules))
+            correction += prob * (max(shoe_values) - np.nanmax(ev[UPCARDS.index(upcard), state, compared_actions]))
+
+    # The finite-shoe EVs of one deck count are not reused, so they are dropped to keep memory flat
+    clear_shoe_cache()
+    return float(correction)
+
+
+def evaluate_rules(rules: Rules, correction: float = None) -> dict:
+    """
+    Calculate the expected value of a round played with the optimal strategy for a rule set, and a hash of that strategy.
+
+    The EV tensor assumes an infinite deck. For a finite shoe the initial deal is drawn without replacement and
+    the deck_correction for the rules is added.
+
+    Args:
+        rules (Rules): The table rules.
+        correction (float, optional): The deck_correction for the rules, if already known.
+
+    Returns:
+        dict: A row with the value of every field of the rules, "ev" (the player's expected value per unit bet,
+              the negative of the house edge) and "chart_hash" (a digest of the best action in every hand state).
+    """
+    # Variants that only differ in deck count share one EV tensor
+    tensor_rules = replace(rules, num_decks=None)
+    ev = ev_tensor(tensor_rules)
+    round_ev = float((_deal_weights(rules.num_decks) * np.nanmax(ev, axis=2)).sum())
+    if rules.num_decks is not None:
+        round_ev += deck_correction(rules) if correction is None else correction
+    chart = np.nanargmax(ev[:, :BLACKJACK], axis=2).astype(np.int8)
+
+    # Only the shared dealer subresults are kept, so memory stays flat over a sweep
+    clear_cache(tensor_rules)
+
+    row = {name: getattr(rules, name) for name in RULE_FIELDS}
+    row["ev"] = round_ev
+    row["chart_hash"] = hashlib.sha1(chart.tobytes()).hexdigest()[:16]
+    return row
+
+
+def _evaluate_chunk(variants: list, corrections: dict) -> list:
+    """Evaluate a chunk of rule sets with precomputed deck corrections. Executed in a worker process."""
+    return [evaluate_rules(rules, corrections.get(_correction_rules(rules))) for rules in variants]
+
+
+def _deck_correction_keys(grid: dict) -> list:
+    """Get every distinct set of _correction_rules in a grid that needs a deck correction."""
+    correction_grid = {name: grid[name] for name in ("num_decks", "hit_soft_17", "surrender", "double_on") if name in grid}
+    return list(dict.fromkeys(
+        _correction_rules(rules) for rules in rule_variants(correction_grid) if rules.num_decks is not None
+    ))
+
+
+def _chunks(iterable, size: int):
+    """Split an iterable into lists of at most size items without materializing it."""
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def sweep_rows(grid: dict, workers: int = None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Evaluate every rule set in a grid across a process pool.
+
+    The deck corrections are computed once per deck count, soft 17, surrender and doubling rule and shared by every
+    variant. Only a
+    few chunks per worker are in flight at any time, so memory use does not grow with the size of the grid.
+
+    Args:
+        grid (dict): A dictionary mapping Rules field names to lists of values (see rule_variants).
+        workers (int, optional): The number of worker processes. None uses every core, 1 runs in this process.
+        chunk_size (int, optional): The number of variants sent to a worker at once. Defaults to DEFAULT_CHUNK_SIZE.
+
+    Yields:
+        dict: One row per variant (see evaluate_rules), in the order of rule_variants.
+    """
+    chunks = _chunks(rule_variants(grid), chunk_size)
+    keys = _deck_correction_keys(grid)
+    if workers == 1:
+        corrections = {key: deck_correction(key) for key in keys}
+        for chunk in chunks:
+            yield from _evaluate_chunk(chunk, corrections)
+        return
+
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        corrections = dict(zip(keys, executor.map(deck_correction, keys)))
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_evaluate_chunk, chunk, corrections))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def _column_value(value):
+    """Convert a rule value into a value a CSV or Parquet column can hold."""
+    if isinstance(value, tuple):
+        return " ".join(str(item) for item in value)
+    return value
+
+
+def write_csv(rows, path: str) -> int:
+    """
+    Stream rows to a CSV file.
+
+    Returns:
+        int: The number of rows written.
+    """
+    written = 0
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=RESULT_COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({name: _column_value(value) for name, value in row.items()})
+            written += 1
+    return written
+
+
+def write_parquet(rows, path: str, row_group_size: int = PARQUET_ROW_GROUP_SIZE) -> int:
+    """
+    Stream rows to a Parquet file, one row group at a time. Requires pyarrow.
+
+    Returns:
+        int: The number of rows written.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as error:
+        raise ImportError("Writing Parquet files requires pyarrow (pip install pyarrow).") from error
+
+    # Column types follow the Rules annotations, with Optional unwrapped and tuples written as text
+    arrow_types = {bool: pa.bool_(), int: pa.int64(), float: pa.float64(), str: pa.string(), tuple: pa.string()}
+    columns = []
+    for field in fields(Rules):
+        annotation = next((arg for arg in get_args(field.type) if arg is not type(None)), field.type)
+        columns.append((field.name, arrow_types[annotation]))
+    schema = pa.schema(columns + [("ev", pa.float64()), ("chart_hash", pa.string())])
+
+    written = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in _chunks(rows, row_group_size):
+            converted = [{name: _column_value(value) for name, value in row.items()} for row in chunk]
+            writer.write_table(pa.Table.from_pylist(converted, schema=schema))
+            written += len(chunk)
+    return written
+
+
+def sweep(grid: dict, output: str, workers: int = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    Evaluate every rule set in a grid and stream one row per variant to a file.
+
+    Args:
+        grid (dict): A dictionary mapping Rules field names to lists of values (see rule_variants).
+        output (str): The file to write. Files ending in .parquet are written as Parquet, anything else as CSV.
+        workers (int, optional): The number of worker processes. None uses every core, 1 runs in this process.
+        chunk_size (int, optional): The number of variants sent to a worker at once. Defaults to DEFAULT_CHUNK_SIZE.
+
+    Returns:
+        int: The number of rows written.
+    """
+    rows = sweep_rows(grid, workers, chunk_size)
+    if output.endswith(".parquet"):
+        return write_parquet(rows, output)
+    return write_csv(rows, output)
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Calculate the expected value of every combination of rules in a grid.")
+    parser.add_argument("grid", help='JSON file mapping Rules fields to lists of values, e.g. {"hit_soft_17": [false, true]}.')
+    parser.add_argument("--output", default="sweep_results.csv", help="File to write, as CSV or as Parquet if it ends in .parquet.")
+    parser.add_argument("--workers", type=int, help="Number of worker processes. Defaults to every core.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Number of variants sent to a worker at once.")
+    args = parser.parse_args(argv)
+
+    with open(args.grid) as file:
+        grid = json.load(file)
+
+    start = time.perf_counter()
+    written = sweep(grid, args.output, args.workers, args.chunk_size)
+    print(f"Wrote {written} variants to {args.output} in {time.perf_counter() - start:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,26 @@
+from typing import TYPE_CHECKING
 from ProbabilityFunctions import *
-import pandas as pd
+import numpy as np
 
-def create_dealer_prob_dist_table(dealer_upcards: list) -> pd.DataFrame:
+# pandas is only imported by the functions that build DataFrames, so the EV functions load without it
+if TYPE_CHECKING:
+    import pandas as pd
+
+def create_dealer_prob_dist_table(dealer_upcards: list, rules: Rules = DEFAULT_RULES) -> "pd.DataFrame":
     """
     Create a probability distribution table for the dealer's possible outcomes.
 
     Args:
         dealer_upcards (list): List of dealer upcard values.
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
 
     Returns:
         pd.DataFrame: DataFrame representing the probability distribution of the dealer's outcomes.
     """
+    import pandas as pd
+
     # Calculate the probability distribution for the dealer
-    prob_dist = probability_distribution()
+    prob_dist = probability_distribution(rules=rules)
     
     # Create DataFrame from the probability distribution
     prob_df = pd.DataFrame(list(prob_dist.items()), columns=['Outcome', 'Probability']).round(4)
@@ -20,12 +28,13 @@ def create_dealer_prob_dist_table(dealer_upcards: list) -> pd.DataFrame:
     
     return prob_df.T
 
-def create_dealer_prob_dict(dealer_upcards: list) -> dict:
+def create_dealer_prob_dict(dealer_upcards: list, rules: Rules = DEFAULT_RULES) -> dict:
     """
     Create a dictionary mapping each dealer upcard to its probability distribution.
 
     Args:
         dealer_upcards (list): List of dealer upcard values.
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
 
     Returns:
         dict: Dictionary mapping each upcard to its probability distribution.
@@ -33,16 +42,17 @@ def create_dealer_prob_dict(dealer_upcards: list) -> dict:
     prob_dict = {}
     for upcard in dealer_upcards:
         upcard_value = 11 if upcard == 'A' else int(upcard)
-        prob_dict[upcard] = probability_distribution(upcard_value)
+        prob_dict[upcard] = probability_distribution(upcard_value, rules)
     
     return prob_dict
 
-def create_stand_EV_dict(dealer_upcards: list) -> dict:
+def create_stand_EV_dict(dealer_upcards: list, rules: Rules = DEFAULT_RULES) -> dict:
     """
     Create a dictionary mapping each dealer upcard to its expected value when standing.
 
     Args:
         dealer_upcards (list): List of dealer upcard values.
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
 
     Returns:
         dict: Dictionary mapping each upcard to its expected value when standing.
@@ -50,16 +60,17 @@ def create_stand_EV_dict(dealer_upcards: list) -> dict:
     stand_ev_dict = {}
     for upcard in dealer_upcards:
         upcard_value = 11 if upcard == 'A' else int(upcard)
-        stand_ev_dict[upcard] = stand_EV(upcard_value)
+        stand_ev_dict[upcard] = stand_EV(upcard_value, rules)
     
     return stand_ev_dict
 
-def create_hit_EV_dict(dealer_upcards: list) -> dict:
+def create_hit_EV_dict(dealer_upcards: list, rules: Rules = DEFAULT_RULES) -> dict:
     """
     Create a dictionary mapping each dealer upcard to its expected value when hitting.
 
     Args:
         dealer_upcards (list): List of dealer upcard values.
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
 
     Returns:
         dict: Dictionary mapping each upcard to its expected value when hitting.
@@ -67,16 +78,17 @@ def create_hit_EV_dict(dealer_upcards: list) -> dict:
     hit_ev_dict = {}
     for upcard in dealer_upcards:
         upcard_value = 11 if upcard == 'A' else int(upcard)
-        hit_ev_dict[upcard] = total_hit_EV(upcard_value)
+        hit_ev_dict[upcard] = total_hit_EV(upcard_value, rules=rules)
     
     return hit_ev_dict
 
-def create_soft_hit_EV_dict(dealer_upcards: list) -> dict:
+def create_soft_hit_EV_dict(dealer_upcards: list, rules: Rules = DEFAULT_RULES) -> dict:
     """
     Create a dictionary mapping each dealer upcard to its expected value when hitting with a soft hand.
 
     Args:
         dealer_upcards (list): List of dealer upcard values.
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
 
     Returns:
         dict: Dictionary mapping each upcard to its expected value when hitting with a soft hand.
@@ -84,16 +96,17 @@ def create_soft_hit_EV_dict(dealer_upcards: list) -> dict:
     soft_hit_ev_dict = {}
     for upcard in dealer_upcards:
         upcard_value = 11 if upcard == 'A' else int(upcard)
-        soft_hit_ev_dict[upcard] = soft_hit_EV(upcard_value)
+        soft_hit_ev_dict[upcard] = soft_hit_EV(upcard_value, rules=rules)
     
     return soft_hit_ev_dict
 
-def create_double_down_EV_dict(dealer_upcards: list) -> dict:
+def create_double_down_EV_dict(dealer_upcards: list, rules: Rules = DEFAULT_RULES) -> dict:
     """
     Create a dictionary mapping each dealer upcard to its expected value when doubling down.
 
     Args:
         dealer_upcards (list): List of dealer upcard values.
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
 
     Returns:
         dict: Dictionary mapping each upcard to its expected value when doubling down.
@@ -101,16 +114,17 @@ def create_double_down_EV_dict(dealer_upcards: list) -> dict:
     double_down_ev_dict = {}
     for upcard in dealer_upcards:
         upcard_value = 11 if upcard == 'A' else int(upcard)
-        double_down_ev_dict[upcard] = total_hit_EV(upcard_value, double_down=True)
+        double_down_ev_dict[upcard] = total_hit_EV(upcard_value, double_down=True, rules=rules)
     
     return double_down_ev_dict
 
-def create_double_down_soft_EV_dict(dealer_upcards: list) -> dict:
+def create_double_down_soft_EV_dict(dealer_upcards: list, rules: Rules = DEFAULT_RULES) -> dict:
     """
     Create a dictionary mapping each dealer upcard to its expected value when doubling down with a soft hand.
 
     Args:
         dealer_upcards (list): List of dealer upcard values.
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
 
     Returns:
         dict: Dictionary mapping each upcard to its expected value when doubling down with a soft hand.
@@ -118,144 +132,146 @@ def create_double_down_soft_EV_dict(dealer_upcards: list) -> dict:
     double_down_soft_ev_dict = {}
     for upcard in dealer_upcards:
         upcard_value = 11 if upcard == 'A' else int(upcard)
-        double_down_soft_ev_dict[upcard] = soft_hit_EV(upcard_value, double_down=True)
+        double_down_soft_ev_dict[upcard] = soft_hit_EV(upcard_value, double_down=True, rules=rules)
     
     return double_down_soft_ev_dict
 
 
-def create_optimal_dict(dealer_upcards: list) -> dict:
+def _upcard_values(dealer_upcards: list) -> list:
+    """
+    Convert dealer upcard labels into their positions along the upcard axis of the EV tensor.
+
+    Args:
+        dealer_upcards (list): List of dealer upcard values.
+
+    Returns:
+        list: The EV tensor upcard index of each upcard.
+    """
+    return [UPCARDS.index(11 if upcard == 'A' else int(upcard)) for upcard in dealer_upcards]
+
+# The actions compared by the hard and soft tables, in the order ties are broken
+_TABLE_ACTIONS = [STAND, HIT, DOUBLE, SURRENDER]
+
+def _optimal_slice(dealer_upcards: list, values: range, is_soft: bool, rules: Rules = DEFAULT_RULES) -> np.ndarray:
+    """
+    Select the Stand, Hit, Double Down and Surrender EVs of the given hand values for each dealer upcard.
+
+    Args:
+        dealer_upcards (list): List of dealer upcard values (must be between 2 and 11, inclusive).
+        values (range): The player hand values to select.
+        is_soft (bool): Whether the hand values are soft totals.
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
+
+    Returns:
+        np.ndarray: An array of shape (len(dealer_upcards), len(values), len(_TABLE_ACTIONS)) of expected values,
+                    with NaN for doubles and surrenders the rules do not allow.
+    """
+    states = [hand_state(value, is_soft) for value in values]
+    return ev_tensor(rules)[np.ix_(_upcard_values(dealer_upcards), states, _TABLE_ACTIONS)]
+
+def create_optimal_dict(dealer_upcards: list, rules: Rules = DEFAULT_RULES) -> dict:
     """
     Create a dictionary of optimal expected values for each dealer upcard.
 
     Args:
         dealer_upcards (list): List of dealer upcard values (must be between 2 and 11, inclusive).
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
 
     Returns:
         dict: A dictionary mapping each upcard to its optimal expected value for all player hand values.
     """
-    stand_values = create_stand_EV_dict(dealer_upcards)
-    hit_values = create_hit_EV_dict(dealer_upcards)
-    double_down_values = create_double_down_EV_dict(dealer_upcards)
+    values = range(21, 3, -1)
+    best_values = np.nanmax(_optimal_slice(dealer_upcards, values, is_soft=False, rules=rules), axis=2)
+    blackjack_values = ev_tensor(rules)[_upcard_values(dealer_upcards), BLACKJACK, STAND]
 
     optimal_values = {}
     
-    for upcard in dealer_upcards:
-        optimal_values[upcard] = {}
-        for value in range(21, 3, -1):
-            optimal_values[upcard][value] = max(
-                stand_values[upcard].get(value, 0),
-                hit_values[upcard].get(value, 0),
-                double_down_values[upcard].get(value, 0)
-            )
+    for i, upcard in enumerate(dealer_upcards):
+        optimal_values[upcard] = dict(zip(values, best_values[i].tolist()))
         
         # Include the Blackjack case separately
-        optimal_values[upcard]["BJ"] = stand_values[upcard].get("BJ", 0)
+        optimal_values[upcard]["BJ"] = float(blackjack_values[i])
 
     return optimal_values
 
-def create_optimal_table(dealer_upcards: list) -> pd.DataFrame:
+def create_optimal_table(dealer_upcards: list, rules: Rules = DEFAULT_RULES) -> "pd.DataFrame":
     """
-    Create a table of optimal moves (Stand, Hit, or Double Down) for each dealer upcard.
+    Create a table of optimal moves (Stand, Hit, Double Down or Surrender) for each dealer upcard.
 
     Args:
         dealer_upcards (list): List of dealer upcard values (must be between 2 and 11, inclusive).
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
 
     Returns:
         pd.DataFrame: A DataFrame representing the optimal move for each player hand value and dealer upcard.
     """
-    stand_values = create_stand_EV_dict(dealer_upcards)
-    hit_values = create_hit_EV_dict(dealer_upcards)
-    double_down_values = create_double_down_EV_dict(dealer_upcards)
+    import pandas as pd
+
+    values = range(21, 3, -1)
+    # Ties go to the earliest of Stand, Hit, DD and Surrender, which are skipped where the rules do not allow them
+    best_moves = np.nanargmax(_optimal_slice(dealer_upcards, values, is_soft=False, rules=rules), axis=2)
 
     optimal_moves = {}
     
-    for upcard in dealer_upcards:
-        optimal_moves[upcard] = {}
-        for value in range(21, 3, -1):
-            # Determine the best move for the current hand value
-            max_value = max(
-                stand_values[upcard].get(value, 0),
-                hit_values[upcard].get(value, 0),
-                double_down_values[upcard].get(value, 0)
-            )
-            
-            if max_value == stand_values[upcard].get(value, 0):
-                optimal_moves[upcard][value] = "Stand"
-            elif max_value == hit_values[upcard].get(value, 0):
-                optimal_moves[upcard][value] = "Hit"
-            else:
-                optimal_moves[upcard][value] = "DD"
+    for i, upcard in enumerate(dealer_upcards):
+        optimal_moves[upcard] = {value: ACTIONS[_TABLE_ACTIONS[move]] for value, move in zip(values, best_moves[i])}
 
     return pd.DataFrame(optimal_moves)
 
-def create_soft_optimal_dict(dealer_upcards: list) -> dict:
+def create_soft_optimal_dict(dealer_upcards: list, rules: Rules = DEFAULT_RULES) -> dict:
     """
     Create a dictionary of optimal expected values for soft hands for each dealer upcard.
 
     Args:
         dealer_upcards (list): List of dealer upcard values (must be between 2 and 11, inclusive).
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
 
     Returns:
         dict: A dictionary mapping each dealer upcard to its optimal expected value for soft hands.
     """
-    stand_values = create_stand_EV_dict(dealer_upcards)
-    soft_hit_values = create_soft_hit_EV_dict(dealer_upcards)
-    double_down_values = create_double_down_soft_EV_dict(dealer_upcards)
+    values = range(21, 11, -1)
+    best_values = np.nanmax(_optimal_slice(dealer_upcards, values, is_soft=True, rules=rules), axis=2)
+    blackjack_values = ev_tensor(rules)[_upcard_values(dealer_upcards), BLACKJACK, STAND]
 
     soft_optimal_values = {}
     
-    for upcard in dealer_upcards:
-        soft_optimal_values[upcard] = {"BJ": stand_values[upcard].get("BJ", 0)}
-        for value in range(21, 11, -1):
-            soft_optimal_values[upcard][value] = max(
-                stand_values[upcard].get(value, 0),
-                soft_hit_values[upcard].get(value, 0),
-                double_down_values[upcard].get(value, 0)
-            )
+    for i, upcard in enumerate(dealer_upcards):
+        soft_optimal_values[upcard] = {"BJ": float(blackjack_values[i])}
+        soft_optimal_values[upcard].update(zip(values, best_values[i].tolist()))
     
     return soft_optimal_values
 
-def create_soft_optimal_table(dealer_upcards: list) -> pd.DataFrame:
+def create_soft_optimal_table(dealer_upcards: list, rules: Rules = DEFAULT_RULES) -> "pd.DataFrame":
     """
-    Create a table of optimal moves (Stand, Hit, or Double Down) for soft hands for each dealer upcard.
+    Create a table of optimal moves (Stand, Hit, Double Down or Surrender) for soft hands for each dealer upcard.
 
     Args:
         dealer_upcards (list): List of dealer upcard values (must be between 2 and 11, inclusive).
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
 
     Returns:
         pd.DataFrame: A DataFrame representing the optimal move for soft hands based on dealer upcards and player hand values.
     """
-    stand_values = create_stand_EV_dict(dealer_upcards)
-    soft_hit_values = create_soft_hit_EV_dict(dealer_upcards)
-    double_down_values = create_double_down_soft_EV_dict(dealer_upcards)
+    import pandas as pd
+
+    values = range(21, 11, -1)
+    # Ties go to the earliest of Stand, Hit, DD and Surrender, which are skipped where the rules do not allow them
+    best_moves = np.nanargmax(_optimal_slice(dealer_upcards, values, is_soft=True, rules=rules), axis=2)
 
     soft_optimal_moves = {}
     
-    for upcard in dealer_upcards:
-        soft_optimal_moves[upcard] = {}
-        for value in range(21, 11, -1):
-            # Determine the best move for the current hand value
-            max_value = max(
-                stand_values[upcard].get(value, 0),
-                soft_hit_values[upcard].get(value, 0),
-                double_down_values[upcard].get(value, 0)
-            )
-            
-            if max_value == stand_values[upcard].get(value, 0):
-                soft_optimal_moves[upcard][value] = "Stand"
-            elif max_value == soft_hit_values[upcard].get(value, 0):
-                soft_optimal_moves[upcard][value] = "Hit"
-            else:
-                soft_optimal_moves[upcard][value] = "DD"
+    for i, upcard in enumerate(dealer_upcards):
+        soft_optimal_moves[upcard] = {value: ACTIONS[_TABLE_ACTIONS[move]] for value, move in zip(values, best_moves[i])}
 
     return pd.DataFrame(soft_optimal_moves)
 
-def create_split_EV_dict(dealer_upcards: list) -> dict:
+def create_split_EV_dict(dealer_upcards: list, rules: Rules = DEFAULT_RULES) -> dict:
     """
     Create a dictionary of expected values for splitting pairs of cards for each dealer upcard.
 
     Args:
         dealer_upcards (list): List of dealer upcard values (must be between 2 and 11, inclusive).
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
 
     Returns:
         dict: A dictionary mapping each dealer upcard to its expected values for splitting pairs of cards.
@@ -264,37 +280,33 @@ def create_split_EV_dict(dealer_upcards: list) -> dict:
     
     for upcard in dealer_upcards:
         upcard_value = 11 if upcard == 'A' else int(upcard)
-        split_values[upcard] = split_EV(upcard_value)
+        split_values[upcard] = split_EV(upcard_value, rules)
     
     return split_values
 
 
-def create_split_optimal_table(dealer_upcards: list) -> pd.DataFrame:
+def create_split_optimal_table(dealer_upcards: list, rules: Rules = DEFAULT_RULES) -> "pd.DataFrame":
     """
     Create a table of optimal moves for splitting pairs of cards for each dealer upcard.
 
     Args:
         dealer_upcards (list): List of dealer upcard values (must be between 2 and 11, inclusive).
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
 
     Returns:
         pd.DataFrame: A DataFrame representing the optimal move (Split or Not Split) for each pair of cards against each dealer upcard.
     """
-    optimal_values = create_optimal_dict(dealer_upcards)
-    split_values = create_split_EV_dict(dealer_upcards)
-    
+    import pandas as pd
+
+    # Compare splitting with the best of standing, hitting, doubling and surrendering on the pair itself
+    states = [pair_state(card) for card in PAIR_CARDS]
+    values = ev_tensor(rules)[np.ix_(_upcard_values(dealer_upcards), states, _TABLE_ACTIONS + [SPLIT])]
+    split = values[:, :, -1] > np.nanmax(values[:, :, :-1], axis=2)
+
     split_optimal_moves = {}
     
-    for upcard in dealer_upcards:
-        split_optimal_moves[upcard] = {}
-        for pair_value in range(2, 12):
-            # Compare the split value to the optimal value of hitting or standing
-            optimal_for_pair = optimal_values[upcard].get(pair_value * 2, 0) if pair_value != 11 else optimal_values[upcard].get(pair_value + 1, 0)
-            
-            if split_values[upcard].get(pair_value, 0) > optimal_for_pair:
-                split_optimal_moves[upcard][pair_value] = "S"  # 'S' for Split
-            else:
-                split_optimal_moves[upcard][pair_value] = "_"  # '_' for Do not Split
+    for i, upcard in enumerate(dealer_upcards):
+        # 'S' for Split, '_' for Do not Split
+        split_optimal_moves[upcard] = {card: "S" if split[i, j] else "_" for j, card in enumerate(PAIR_CARDS)}
 
     return pd.DataFrame(split_optimal_moves)
-
-                
\ No newline at end of file
@@ -0,0 +1,278 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from ProbabilityFunctions import *
+from ShoeProbabilityFunctions import (SHOE_CARDS, full_shoe_counts, remove_cards, shoe_probability_distribution, shoe_stand_EV,
+                                      shoe_hit_EV, shoe_soft_hit_EV, shoe_split_EV, clear_shoe_cache)
+from StrategyStore import rules_hash
+from Rules import Rules, DEFAULT_RULES
+
+# Card tags of common counting systems, in the order of SHOE_CARDS (aces first)
+TAG_SYSTEMS = {
+    "hi-lo": (-1, 1, 1, 1, 1, 1, 0, 0, 0, -1),
+    "ko": (-1, 1, 1, 1, 1, 1, 1, 0, 0, -1),
+    "hi-opt-i": (0, 0, 1, 1, 1, 1, 0, 0, 0, -1),
+    "hi-opt-ii": (0, 1, 1, 2, 2, 1, 1, 0, 0, -2),
+    "omega-ii": (0, 1, 1, 2, 2, 2, 1, 0, -1, -2),
+    "zen": (-1, 1, 1, 2, 2, 2, 1, 0, 0, -2),
+}
+
+# True counts a table is built for by default. Grids must be evenly spaced, so a lookup is a single division.
+DEFAULT_TRUE_COUNTS = tuple(range(-6, 7))
+
+CARDS_PER_DECK = 52
+
+
+def card_tags(tags) -> np.ndarray:
+    """Get the tag of each card value, in the order of SHOE_CARDS, from a name in TAG_SYSTEMS or a sequence of tags."""
+    tags = TAG_SYSTEMS[tags] if isinstance(tags, str) else tags
+    if len(tags) != len(SHOE_CARDS):
+        raise ValueError(f"A tag system needs one tag per card value in {SHOE_CARDS}, not {len(tags)}.")
+    return np.array(tags)
+
+
+def true_count(counts: tuple, num_decks: int, tags="hi-lo") -> float:
+    """
+    Calculate the true count of a shoe: the running count of the cards dealt so far per deck still to be dealt.
+
+    Args:
+        counts (tuple): The cards left in the shoe, in the order of SHOE_CARDS (see shoe_counts).
+        num_decks (int): The number of decks the shoe started with.
+        tags (optional): A name in TAG_SYSTEMS or the tag of each card value in the order of SHOE_CARDS. Defaults to "hi-lo".
+
+    Returns:
+        float: The true count.
+    """
+    dealt = np.array(full_shoe_counts(num_decks)) - np.array(counts)
+    return float(dealt @ card_tags(tags)) / (sum(counts) / CARDS_PER_DECK)
+
+
+def representative_counts(true_count: float, num_decks: int, decks_remaining: float = None, tags="hi-lo") -> tuple:
+    """
+    Find a typical composition of the cards left in a shoe at a given true count.
+
+    Of every composition with the right number of cards and running count, the most likely one keeps each card
+    value's share of the full shoe, tilted exponentially by its tag. The counts are then rounded to whole cards,
+    picking the rounding that keeps the running count closest to the target.
+
+    Args:
+        true_count (float): The true count.
+        num_decks (int): The number of decks the shoe started with.
+        decks_remaining (float, optional): The number of decks left to deal. Defaults to half the shoe.
+        tags (optional): A name in TAG_SYSTEMS or the tag of each card value in the order of SHOE_CARDS. Defaults to "hi-lo".
+
+    Returns:
+        tuple: The number of cards of each value left, in the order of SHOE_CARDS.
+    """
+    tags = card_tags(tags)
+    full = np.array(full_shoe_counts(num_decks))
+    decks_remaining = num_decks / 2 if decks_remaining is None else decks_remaining
+    size = int(round(decks_remaining * CARDS_PER_DECK))
+    # The cards dealt carry the running count, so the cards left carry the rest of the full shoe's tags
+    target = float(full @ tags) - true_count * decks_remaining
+    if not size * tags.min() < target < size * tags.max():
+        raise ValueError(f"A true count of {true_count} cannot be reached with {decks_remaining} decks left.")
+
+    def tilted(theta: float) -> np.ndarray:
+        weights = full * np.exp(theta * (tags - tags.max()))
+        return size * weights / weights.sum()
+
+    # The tag sum of the tilted composition grows with theta, so it is found by bisection
+    low, high = -50.0, 50.0
+    for _ in range(100):
+        theta = (low + high) / 2
+        if tilted(theta) @ tags < target:
+            low = theta
+        else:
+            high = theta
+    expected = tilted(theta)
+
+    counts = np.floor(expected).astype(int)
+    remainders = expected - counts
+    best = min(
+        itertools.combinations(range(len(SHOE_CARDS)), size - counts.sum()),
+        key=lambda extra: (abs((counts @ tags) + tags[list(extra)].sum() - target), -remainders[list(extra)].sum()),
+    )
+    counts[list(best)] += 1
+    if (counts > full).any():
+        raise ValueError(f"A true count of {true_count} cannot be reached with {decks_remaining} decks left.")
+    return tuple(int(count) for count in counts)
+
+
+def count_tensor(counts: tuple, rules: Rules = DEFAULT_RULES) -> np.ndarray:
+    """
+    Calculate the expected value of every action for every dealer upcard and hand state, for a shoe composition.
+
+    Each upcard is removed from the shoe before its row is computed, and each pair before its split is. Other
+    player cards are not removed, since a hand state stands for every hand with that total.
+
+    Args:
+        counts (tuple): The cards in the shoe before the deal, in the order of SHOE_CARDS.
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
+
+    Returns:
+        np.ndarray: An array laid out like ev_tensor, with NaN for actions that are unavailable.
+    """
+    ev = np.full((len(UPCARDS), NUM_STATES, len(ACTIONS)), np.nan)
+    for i, upcard in enumerate(UPCARDS):
+        shoe = remove_cards(counts, upcard)
+        stand = shoe_stand_EV(upcard, shoe, rules)
+        for is_soft, totals, hit_EV_function in ((False, HARD_TOTALS, shoe_hit_EV), (True, SOFT_TOTALS, shoe_soft_hit_EV)):
+            hit, double = hit_EV_function(upcard, shoe, rules=rules), hit_EV_function(upcard, shoe, double_down=True, rules=rules)
+            for total in totals:
+                state = hand_state(total, is_soft)
+                ev[i, state, STAND], ev[i, state, HIT] = stand[total], hit[total]
+                if rules.can_double(total):
+                    ev[i, state, DOUBLE] = double[total]
+
+        for card in PAIR_CARDS:
+            ev[i, pair_state(card), :SPLIT] = ev[i, hand_state(12, is_soft=True) if card == 11 else hand_state(card * 2), :SPLIT]
+            ev[i, pair_state(card), SPLIT] = shoe_split_EV(upcard, remove_cards(shoe, card, card), card, rules)
+        ev[i, BLACKJACK, STAND] = stand["BJ"]
+        if rules.surrender != "none":
+            ev[i, :BLACKJACK, SURRENDER] = surrender_EV(shoe_probability_distribution(upcard, shoe, rules)["BJ"], rules)
+
+    # The finite-shoe EVs of one composition are not reused, so they are dropped to keep memory flat
+    clear_shoe_cache()
+    return ev
+
+
+class TrueCountTable:
+    """
+    Expected values of every action at evenly spaced true counts, with linear interpolation between them.
+
+    Attributes:
+        true_counts (np.ndarray): The true counts of the grid, evenly spaced.
+        evs (np.ndarray): An array of shape (len(true_counts), len(UPCARDS), NUM_STATES, len(ACTIONS)), one
+                          count_tensor per true count.
+        tags (np.ndarray): The tag of each card value, in the order of SHOE_CARDS.
+        num_decks (int): The number of decks the shoe starts with.
+        decks_remaining (float): The number of decks left in the representative compositions.
+        rules (Rules): The table rules.
+    """
+
+    def __init__(self, true_counts: np.ndarray, evs: np.ndarray, tags, num_decks: int, decks_remaining: float,
+                 rules: Rules = DEFAULT_RULES) -> None:
+        true_counts = np.asarray(true_counts, dtype=float)
+        if len(true_counts) < 2 or not np.allclose(np.diff(true_counts), true_counts[1] - true_counts[0]):
+            raise ValueError("The true counts must be at least two evenly spaced values.")
+        self.true_counts = true_counts
+        self.evs = evs
+        self.tags = card_tags(tags)
+        self.num_decks = num_decks
+        self.decks_remaining = decks_remaining
+        self.rules = rules
+
+    def _position(self, true_count: float) -> tuple:
+        """Get the grid row below a true count and the interpolation weight of the row above, clamped to the grid."""
+        step = self.true_counts[1] - self.true_counts[0]
+        position = min(max((true_count - self.true_counts[0]) / step, 0), len(self.true_counts) - 1)
+        row = min(int(position), len(self.true_counts) - 2)
+        return row, position - row
+
+    def action_EVs(self, true_count: float, dealer_upcard: int, state: int) -> dict:
+        """
+        Look up the expected value of each action in a hand state at a true count.
+
+        Args:
+            true_count (float): The true count. Counts outside the grid use its nearest end.
+            dealer_upcard (int): The dealer's upcard value (must be between 2 and 11, inclusive).
+            state (int): The hand state (see hand_state, pair_state and BLACKJACK).
+
+        Returns:
+            dict: A dictionary mapping each available action in ACTIONS to its expected value.
+        """
+        row, weight = self._position(true_count)
+        upcard = UPCARDS.index(dealer_upcard)
+        values = (1 - weight) * self.evs[row, upcard, state] + weight * self.evs[row + 1, upcard, state]
+        return {ACTIONS[action]: float(value) for action, value in enumerate(values) if not np.isnan(value)}
+
+    def action(self, true_count: float, dealer_upcard: int, total: int, is_soft: bool = False, pair: bool = False,
+               first_decision: bool = True) -> str:
+        """
+        Look up the best move for a player hand at a true count.
+
+        Args:
+            true_count (float): The true count (see true_count).
+            dealer_upcard (int): The dealer's upcard value (must be between 2 and 11, inclusive).
+            total (int): The player's hand total, or the value of each card for a pair.
+            is_soft (bool, optional): Whether the hand contains an ace counted as 11. Defaults to False.
+            pair (bool, optional): Whether the hand is a pair of equal cards that may be split. Defaults to False.
+            first_decision (bool, optional): Whether the hand still has two cards, so doubling and splitting are
+                                             possible. Defaults to True.
+
+        Returns:
+            str: "Stand", "Hit", "DD" or "Split".
+        """
+        evs = self.action_EVs(true_count, dealer_upcard, pair_state(total) if pair else hand_state(total, is_soft))
+        if not first_decision:
+            evs = {action: evs[action] for action in ("Stand", "Hit")}
+        return max(evs, key=evs.get)
+
+    def index_plays(self) -> list:
+        """
+        Find every hand whose best move changes with the count, and the true counts at which it changes.
+
+        Each change is placed where the interpolated EVs of the two moves cross.
+
+        Returns:
+            list: A (dealer upcard, hand state, move below, move above, true count) tuple for every change,
+                  ordered by upcard, hand state and true count.
+        """
+        best = np.nanargmax(self.evs[:, :, :BLACKJACK], axis=3)
+        plays = []
+        for row, upcard, state in np.argwhere(best[1:] != best[:-1]):
+            below, above = best[row, upcard, state], best[row + 1, upcard, state]
+            lower, upper = self.evs[row, upcard, state], self.evs[row + 1, upcard, state]
+            # The difference between the moves changes sign between the rows, so it crosses zero in between
+            start, end = lower[below] - lower[above], upper[below] - upper[above]
+            crossing = self.true_counts[row] + (self.true_counts[row + 1] - self.true_counts[row]) * start / (start - end)
+            plays.append((UPCARDS[upcard], int(state), ACTIONS[below], ACTIONS[above], float(crossing)))
+        return sorted(plays, key=lambda play: (play[0], play[1], play[4]))
+
+    def save(self, path: str) -> None:
+        """Write the table to a NumPy .npz file, stamped with the rules_hash of its rules."""
+        np.savez(path, true_counts=self.true_counts, evs=self.evs, tags=self.tags, num_decks=self.num_decks,
+                 decks_remaining=self.decks_remaining, rules_hash=rules_hash(self.rules))
+
+    @classmethod
+    def load(cls, path: str, rules: Rules = DEFAULT_RULES) -> "TrueCountTable":
+        """
+        Read a table written by save.
+
+        Raises:
+            ValueError: If the table was built for other rules.
+        """
+        with np.load(path) as data:
+            if str(data["rules_hash"]) != rules_hash(rules):
+                raise ValueError(f"{path} was not built for {rules}.")
+            return cls(data["true_counts"], data["evs"], data["tags"], int(data["num_decks"]), float(data["decks_remaining"]), rules)
+
+
+def build_true_count_table(true_counts=DEFAULT_TRUE_COUNTS, num_decks: int = 6, decks_remaining: float = None, tags="hi-lo",
+                           rules: Rules = DEFAULT_RULES, workers: int = None) -> TrueCountTable:
+    """
+    Calculate a TrueCountTable, computing each true count from its representative_counts with the finite-shoe engine.
+
+    Args:
+        true_counts (optional): Evenly spaced true counts to compute. Defaults to DEFAULT_TRUE_COUNTS.
+        num_decks (int, optional): The number of decks the shoe starts with. Defaults to 6.
+        decks_remaining (float, optional): The number of decks left to deal. Defaults to half the shoe.
+        tags (optional): A name in TAG_SYSTEMS or the tag of each card value in the order of SHOE_CARDS. Defaults to "hi-lo".
+        rules (Rules, optional): The table rules. Defaults to DEFAULT_RULES.
+        workers (int, optional): The number of worker processes. None uses every core, 1 runs in this process.
+
+    Returns:
+        TrueCountTable: The table.
+    """
+    decks_remaining = num_decks / 2 if decks_remaining is None else decks_remaining
+    compositions = [representative_counts(count, num_decks, decks_remaining, tags) for count in true_counts]
+
+    if workers == 1:
+        evs = [count_tensor(counts, rules) for counts in compositions]
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            evs = list(executor.map(count_tensor, compositions, [rules] * len(compositions)))
+
+    return TrueCountTable(np.array(true_counts), np.array(evs), tags, num_decks, decks_remaining, rules)
@@ -1,3 +1,4 @@
+import pandas as pd
 from TableCreation import *
 from MonteCarlo import *
 dealer_upcards = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'A']
@@ -0,0 +1,52 @@
+import asyncio
+import json
+import pytest
+from DecisionServer import DecisionService
+from ProbabilityFunctions import _strategy_cache
+from Rules import Rules, DEFAULT_RULES
+from ShoeProbabilityFunctions import full_shoe_counts, remove_cards
+
+PEEK_RULES = {"dealer_peek": True, "double_after_split": True}
+
+
+@pytest.fixture(scope="module")
+def service():
+    service = DecisionService(workers=0)
+    yield service
+    service.close()
+
+
+@pytest.mark.parametrize("query", [
+    {"upcard": 10, "cards": [10, 2, 4]},
+    {"upcard": "A", "cards": [2, 3, 5, 4]},
+    {"upcard": 10, "cards": [5, 6]},
+    {"upcard": "A", "pair": 8},
+])
+def test_shoe_answers_follow_the_peek(service, query):
+    # A very deep shoe deals almost like the infinite deck, so both answers must agree under a peek
+    query = dict(query, rules=PEEK_RULES)
+    upcard = 11 if query["upcard"] == "A" else query["upcard"]
+    cards = query.get("cards", [query.get("pair")] * 2)
+    shoe_query = dict(query, shoe=list(remove_cards(full_shoe_counts(100), upcard, *cards)))
+
+    tensor = asyncio.run(service.respond(query))
+    shoe = asyncio.run(service.respond(shoe_query))
+    assert shoe["action"] == tensor["action"]
+    assert shoe["evs"].keys() == tensor["evs"].keys()
+    for action, value in tensor["evs"].items():
+        assert shoe["evs"][action] == pytest.approx(value, abs=2e-3)
+
+
+def test_list_with_a_non_object_query_is_answered(service):
+    response = json.loads(asyncio.run(service.handle_line('[1, {"upcard": 6, "total": 12, "id": "a"}]')))
+    assert "error" in response[0]
+    assert response[1]["action"] == "Stand" and response[1]["id"] == "a"
+
+
+def test_rule_sets_from_queries_are_bounded():
+    service = DecisionService(workers=0, rules_cache_size=2)
+    for payout in (1.2, 1.25, 1.3, 1.35):
+        asyncio.run(service.respond({"upcard": 6, "total": 12, "rules": {"blackjack_payout": payout}}))
+    assert list(service.tensor_answers) == [DEFAULT_RULES, Rules(blackjack_payout=1.3), Rules(blackjack_payout=1.35)]
+    assert not any(("rules", Rules(blackjack_payout=1.2)) in key[1] for key in _strategy_cache)
+    service.close()
@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+import pytest
+
+# Modules with the heavy optional dependencies each must load without, since only the functions that need them import them
+LAZY_DEPENDENCIES = {
+    "ProbabilityFunctions": ("pandas",),
+    "ShoeProbabilityFunctions": ("pandas",),
+    "MonteCarlo": ("pandas",),
+    "StrategyStore": ("pandas",),
+    "DecisionServer": ("pandas",),
+    "TableCreation": ("pandas",),
+    "Sweep": ("pandas", "pyarrow"),
+    "TrueCount": ("pandas",),
+    "Profiling": ("pandas",),
+}
+
+
+@pytest.mark.parametrize("module, dependencies", LAZY_DEPENDENCIES.items())
+def test_import_does_not_load_lazy_dependencies(module, dependencies):
+    # A fresh interpreter, as a short-lived CLI or worker process would use
+    code = f"import sys, {module}; print(' '.join(sys.modules))"
+    directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    loaded = subprocess.run([sys.executable, "-c", code], cwd=directory, capture_output=True, text=True, check=True).stdout.split()
+    assert not [dependency for dependency in dependencies if dependency in loaded]
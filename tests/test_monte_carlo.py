@@ -0,0 +1,56 @@
+from dataclasses import replace
+import numpy as np
+import pytest
+from MonteCarlo import *
+from MonteCarlo import _play_charted_rounds
+from Rules import Rules, DEFAULT_RULES
+from StrategyStore import ACTIONS as CHART_ACTIONS, PAIR, build_chart
+
+# Rule sets whose simulated strategy is checked against the analytic EVs, the rounds simulated for each, and the
+# largest deviation allowed in standard errors. Over about 300 cells, chance alone rarely exceeds 4.5.
+SIMULATION_RULES = (
+    DEFAULT_RULES,
+    Rules(hit_soft_17=True, dealer_peek=True, double_after_split=True, surrender="late", max_split_hands=4),
+    Rules(dealer_peek=True, surrender="early"),
+    Rules(surrender="early", double_after_split=True, split_aces_one_card=True),
+)
+SIMULATION_ROUNDS = 2_000_000
+SIMULATION_TOLERANCE = 5.0
+
+
+@pytest.mark.parametrize("rules", SIMULATION_RULES)
+def test_simulated_strategy_matches_the_analytic_evs(rules):
+    result = simulate_basic_strategy(SIMULATION_ROUNDS, seed=0, rules=rules)
+    assert abs(result["ev"] - result["analytic_ev"]) <= SIMULATION_TOLERANCE * result["standard_error"]
+
+    # Cells played at least 100 times. One whose every round ends the same way, such as an early surrender, has no
+    # error and must match exactly.
+    played = result["cell_rounds"] >= 100
+    differences = np.abs(result["cell_ev"] - result["cell_analytic_ev"])[played]
+    errors = result["cell_standard_error"][played]
+    assert (differences[errors == 0] <= 1e-12).all()
+    assert (differences[errors > 0] <= SIMULATION_TOLERANCE * errors[errors > 0]).all()
+
+
+def test_resplits_follow_the_split_chart():
+    # Splitting 8s against a 6 but never resplitting them leaves at most two hands of one unit each
+    rules = Rules(max_split_hands=4)
+    chart = build_chart(rules)
+    split_chart = chart.copy()
+    split_chart[PAIR, 8, 6] = CHART_ACTIONS.index("Hit")
+    no_double_chart = build_chart(replace(rules, double_on=()))
+    assert chart[PAIR, 8, 6] == CHART_ACTIONS.index("Split")
+
+    cell = UPCARDS.index(6) * NUM_STATES + pair_state(8)
+    for charts, most in (((chart, chart), 4), ((chart, split_chart), 2)):
+        results, cells = _play_charted_rounds(1_000_000, *charts, no_double_chart, np.random.default_rng(0), rules)
+        assert np.abs(results[cells == cell]).max() == most
+
+
+@pytest.mark.parametrize("player_hand_value, reference", [(22, -1.0), (25, -1.0), (0, None), (16, None)])
+def test_stream_stand_compares_any_total(player_hand_value, reference):
+    estimates = list(stream_monte_carlo_stand(player_hand_value, 10, report_every=10_000, compare_analytic=True,
+                                              max_simulations=50_000, seed=0))
+    assert estimates[-1].stop_reason == "max_simulations"
+    if reference is not None:
+        assert estimates[-1].ev == reference
@@ -0,0 +1,75 @@
+from fractions import Fraction
+import numpy as np
+import pytest
+from ProbabilityFunctions import *
+from Rules import Rules, DEFAULT_RULES
+
+# Rule sets whose float EVs are checked against exact Fractions, and the largest difference allowed
+PRECISION_RULES = (
+    DEFAULT_RULES,
+    Rules(hit_soft_17=True, dealer_peek=True, double_after_split=True, blackjack_payout=1.2, surrender="late", max_split_hands=4,
+          resplit_aces=True),
+    Rules(double_on=(9, 10, 11), surrender="early", split_aces_one_card=True),
+    Rules(dealer_peek=True, surrender="early"),
+)
+PRECISION_TOLERANCE = 1e-12
+
+
+def baseline_probability_distribution(dealer_upcard: int = None) -> dict:
+    """The original path-enumerating dealer distribution, kept as the reference for the memoized engine."""
+    def calculate_probabilities(path: list, result: dict) -> None:
+        # Handle soft ace conversion (11 to 1) to prevent busting
+        if 11 in path and sum(path) >= 22:
+            path = path[:]
+            path[path.index(11)] = 1
+
+        total = sum(path)
+
+        if total >= 17:
+            probability = 1
+            start = 0 if dealer_upcard is None else 1
+            for i in range(start, len(path)):
+                probability *= (1 / 13) if path[i] != 10 else (4 / 13)
+
+            if len(path) == 2 and 10 in path and 11 in path:
+                result["BJ"] += probability
+            elif total <= 21:
+                result[total] += probability
+            else:
+                result["bust"] += probability
+            return
+
+        for card in range(2, 12):
+            path.append(card)
+            calculate_probabilities(path, result)
+            path.pop()
+
+    result = {value: 0 for value in range(17, 22)}
+    result["bust"] = 0
+    result["BJ"] = 0
+    calculate_probabilities([dealer_upcard] if dealer_upcard else [], result)
+    return result
+
+
+@pytest.mark.parametrize("dealer_upcard", [None, *UPCARDS])
+@pytest.mark.parametrize("exact", [False, True])
+def test_probability_distribution_matches_the_baseline(dealer_upcard, exact):
+    expected = baseline_probability_distribution(dealer_upcard)
+    result = probability_distribution(dealer_upcard, exact=exact)
+    assert result.keys() == expected.keys()
+    for outcome, probability in expected.items():
+        assert float(result[outcome]) == pytest.approx(probability, rel=0, abs=PRECISION_TOLERANCE)
+
+
+def test_exact_probability_distribution_is_exact():
+    distribution = probability_distribution(6, exact=True)
+    assert all(isinstance(probability, Fraction) for probability in distribution.values())
+    assert sum(distribution.values()) == 1
+
+
+@pytest.mark.parametrize("rules", PRECISION_RULES)
+def test_float_ev_tensor_matches_the_exact_one(rules):
+    exact = ev_tensor(rules, exact=True)
+    floats = ev_tensor(rules)
+    assert np.array_equal(np.isnan(floats), np.isnan(exact.astype(float)))
+    assert np.nanmax(np.abs(floats - exact.astype(float))) <= PRECISION_TOLERANCE
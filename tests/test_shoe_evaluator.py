@@ -0,0 +1,46 @@
+import random
+import pytest
+from Card import Card
+from Deck import Deck
+from Rules import Rules
+from ShoeEvaluator import ShoeEvaluator
+from ShoeProbabilityFunctions import shoe_counts, shoe_probability_distribution, shoe_stand_EV
+
+
+def assert_matches_fresh_shoe(evaluator, deck, rules):
+    counts = shoe_counts(deck)
+    assert evaluator.counts == counts
+    for upcard in range(2, 12):
+        assert evaluator.probability_distribution(upcard) == pytest.approx(shoe_probability_distribution(upcard, counts, rules), abs=1e-12)
+        assert evaluator.stand_EV(upcard) == pytest.approx(shoe_stand_EV(upcard, counts, rules), abs=1e-12)
+
+
+@pytest.mark.parametrize("rules", [Rules(), Rules(hit_soft_17=True)])
+def test_incremental_updates_match_a_fresh_shoe(rules):
+    deck = Deck(1)
+    deck.shuffle(random.Random(0))
+    evaluator = ShoeEvaluator(deck, rules)
+    assert_matches_fresh_shoe(evaluator, deck, rules)
+
+    dealt = [deck.deal_card() for _ in range(30)]
+    assert_matches_fresh_shoe(evaluator, deck, rules)
+
+    for card in dealt[:5]:
+        deck.add_card(card)
+    deck.remove_card(dealt[0])
+    assert_matches_fresh_shoe(evaluator, deck, rules)
+
+    deck.reset()
+    assert_matches_fresh_shoe(evaluator, deck, rules)
+    evaluator.detach()
+
+
+def test_a_card_value_running_out_makes_its_dealer_hands_impossible():
+    deck = Deck(1)
+    evaluator = ShoeEvaluator(deck)
+    for rank in ("T", "J", "Q", "K"):
+        for _ in range(4):
+            deck.remove_card(Card(rank))
+    # Without any ten-valued card the dealer's ace can never make Blackjack
+    assert evaluator.probability_distribution(11)["BJ"] == 0
+    assert_matches_fresh_shoe(evaluator, deck, evaluator.rules)
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from ShoeSimulator import (BasicStrategy, DECK_CARD_VALUES, HIT, MAX_BANKROLL_CHECKPOINTS, simulate_bankroll, simulate_table,
+                           _max_round_cards, _play_table_rounds)
+
+
+@pytest.fixture(scope="module")
+def strategy():
+    return BasicStrategy()
+
+
+def test_bets_are_capped_at_the_bankroll(strategy):
+    # 150 only covers one full bet of 100, so a player who loses the first round can bet at most 50 on the second
+    result = simulate_bankroll(2_000, 2, strategy, {0: 100}, 150, report_every=1, bin_width=1, seed=0, workers=1)
+    assert result["average_bet"] < 100
+    assert (result["bankroll_percentiles"] >= 0).all()
+
+
+def test_bankroll_checkpoints_are_bounded(strategy):
+    rounds = 3 * MAX_BANKROLL_CHECKPOINTS + 1
+    result = simulate_bankroll(10, rounds, strategy, {0: 1}, 1_000, report_every=1, seed=0, workers=1)
+    assert len(result["percentile_rounds"]) <= MAX_BANKROLL_CHECKPOINTS
+    assert len(result["bankroll_percentiles"]) == len(result["percentile_rounds"])
+    assert result["percentile_rounds"][-1] == rounds
+
+
+
+def test_a_long_six_deck_round_fits_in_the_reserve():
+    # The player draws aces to a soft 20, a 2 to a hard 12 and aces again to 21, then the dealer's 16 draws an ace.
+    # That is 23 cards, more than a one-deck round can use.
+    hit_everything = np.full((2, 32, 12), HIT, dtype=np.int8)
+    round_cards = np.array([11, 10, 11, 6] + [11] * 8 + [2] + [11] * 9 + [11])
+    shoe = np.tile(DECK_CARD_VALUES, 6)
+    shoe = np.concatenate([round_cards, np.sort(shoe)[len(round_cards):]])[None, :]
+    positions = np.zeros(1, dtype=np.intp)
+
+    results = _play_table_rounds(shoe, positions, np.arange(1), (hit_everything,))
+    assert results[0, 0] == 1
+    assert positions[0] == len(round_cards) <= _max_round_cards(6)
+
+
+def test_seven_seats_fit_at_a_single_deck_table(strategy):
+    result = simulate_table(10_000, [strategy] * 7, num_decks=1, seed=0, num_tables=1_000, heads_up=False)
+    assert len(result["seats"]) == 7